@@ -0,0 +1,219 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EndpointClass:
+    """Admission settings for one class of endpoints; lower priority values are served first"""
+    name: str
+    priority: int
+    max_concurrency: int
+    queue_timeout: float
+
+
+class AdmissionRejected(Exception):
+    """The request was shed instead of queued"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A granted slot; release() is idempotent so streaming paths can call it from several places"""
+
+    def __init__(self, controller: "AdmissionController", endpoint_class: EndpointClass, queued_seconds: float):
+        self._controller = controller
+        self.endpoint_class = endpoint_class
+        self.queued_seconds = queued_seconds
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """Bounded priority queue in front of the generation endpoints
+
+    Requests run immediately while both the global and the per-class limits have
+    room. Otherwise they wait in one priority queue until a slot frees up or their
+    class's queue deadline passes. When the queue is full, a newcomer displaces the
+    lowest-priority waiter if it outranks it and is rejected otherwise, so excess
+    load fails fast with a Retry-After hint instead of timing out.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, classes: Dict[str, EndpointClass]):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.classes = classes
+        self.inflight = 0
+        self.inflight_by_class = {name: 0 for name in classes}
+        self._queue = []  # heap of (priority, seq, future, class name)
+        self._seq = itertools.count()
+        # Smoothed service time per class, used to estimate Retry-After
+        self._service_time = {name: 1.0 for name in classes}
+        self.stats_counters = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0,
+            "shed_for_priority": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Create a controller from SAHAYAK_ADMISSION_* settings"""
+        def setting(name: str, default: str) -> str:
+            return os.getenv(f"SAHAYAK_ADMISSION_{name}", default)
+
+        classes = {
+            "interactive": EndpointClass(
+                "interactive", 0,
+                int(setting("INTERACTIVE_CONCURRENCY", "48")),
+                float(setting("INTERACTIVE_QUEUE_TIMEOUT_SECONDS", "5")),
+            ),
+            "image": EndpointClass(
+                "image", 0,
+                int(setting("IMAGE_CONCURRENCY", "16")),
+                float(setting("IMAGE_QUEUE_TIMEOUT_SECONDS", "5")),
+            ),
+            "lesson_plan": EndpointClass(
+                "lesson_plan", 1,
+                int(setting("LESSON_PLAN_CONCURRENCY", "24")),
+                float(setting("LESSON_PLAN_QUEUE_TIMEOUT_SECONDS", "10")),
+            ),
+            "batch": EndpointClass(
+                "batch", 2,
+                int(setting("BATCH_CONCURRENCY", "16")),
+                float(setting("BATCH_QUEUE_TIMEOUT_SECONDS", "30")),
+            ),
+        }
+        return cls(
+            max_concurrency=int(setting("MAX_CONCURRENCY", "64")),
+            max_queue=int(setting("MAX_QUEUE", "128")),
+            classes=classes,
+        )
+
+    def _has_room(self, name: str) -> bool:
+        return (
+            self.inflight < self.max_concurrency
+            and self.inflight_by_class[name] < self.classes[name].max_concurrency
+        )
+
+    def _grant(self, name: str):
+        self.inflight += 1
+        self.inflight_by_class[name] += 1
+        self.stats_counters["admitted"] += 1
+
+    def retry_after(self, name: str) -> int:
+        """Rough seconds until a slot is likely to free up"""
+        backlog = len(self._queue) + 1
+        estimate = self._service_time[name] * backlog / max(self.max_concurrency, 1)
+        return max(1, math.ceil(estimate))
+
+    async def acquire(self, name: str) -> AdmissionTicket:
+        endpoint_class = self.classes[name]
+        enqueued = time.monotonic()
+        if not self._queue and self._has_room(name):
+            self._grant(name)
+            return AdmissionTicket(self, endpoint_class, 0.0)
+
+        if len(self._queue) >= self.max_queue:
+            self._shed_for(endpoint_class)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (endpoint_class.priority, next(self._seq), future, name)
+        heapq.heappush(self._queue, entry)
+        self.stats_counters["queued"] += 1
+        # Waiters blocked on their own class limit must not hold up other classes
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), endpoint_class.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove(entry)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Granted just as the deadline hit; hand the slot back
+                self._release_slot(name)
+            self.stats_counters["rejected_deadline"] += 1
+            raise AdmissionRejected("Server busy: queue deadline exceeded", self.retry_after(name))
+        except asyncio.CancelledError:
+            self._remove(entry)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release_slot(name)
+            raise
+        return AdmissionTicket(self, endpoint_class, time.monotonic() - enqueued)
+
+    def _shed_for(self, newcomer: EndpointClass):
+        """Make queue room for a higher-priority newcomer, or reject it"""
+        worst = max(self._queue)
+        if worst[0] > newcomer.priority:
+            self._remove(worst)
+            if not worst[2].done():
+                worst[2].set_exception(
+                    AdmissionRejected("Server busy: shed for higher-priority work", self.retry_after(worst[3]))
+                )
+            self.stats_counters["shed_for_priority"] += 1
+            return
+        self.stats_counters["rejected_queue_full"] += 1
+        raise AdmissionRejected("Server busy: admission queue is full", self.retry_after(newcomer.name))
+
+    def _remove(self, entry):
+        try:
+            self._queue.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._queue)
+
+    def _release(self, ticket: AdmissionTicket):
+        name = ticket.endpoint_class.name
+        elapsed = time.monotonic() - ticket.started
+        self._service_time[name] = 0.8 * self._service_time[name] + 0.2 * elapsed
+        self._release_slot(name)
+
+    def _release_slot(self, name: str):
+        self.inflight -= 1
+        self.inflight_by_class[name] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant freed slots to the highest-priority waiters whose class has room"""
+        skipped = []
+        while self._queue and self.inflight < self.max_concurrency:
+            entry = heapq.heappop(self._queue)
+            _, _, future, name = entry
+            if future.done():
+                continue
+            if not self._has_room(name):
+                skipped.append(entry)
+                continue
+            self._grant(name)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "inflight": self.inflight,
+            "inflight_by_class": dict(self.inflight_by_class),
+            "queue_depth": self.queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
@@ -1,19 +1,44 @@
 import os
 import logging
-from fastapi import FastAPI, HTTPException, UploadFile, File, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, validator
-from typing import Optional, List
-import google.generativeai as genai
-from PIL import Image
-import io
+from typing import Optional, List, Tuple, Union
 import base64
 import json
+import hmac
 from dotenv import load_dotenv
 import time
 import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from sahayak_cache import ResponseCache, make_cache_key, parse_cache_control
+from sahayak_coalesce import SingleFlight
+from sahayak_admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from sahayak_metrics import REGISTRY, CONTENT_TYPE, MetricsMiddleware
+from sahayak_tracing import TracingMiddleware, current_request_id, record_span, span
+from sahayak_deadline import (
+    DeadlineExceeded, DeadlineMiddleware, current_deadline, deadline_scope, detached_context, remaining_time,
+    within_deadline
+)
+from sahayak_profiler import ProfilerBusy, profiler
+from sahayak_clients import ClientRegistry, ClientUnavailable
+from sahayak_backends import BACKENDS, FakeBackend, GeminiBackend, ModelBackend
+from sahayak_jobs import JobDeferred, JobFailed, JobManager, JobQueueFull, FINISHED
+from sahayak_images import (
+    ImagePreprocessor, PreparedImage, PreprocessQueueFull, PreprocessUnavailable, preprocess_image
+)
+from sahayak_image_cache import ImageAnalysisCache
+from sahayak_similarity_cache import PromptSimilarityCache
+from sahayak_packs import ContentPacks
+from sahayak_pages import PageSource, PdfPages, PdfUnavailable, is_pdf, run_pages
+from sahayak_upstream import (
+    UpstreamScheduler, UpstreamCallFailed, CircuitOpen, EmptyResponseError, INPUT_TOKENS, estimate_tokens, is_retryable,
+    truncate_to_tokens
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,33 +48,122 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # Global variables for API client
-gemini_model = None
+model_clients = None
+response_cache = None
+image_preprocessor = None
+image_analysis_cache = None
+similarity_cache = None
+content_packs = None
+job_manager = None
+# Identical concurrent generations share one upstream call
+inflight_generations = SingleFlight()
+COALESCE_WAIT_TIMEOUT = float(os.getenv("SAHAYAK_COALESCE_TIMEOUT_SECONDS", "0")) or None
+# Bounded, prioritized admission in front of the generation endpoints
+admission = AdmissionController.from_env()
 
-async def initialize_gemini():
-    """Initialize Gemini API with proper error handling"""
-    global gemini_model
-    try:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            logger.error("GEMINI_API_KEY not found in environment variables")
-            raise ValueError("GEMINI_API_KEY not found")
-        
-        genai.configure(api_key=api_key)
-        gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-        logger.info("Gemini API initialized successfully")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to initialize Gemini API: {e}")
-        return False
+TEXT_MODEL_NAME = "gemini-1.5-flash"
+VISION_MODEL_NAME = "gemini-1.5-pro-vision"
+# Bump whenever a prompt template changes so cached responses are not reused
+PROMPT_TEMPLATE_VERSION = "1"
+
+# Thread pool used for blocking Gemini calls when the SDK's async path is unavailable
+MODEL_THREAD_POOL_SIZE = int(os.getenv("SAHAYAK_MODEL_THREADS", "32"))
+USE_ASYNC_SDK = os.getenv("SAHAYAK_USE_ASYNC_SDK", "true").lower() in ("1", "true", "yes")
+model_executor = None
+# Model provider behind SahayakAPI: "gemini", or "fake" for offline benchmarking
+MODEL_BACKEND = os.getenv("SAHAYAK_BACKEND", "gemini").lower()
+
+def get_model_executor() -> ThreadPoolExecutor:
+    """Get or create the bounded thread pool for blocking model calls"""
+    global model_executor
+    if model_executor is None:
+        model_executor = ThreadPoolExecutor(
+            max_workers=MODEL_THREAD_POOL_SIZE,
+            thread_name_prefix="sahayak-model"
+        )
+        logger.info(f"Model executor started with {MODEL_THREAD_POOL_SIZE} threads (async SDK: {USE_ASYNC_SDK})")
+    return model_executor
+
+def shutdown_model_executor():
+    """Stop the model thread pool without waiting for abandoned calls"""
+    global model_executor
+    if model_executor is not None:
+        model_executor.shutdown(wait=False, cancel_futures=True)
+        model_executor = None
+
+# Send one tiny generation at startup so the first real request finds a warm connection
+WARMUP_MODEL_PROBE = os.getenv("SAHAYAK_WARMUP_MODEL_PROBE", "true").lower() in ("1", "true", "yes")
+
+def create_sahayak_api() -> "SahayakAPI":
+    """Build the process's SahayakAPI; runs in a thread during startup"""
+    if MODEL_BACKEND == "gemini" and not os.getenv("GEMINI_API_KEY"):
+        logger.error("GEMINI_API_KEY not found in environment variables")
+        raise ValueError("API key not configured. Please set GEMINI_API_KEY environment variable.")
+    api = SahayakAPI()
+    logger.info("Sahayak API instance created successfully")
+    return api
+
+async def warm_up_model(registry: ClientRegistry):
+    api = await registry.get("sahayak")
+    await api._call_model(api.text_model, "Reply with OK.", label="Warm-up", max_retries=1, max_output_tokens=8)
+
+def start_model_clients() -> ClientRegistry:
+    """Build the model client and run warm-up probes in the background"""
+    registry = ClientRegistry.from_env()
+    registry.register("sahayak", create_sahayak_api, close=lambda api: api.backend.close())
+    if WARMUP_MODEL_PROBE:
+        registry.add_probe("model", functools.partial(warm_up_model, registry))
+    registry.add_probe("images", image_preprocessor.warm_up)
+    registry.start()
+    return registry
+
+def current_sahayak_api() -> Optional["SahayakAPI"]:
+    """The SahayakAPI if it has been built, without waiting for startup"""
+    return model_clients.peek("sahayak") if model_clients else None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
+    global model_clients, response_cache, image_preprocessor, image_analysis_cache, similarity_cache, content_packs, job_manager
+    # Startup: clients build in the background so the worker answers /livez right away
     logger.info("Starting Sahayak API...")
-    await initialize_gemini()
+    get_model_executor()
+    image_preprocessor = ImagePreprocessor.from_env()
+    image_preprocessor.start()
+    model_clients = start_model_clients()
+    response_cache = ResponseCache.from_env()
+    image_analysis_cache = ImageAnalysisCache.from_env()
+    similarity_cache = PromptSimilarityCache.from_env()
+    content_packs = ContentPacks.from_env()
+    job_manager = JobManager.from_env()
+    if job_manager:
+        register_job_handlers(job_manager)
+        await job_manager.start()
     yield
     # Shutdown
     logger.info("Shutting down Sahayak API...")
+    if job_manager:
+        await job_manager.stop()
+        job_manager.close()
+        job_manager = None
+    if model_clients:
+        await model_clients.close()
+        model_clients = None
+    shutdown_model_executor()
+    if image_preprocessor:
+        image_preprocessor.shutdown()
+        image_preprocessor = None
+    if response_cache:
+        response_cache.close()
+        response_cache = None
+    if image_analysis_cache:
+        image_analysis_cache.close()
+        image_analysis_cache = None
+    if similarity_cache:
+        similarity_cache.close()
+        similarity_cache = None
+    if content_packs:
+        content_packs.close()
+        content_packs = None
 
 app = FastAPI(
     title="Sahayak API", 
@@ -64,12 +178,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Global exception: {exc}")
+    logger.error(f"Global exception in request {current_request_id()}: {exc}")
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal server error", "error": str(exc)}
@@ -79,18 +197,42 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get("/health")
 async def health_check():
     """Health check endpoint to verify API status"""
+    api = current_sahayak_api()
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "gemini_initialized": gemini_model is not None
+        "gemini_initialized": api is not None and isinstance(api.backend, GeminiBackend),
+        "startup": model_clients.stats() if model_clients else None,
+        "model_executor": api.executor_stats() if api else None,
+        "upstream": api.scheduler.stats() if api else None,
+        "admission": admission.stats(),
+        "jobs": job_manager.stats() if job_manager else None,
+        "image_preprocessing": image_preprocessor.stats() if image_preprocessor else None
     }
 
+@app.get("/livez")
+async def liveness():
+    """Liveness: the process is up and its event loop responds"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness(response: Response):
+    """Readiness: clients are built and warm-up has finished, so traffic can be routed here"""
+    startup = model_clients.stats() if model_clients else {"state": "stopped"}
+    if not (model_clients and model_clients.ready):
+        response.status_code = 503
+    return {"ready": response.status_code != 503, **startup}
+
 class TextRequest(BaseModel):
     prompt: str
     grade_levels: Optional[List[int]] = [4, 5, 6]
     subject: Optional[str] = "general"
     location: Optional[str] = "rural India"
     max_tokens: Optional[int] = 500
+    # Overall time budget in seconds; the X-Request-Timeout header works too
+    timeout_seconds: Optional[float] = None
+    # Set to false to skip answers cached for similarly phrased prompts
+    allow_similar: bool = True
     
     @validator('prompt')
     def prompt_must_not_be_empty(cls, v):
@@ -103,6 +245,12 @@ class TextRequest(BaseModel):
         if not v or not all(1 <= grade <= 12 for grade in v):
             raise ValueError('Grade levels must be between 1 and 12')
         return v
+    
+    @validator('max_tokens', 'timeout_seconds')
+    def must_be_positive(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError('Must be positive')
+        return v
 
 class ImageAnalysisRequest(BaseModel):
     image_data: str
@@ -126,6 +274,14 @@ class LessonPlanRequest(BaseModel):
     duration_minutes: int = 45
     resources: str = "blackboard, chalk, local materials"
     location: str = "rural India"
+    max_tokens: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    
+    @validator('max_tokens', 'timeout_seconds')
+    def must_be_positive(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError('Must be positive')
+        return v
     
     @validator('topic')
     def topic_must_not_be_empty(cls, v):
@@ -139,6 +295,39 @@ class LessonPlanRequest(BaseModel):
             raise ValueError('Grade levels must be between 1 and 12')
         return v
 
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("SAHAYAK_BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("SAHAYAK_BATCH_MAX_CONCURRENCY", "32"))
+BATCH_MAX_ITEMS = int(os.getenv("SAHAYAK_BATCH_MAX_ITEMS", "500"))
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    content: Optional[TextRequest] = None
+    lesson_plan: Optional[LessonPlanRequest] = None
+    
+    @validator('lesson_plan', always=True)
+    def exactly_one_request(cls, v, values):
+        if (v is None) == (values.get('content') is None):
+            raise ValueError('Each batch item needs exactly one of content or lesson_plan')
+        return v
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: Optional[int] = None
+    
+    @validator('items')
+    def items_must_fit_batch(cls, v):
+        if not v:
+            raise ValueError('Batch must contain at least one item')
+        if len(v) > BATCH_MAX_ITEMS:
+            raise ValueError(f'Batch cannot contain more than {BATCH_MAX_ITEMS} items')
+        return v
+    
+    @validator('concurrency')
+    def concurrency_must_be_positive(cls, v):
+        if v is not None and v < 1:
+            raise ValueError('Concurrency must be at least 1')
+        return v
+
 SAHAYAK_SYSTEM_PROMPT = """You are Sahayak, an advanced AI teaching assistant specifically designed for multi-grade classrooms in low-resource environments. You are built for the Agentic AI Day hackathon to solve the "Empowering teachers in multi-grade classrooms" problem statement.
 
 "Sahayak" means "Assistant" in Hindi - you are truly a helpful teaching companion!
@@ -224,34 +413,241 @@ For Higher Grades (7-8):
 
 Focus on practical implementation in low-resource environments with maximum educational impact."""
 
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB
+# Token budgeting estimates for the upstream rate limiter
+OUTPUT_TOKEN_ESTIMATE = int(os.getenv("SAHAYAK_UPSTREAM_OUTPUT_TOKEN_ESTIMATE", "800"))
+IMAGE_TOKEN_ESTIMATE = 258  # Gemini bills each image as a fixed number of tokens
+# Hard bounds on model input and output so latency and cost per request stay predictable
+MAX_INPUT_TOKENS = int(os.getenv("SAHAYAK_MAX_INPUT_TOKENS", "2000"))
+MAX_OUTPUT_TOKENS = int(os.getenv("SAHAYAK_MAX_OUTPUT_TOKENS", "4096"))
+LESSON_PLAN_MAX_OUTPUT_TOKENS = int(os.getenv("SAHAYAK_LESSON_PLAN_MAX_OUTPUT_TOKENS", "2048"))
+LESSON_SECTION_MAX_OUTPUT_TOKENS = int(os.getenv("SAHAYAK_LESSON_SECTION_MAX_OUTPUT_TOKENS", "1024"))
+IMAGE_ANALYSIS_MAX_OUTPUT_TOKENS = int(os.getenv("SAHAYAK_IMAGE_ANALYSIS_MAX_OUTPUT_TOKENS", "1024"))
+# Time budget for requests that did not ask for one (0 disables)
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("SAHAYAK_REQUEST_TIMEOUT_SECONDS", "55"))
+
+# Multi-page (several photos or a PDF) chapter analysis
+PAGES_CONCURRENCY = int(os.getenv("SAHAYAK_PAGES_CONCURRENCY", "4"))
+PAGES_MAX_PAGES = int(os.getenv("SAHAYAK_PAGES_MAX_PAGES", "50"))
+PAGES_MAX_PDF_BYTES = int(os.getenv("SAHAYAK_PAGES_MAX_PDF_BYTES", str(50 * 1024 * 1024)))
+PAGES_MAX_TOTAL_BYTES = int(os.getenv("SAHAYAK_PAGES_MAX_TOTAL_BYTES", str(100 * 1024 * 1024)))
+PAGES_TIMEOUT_SECONDS = float(os.getenv("SAHAYAK_PAGES_TIMEOUT_SECONDS", "300"))
+PAGES_SUMMARY_INPUT_TOKENS = int(os.getenv("SAHAYAK_PAGES_SUMMARY_INPUT_TOKENS", "8000"))
+PAGES_SUMMARY_MAX_OUTPUT_TOKENS = int(os.getenv("SAHAYAK_PAGES_SUMMARY_MAX_OUTPUT_TOKENS", "2048"))
+
+def prompt_tokens(contents) -> int:
+    """Estimate the prompt tokens of a model request"""
+    parts = contents if isinstance(contents, list) else [contents]
+    return sum(
+        estimate_tokens(part) if isinstance(part, str) else IMAGE_TOKEN_ESTIMATE
+        for part in parts
+    )
+
+def estimate_request_tokens(contents, max_output_tokens: Optional[int] = None) -> int:
+    """Estimate prompt plus expected output tokens for a model request"""
+    return prompt_tokens(contents) + min(max_output_tokens or OUTPUT_TOKEN_ESTIMATE, OUTPUT_TOKEN_ESTIMATE)
+
+# The shared part of a sectioned lesson plan depends on the grade bands present,
+# not the exact grades, so [4, 5, 6] and [5, 6, 7] can share it
+GRADE_BANDS = ((1, 2, "early primary (grades 1-2)"), (3, 5, "primary (grades 3-5)"), (6, 8, "middle school (grades 6-8)"), (9, 12, "secondary (grades 9-12)"))
+
+def grade_bands(grade_levels: List[int]) -> List[str]:
+    return [name for low, high, name in GRADE_BANDS if any(low <= grade <= high for grade in grade_levels)]
+
+def parse_json_section(text: str) -> dict:
+    """Parse a structured section, tolerating code fences; anything unparseable is kept as text"""
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`").strip()
+        if cleaned.startswith("json"):
+            cleaned = cleaned[4:]
+    try:
+        value = json.loads(cleaned)
+    except ValueError:
+        return {"text": text}
+    return value if isinstance(value, dict) else {"items": value}
+
+def output_token_limit(requested: Optional[int], default: int) -> int:
+    """Clamp a requested output length to the server-wide cap"""
+    return min(requested or default, MAX_OUTPUT_TOKENS)
+
+def apply_request_deadline(requested: Optional[float] = None, default: Optional[float] = None):
+    """Bound the current request by its timeout_seconds, or by the default when no budget was given"""
+    deadline = current_deadline()
+    if deadline is None:
+        return
+    default = default or REQUEST_TIMEOUT_SECONDS
+    if requested:
+        deadline.tighten(requested)
+    elif not deadline.bounded and default:
+        deadline.tighten(default)
+
+class ModelUnavailable(HTTPException):
+    """503 for calls refused while the model circuit is open; callers may answer from cache instead"""
+
+def upstream_http_error(error: UpstreamCallFailed) -> HTTPException:
+    """Translate a failed upstream call into the HTTP error returned to the client"""
+    if isinstance(error.cause, CircuitOpen):
+        return ModelUnavailable(
+            status_code=503,
+            detail="The model service is temporarily unavailable, please retry shortly",
+            headers={"Retry-After": str(max(1, int(error.cause.retry_after)))}
+        )
+    if isinstance(error.cause, DeadlineExceeded):
+        return HTTPException(
+            status_code=504,
+            detail=f"{error.label} did not finish within the request deadline ({error.attempts} attempts)"
+        )
+    if error.throttled:
+        retry_after = max(1, int(error.retry_after or 5))
+        return HTTPException(
+            status_code=503,
+            detail=f"{error.label} is temporarily rate limited, please retry shortly",
+            headers={"Retry-After": str(retry_after)}
+        )
+    return HTTPException(status_code=500, detail=str(error))
+
+def create_model_backend(api_key: Optional[str] = None, name: Optional[str] = None) -> ModelBackend:
+    """Build the model backend selected by SAHAYAK_BACKEND"""
+    name = (name or MODEL_BACKEND).lower()
+    if name == "fake":
+        backend = FakeBackend.from_env()
+        logger.info(f"Using fake model backend ({backend.distribution} latency around {backend.latency_seconds}s)")
+        return backend
+    if name != "gemini":
+        raise ValueError(f"Unknown SAHAYAK_BACKEND {name!r}; expected one of {BACKENDS}")
+    
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY is required")
+    backend = GeminiBackend(
+        api_key,
+        TEXT_MODEL_NAME,
+        VISION_MODEL_NAME,
+        text_system_instruction=SAHAYAK_SYSTEM_PROMPT,
+        vision_system_instruction=VISION_SYSTEM_PROMPT,
+        executor_factory=get_model_executor,
+        use_async_sdk=USE_ASYNC_SDK,
+        max_threads=MODEL_THREAD_POOL_SIZE
+    )
+    logger.info("Sahayak API initialized with Gemini successfully")
+    return backend
+
 class SahayakAPI:
-    def __init__(self, api_key: str = None):
-        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY is required")
-        
+    def __init__(self, api_key: str = None, scheduler: UpstreamScheduler = None, backend: ModelBackend = None):
         try:
-            genai.configure(api_key=self.api_key)
-            self.text_model = genai.GenerativeModel(
-                model_name="gemini-1.5-flash",
-                system_instruction=SAHAYAK_SYSTEM_PROMPT
-            )
-            
-            self.vision_model = genai.GenerativeModel(
-                model_name="gemini-1.5-pro-vision",
-                system_instruction=VISION_SYSTEM_PROMPT
-            )
-            
-            logger.info("Sahayak API initialized with Gemini successfully")
+            self.backend = backend or create_model_backend(api_key)
         except Exception as e:
             logger.error(f"Failed to initialize SahayakAPI: {e}")
             raise
+        self.text_model = self.backend.text_model
+        self.vision_model = self.backend.vision_model
+        
+        self.inflight_calls = 0
+        # Every model call goes through one scheduler so limits apply process-wide
+        self.scheduler = scheduler or UpstreamScheduler.from_env()
     
-    async def generate_educational_content_with_retry(self, prompt: str, max_retries: int = 3, **kwargs) -> str:
-        """Generate educational content with retry logic"""
+    async def _generate(self, model, contents, **kwargs):
+        """Run a model call without blocking the event loop"""
+        self.inflight_calls += 1
+        try:
+            return await self.backend.generate(model, contents, **kwargs)
+        finally:
+            self.inflight_calls -= 1
+    
+    def executor_stats(self) -> dict:
+        """Report how model calls are being executed"""
+        return {**self.backend.stats(), "inflight_calls": self.inflight_calls}
+    
+    async def _call_model(
+        self, model, contents, label: str, max_retries: int = 3,
+        max_output_tokens: Optional[int] = None, response_mime_type: Optional[str] = None, **kwargs
+    ) -> str:
+        """Generate text through the upstream scheduler, retrying only retryable failures"""
+        generation_config = {}
+        if max_output_tokens:
+            generation_config["max_output_tokens"] = max_output_tokens
+        if response_mime_type:
+            generation_config["response_mime_type"] = response_mime_type
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        INPUT_TOKENS.labels(label).observe(prompt_tokens(contents))
+        
+        async def attempt():
+            response = await self._generate(model, contents, **kwargs)
+            # response.text raises ValueError for blocked prompts, which is not retryable
+            if not response or not response.text:
+                raise EmptyResponseError("Empty response from API")
+            return response
+        
+        try:
+            response = await self.scheduler.run(
+                attempt, estimate_request_tokens(contents, max_output_tokens), max_retries=max_retries, label=label
+            )
+        except UpstreamCallFailed as e:
+            raise upstream_http_error(e)
+        return response.text
+    
+    async def _generate_stream(self, model, contents, label: str = "Streaming generation", max_output_tokens: Optional[int] = None, **kwargs):
+        """Yield text chunks from a streaming Gemini call without blocking the event loop"""
+        if max_output_tokens:
+            kwargs["generation_config"] = {"max_output_tokens": max_output_tokens}
+        self.inflight_calls += 1
+        try:
+            async with self.scheduler.slot(estimate_request_tokens(contents, max_output_tokens), label):
+                chunks = self.backend.stream(model, contents, **kwargs)
+                try:
+                    async for text in chunks:
+                        yield text
+                finally:
+                    await chunks.aclose()
+        finally:
+            self.inflight_calls -= 1
+    
+    async def stream_with_retry(self, model, contents, max_retries: int = 3, label: str = "Streaming generation", max_output_tokens: Optional[int] = None):
+        """Stream text chunks, retrying only until the first chunk has been produced
+        
+        Every chunk is awaited within the request deadline, so a stalled stream is
+        cancelled upstream instead of holding its slot past the client's budget.
+        """
+        deadline = current_deadline()
+        INPUT_TOKENS.labels(label).observe(prompt_tokens(contents))
         for attempt in range(max_retries):
+            stream = self._generate_stream(model, contents, label, max_output_tokens)
+            try:
+                first_chunk = await within_deadline(stream.__anext__(), deadline)
+            except Exception as e:
+                await stream.aclose()
+                if isinstance(e, StopAsyncIteration):
+                    e = EmptyResponseError("Empty response from API")
+                logger.warning(f"{label} attempt {attempt + 1} failed before first chunk: {e}")
+                if not is_retryable(e) or attempt == max_retries - 1:
+                    self.scheduler.record_attempts(label, attempt + 1)
+                    raise upstream_http_error(UpstreamCallFailed(label, attempt + 1, e))
+                try:
+                    await self.scheduler.backoff(attempt, e, label)
+                except DeadlineExceeded as deadline_error:
+                    self.scheduler.record_attempts(label, attempt + 1)
+                    raise upstream_http_error(UpstreamCallFailed(label, attempt + 1, deadline_error))
+                continue
+            self.scheduler.record_attempts(label, attempt + 1)
+            
+            # Once the first byte is out, failures are reported to the client instead of retried
             try:
-                enhanced_prompt = f"""
+                yield first_chunk
+                while True:
+                    try:
+                        chunk = await within_deadline(stream.__anext__(), deadline)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+    
+    def build_content_prompt(self, prompt: str, **kwargs) -> str:
+        prompt = truncate_to_tokens(prompt, MAX_INPUT_TOKENS)
+        return f"""
                 Context: Multi-grade classroom in {kwargs.get('location', 'rural India')}
                 Grade levels: {kwargs.get('grade_levels', [4, 5, 6])}
                 Subject: {kwargs.get('subject', 'general')}
@@ -261,23 +657,21 @@ class SahayakAPI:
                 Please create comprehensive educational content that addresses all grade levels mentioned,
                 uses culturally relevant examples, and provides practical implementation suggestions.
                 """
-                
-                response = self.text_model.generate_content(enhanced_prompt)
-                if response and response.text:
-                    logger.info(f"Content generated successfully on attempt {attempt + 1}")
-                    return response.text
-                else:
-                    raise Exception("Empty response from API")
-                    
-            except Exception as e:
-                logger.warning(f"Attempt {attempt + 1} failed: {e}")
-                if attempt == max_retries - 1:
-                    logger.error(f"All {max_retries} attempts failed for content generation")
-                    raise HTTPException(
-                        status_code=500, 
-                        detail=f"Content generation failed after {max_retries} attempts: {str(e)}"
-                    )
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+    
+    def stream_educational_content(self, prompt: str, max_tokens: Optional[int] = None, **kwargs):
+        """Stream educational content chunks as they are generated"""
+        return self.stream_with_retry(
+            self.text_model, self.build_content_prompt(prompt, **kwargs), label="Content generation",
+            max_output_tokens=output_token_limit(max_tokens, MAX_OUTPUT_TOKENS)
+        )
+    
+    async def generate_educational_content_with_retry(self, prompt: str, max_retries: int = 3, max_tokens: Optional[int] = None, **kwargs) -> str:
+        """Generate educational content with retry logic"""
+        enhanced_prompt = self.build_content_prompt(prompt, **kwargs)
+        return await self._call_model(
+            self.text_model, enhanced_prompt, label="Content generation", max_retries=max_retries,
+            max_output_tokens=output_token_limit(max_tokens, MAX_OUTPUT_TOKENS)
+        )
     
     def generate_educational_content(self, prompt: str, **kwargs) -> str:
         """Synchronous wrapper for content generation"""
@@ -291,25 +685,32 @@ class SahayakAPI:
             self.generate_educational_content_with_retry(prompt, **kwargs)
         )
     
-    async def analyze_educational_image_with_retry(self, image_data: str, prompt: str = None, max_retries: int = 3) -> str:
-        """Analyze educational image with retry logic"""
-        for attempt in range(max_retries):
-            try:
-                # Validate and process image data
+    async def analyze_educational_image_with_retry(self, image_data: Union[str, bytes, memoryview, PreparedImage], prompt: str = None, max_retries: int = 3, max_tokens: Optional[int] = None) -> str:
+        """Analyze educational image with retry logic
+        
+        Accepts an already preprocessed image, raw image bytes or a base64 / data URL
+        string. The image is prepared once per request; retries reuse it.
+        """
+        if isinstance(image_data, str):
+            with span("base64"):
                 if ',' in image_data:
                     image_data = image_data.split(',')[1]  # Remove data URL prefix
-                
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-                
-                # Resize image if too large (to reduce API costs)
-                max_size = (1024, 1024)
-                image.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                if not prompt:
-                    prompt = "Analyze this educational image and provide multi-grade teaching suggestions for a low-resource classroom."
-                
-                enhanced_prompt = f"""
+                image_data = base64.b64decode(image_data)
+        
+        if isinstance(image_data, PreparedImage):
+            image = image_data
+        else:
+            try:
+                with span("preprocess"):
+                    image = await asyncio.to_thread(preprocess_image, image_data)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+        
+        if not prompt:
+            prompt = "Analyze this educational image and provide multi-grade teaching suggestions for a low-resource classroom."
+        prompt = truncate_to_tokens(prompt, MAX_INPUT_TOKENS)
+        
+        enhanced_prompt = f"""
                 {prompt}
                 
                 Please extract all educational content and provide specific suggestions for:
@@ -319,23 +720,35 @@ class SahayakAPI:
                 4. Resource-minimal teaching strategies
                 5. Assessment without expensive tools
                 """
+        
+        return await self._call_model(
+            self.vision_model, [enhanced_prompt, image.as_blob()], label="Image analysis", max_retries=max_retries,
+            max_output_tokens=output_token_limit(max_tokens, IMAGE_ANALYSIS_MAX_OUTPUT_TOKENS)
+        )
+    
+    async def summarize_pages(self, analyses: List[Tuple[int, str]], grade_levels: List[int], max_tokens: Optional[int] = None) -> str:
+        """Merge per-page analyses of a chapter into one multi-grade summary"""
+        # Share the input budget between pages so long chapters cannot blow it up
+        per_page = max(100, PAGES_SUMMARY_INPUT_TOKENS // max(1, len(analyses)))
+        pages = "\n\n".join(
+            f"Page {number}:\n{truncate_to_tokens(analysis, per_page)}" for number, analysis in analyses
+        )
+        prompt = f"""
+                Below are analyses of {len(analyses)} pages of one textbook chapter, in page order.
                 
-                response = self.vision_model.generate_content([enhanced_prompt, image])
-                if response and response.text:
-                    logger.info(f"Image analysis successful on attempt {attempt + 1}")
-                    return response.text
-                else:
-                    raise Exception("Empty response from vision API")
-                    
-            except Exception as e:
-                logger.warning(f"Image analysis attempt {attempt + 1} failed: {e}")
-                if attempt == max_retries - 1:
-                    logger.error(f"All {max_retries} attempts failed for image analysis")
-                    raise HTTPException(
-                        status_code=500, 
-                        detail=f"Image analysis failed after {max_retries} attempts: {str(e)}"
-                    )
-                await asyncio.sleep(2 ** attempt)
+                {pages}
+                
+                Merge them into a single teaching summary of the chapter for grade levels {grade_levels}:
+                1. Key concepts of the chapter, in teaching order
+                2. What each grade level should take away
+                3. Blackboard activities that span the chapter
+                4. Local, low-cost examples and materials
+                5. Quick assessment ideas for each grade
+                """
+        return await self._call_model(
+            self.text_model, prompt, label="Chapter summary",
+            max_output_tokens=output_token_limit(max_tokens, PAGES_SUMMARY_MAX_OUTPUT_TOKENS)
+        )
     
     def analyze_educational_image(self, image_data: str, prompt: str = None) -> str:
         """Synchronous wrapper for image analysis"""
@@ -349,15 +762,16 @@ class SahayakAPI:
             self.analyze_educational_image_with_retry(image_data, prompt)
         )
     
-    def create_lesson_plan(self, topic: str, grade_levels: List[int], **kwargs) -> str:
-        try:
-            prompt = f"""
+    def build_lesson_plan_prompt(self, topic: str, grade_levels: List[int], **kwargs) -> str:
+        topic = truncate_to_tokens(topic, MAX_INPUT_TOKENS // 2)
+        resources = truncate_to_tokens(kwargs.get('resources', 'blackboard, chalk, local materials'), MAX_INPUT_TOKENS // 2)
+        return f"""
             Create a detailed lesson plan for teaching "{topic}" in a multi-grade classroom.
             
             Specifications:
             - Grade levels: {grade_levels}
             - Duration: {kwargs.get('duration_minutes', 45)} minutes
-            - Available resources: {kwargs.get('resources', 'blackboard, chalk, local materials')}
+            - Available resources: {resources}
             - Location context: {kwargs.get('location', 'rural India')}
             
             Include:
@@ -372,35 +786,434 @@ class SahayakAPI:
             
             Make it immediately implementable by a teacher with minimal resources.
             """
+    
+    def stream_lesson_plan(self, topic: str, grade_levels: List[int], max_tokens: Optional[int] = None, **kwargs):
+        """Stream lesson plan chunks as they are generated"""
+        return self.stream_with_retry(
+            self.text_model, self.build_lesson_plan_prompt(topic, grade_levels, **kwargs), label="Lesson plan generation",
+            max_output_tokens=output_token_limit(max_tokens, LESSON_PLAN_MAX_OUTPUT_TOKENS)
+        )
+    
+    async def create_lesson_plan(self, topic: str, grade_levels: List[int], max_tokens: Optional[int] = None, **kwargs) -> str:
+        prompt = self.build_lesson_plan_prompt(topic, grade_levels, **kwargs)
+        return await self._call_model(
+            self.text_model, prompt, label="Lesson plan generation",
+            max_output_tokens=output_token_limit(max_tokens, LESSON_PLAN_MAX_OUTPUT_TOKENS)
+        )
+    
+    def build_shared_section_prompt(self, topic: str, bands: List[str], **kwargs) -> str:
+        topic = truncate_to_tokens(topic, MAX_INPUT_TOKENS // 2)
+        resources = truncate_to_tokens(kwargs.get('resources', 'blackboard, chalk, local materials'), MAX_INPUT_TOKENS // 2)
+        return f"""
+            Create the shared, whole-class part of a lesson plan for teaching "{topic}" in a multi-grade classroom.
+            
+            Specifications:
+            - Learners: {", ".join(bands)}
+            - Duration: {kwargs.get('duration_minutes', 45)} minutes
+            - Available resources: {resources}
+            - Location context: {kwargs.get('location', 'rural India')}
+            
+            Respond with a JSON object with these keys, each a list of short strings unless noted:
+            - "overview": a string of two or three sentences
+            - "cultural_connections": local examples and connections
+            - "materials": only from the available resources
+            - "whole_class_activities": activities all grades do together, with minutes
+            - "blackboard_visuals": visual aids that can be drawn on the blackboard
+            - "homework_with_families": homework suggestions involving families
+            """
+    
+    def build_grade_section_prompt(self, topic: str, grade: int, **kwargs) -> str:
+        topic = truncate_to_tokens(topic, MAX_INPUT_TOKENS // 2)
+        resources = truncate_to_tokens(kwargs.get('resources', 'blackboard, chalk, local materials'), MAX_INPUT_TOKENS // 2)
+        return f"""
+            Create the grade {grade} part of a multi-grade lesson plan for teaching "{topic}".
+            The other grades in the room work on their own parts at the same time.
             
-            response = self.text_model.generate_content(prompt)
-            return response.text
+            Specifications:
+            - Duration: {kwargs.get('duration_minutes', 45)} minutes
+            - Available resources: {resources}
+            - Location context: {kwargs.get('location', 'rural India')}
             
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Lesson plan generation failed: {str(e)}")
-# Global API instance
-sahayak_api = None
-
-async def get_sahayak_api():
-    """Get or create Sahayak API instance"""
-    global sahayak_api
-    if sahayak_api is None:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            logger.error("GEMINI_API_KEY not found in environment variables")
-            raise HTTPException(
-                status_code=500, 
-                detail="API key not configured. Please set GEMINI_API_KEY environment variable."
-            )
-        
+            Respond with a JSON object with these keys, each a list of short strings:
+            - "learning_objectives": for grade {grade}
+            - "activities": grade {grade} activities using available materials only, with minutes
+            - "differentiation": support for slower and faster learners
+            - "assessment": checks without expensive tools
+            - "extension_activities": for fast finishers
+            """
+    
+    async def create_lesson_plan_section(self, topic: str, grade_levels: List[int], grade: Optional[int] = None, **kwargs) -> dict:
+        """Generate one section of a sectioned lesson plan: the shared part (grade None) or one grade's part"""
+        if grade is None:
+            prompt = self.build_shared_section_prompt(topic, grade_bands(grade_levels), **kwargs)
+        else:
+            prompt = self.build_grade_section_prompt(topic, grade, **kwargs)
+        text = await self._call_model(
+            self.text_model, prompt, label="Lesson plan section",
+            max_output_tokens=LESSON_SECTION_MAX_OUTPUT_TOKENS, response_mime_type="application/json"
+        )
+        return parse_json_section(text)
+async def get_sahayak_api() -> SahayakAPI:
+    """Get the Sahayak API instance, waiting for startup to build it if needed"""
+    if model_clients is None:
+        raise HTTPException(status_code=503, detail="Sahayak API not initialized")
+    try:
+        return await within_deadline(model_clients.get("sahayak"))
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded while the API was starting")
+    except ClientUnavailable as e:
+        raise HTTPException(status_code=500, detail=f"API initialization failed: {e}")
+
+# Fields that do not change the output stay out of cache and dedupe keys
+NON_OUTPUT_FIELDS = {"timeout_seconds", "allow_similar"}
+
+def content_cache_key(request: TextRequest) -> str:
+    return make_cache_key("content", TEXT_MODEL_NAME, PROMPT_TEMPLATE_VERSION, request.model_dump(exclude=NON_OUTPUT_FIELDS))
+
+def lesson_plan_cache_key(request: LessonPlanRequest) -> str:
+    return make_cache_key("lesson_plan", TEXT_MODEL_NAME, PROMPT_TEMPLATE_VERSION, request.model_dump(exclude=NON_OUTPUT_FIELDS))
+
+def lesson_section_cache_key(request: LessonPlanRequest, grade: Optional[int]) -> str:
+    """Key one section of a sectioned plan by the grade (or grade bands) it covers, not the whole grade set"""
+    fields = request.model_dump(exclude={"grade_levels", "max_tokens"} | NON_OUTPUT_FIELDS)
+    if grade is None:
+        fields.update({"section": "shared", "bands": grade_bands(request.grade_levels)})
+    else:
+        fields.update({"section": "grade", "grade": grade})
+    return make_cache_key("lesson_section", TEXT_MODEL_NAME, PROMPT_TEMPLATE_VERSION, fields)
+
+def similarity_scope(request: TextRequest) -> str:
+    """Everything but the prompt: only prompts within the same scope can share an answer"""
+    return make_cache_key(
+        "similar_content", TEXT_MODEL_NAME, PROMPT_TEMPLATE_VERSION,
+        request.model_dump(exclude={"prompt"} | NON_OUTPUT_FIELDS)
+    )
+
+def lookup_pack(key: str, read: bool) -> Optional[str]:
+    """Precomputed answer from the offline content packs, if any are loaded"""
+    if content_packs is None or not read:
+        return None
+    return content_packs.get(key)
+
+async def generate_content_for(api: SahayakAPI, request: TextRequest) -> str:
+    return await api.generate_educational_content_with_retry(
+        prompt=request.prompt,
+        grade_levels=request.grade_levels,
+        subject=request.subject,
+        location=request.location,
+        max_tokens=request.max_tokens
+    )
+
+async def generate_lesson_plan_for(api: SahayakAPI, request: LessonPlanRequest) -> str:
+    return await api.create_lesson_plan(
+        topic=request.topic,
+        grade_levels=request.grade_levels,
+        duration_minutes=request.duration_minutes,
+        resources=request.resources,
+        location=request.location,
+        max_tokens=request.max_tokens
+    )
+
+async def lookup_similar(request: TextRequest, read: bool) -> Optional[str]:
+    """Answer cached for a similarly phrased prompt in the same scope, if allowed"""
+    if similarity_cache is None or not read:
+        return None
+    if not request.allow_similar:
+        similarity_cache.record_bypass()
+        return None
+    match = await similarity_cache.get(similarity_scope(request), request.prompt)
+    return match[0] if match else None
+
+async def cached_fallback(key: str, request: Optional[TextRequest] = None) -> Optional[str]:
+    """Any stored answer for a request, even one the request asked to skip; used while the model circuit is open"""
+    packed = lookup_pack(key, True)
+    if packed is not None:
+        return packed
+    if response_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return cached
+    if request is not None and similarity_cache is not None:
+        match = await similarity_cache.get(similarity_scope(request), request.prompt)
+        if match:
+            return match[0]
+    return None
+
+def image_analysis_scope(prompt: Optional[str], grade_levels: List[int]) -> str:
+    return make_cache_key(
+        "image_analysis", VISION_MODEL_NAME, PROMPT_TEMPLATE_VERSION,
+        {"prompt": prompt or "", "grade_levels": grade_levels}
+    )
+
+def cache_policy(http_request: Optional[Request], cache=None) -> Tuple[bool, bool]:
+    """Decide whether a request may read from and write to a cache (the response cache by default)
+    
+    The policy also governs content packs and the similarity cache, so it follows
+    the Cache-Control header even when the response cache itself is disabled.
+    """
+    cache = cache or response_cache
+    header = http_request.headers.get("cache-control") if http_request else None
+    read, write = parse_cache_control(header)
+    if not read and cache is not None:
+        cache.record_bypass()
+    return read, write
+
+async def coalesced(key: str, generate) -> Tuple[str, bool]:
+    """Run generate() once for all concurrent callers with the same key
+    
+    A caller stops waiting once its own deadline passes; the shared call keeps
+    running for the others. The shared call gets its own deadline, the default
+    request budget or the first caller's if that is longer, so a caller with a
+    short budget cannot make the call fail for callers with longer ones.
+    """
+    timeout = COALESCE_WAIT_TIMEOUT
+    remaining = remaining_time()
+    if remaining is not None:
+        timeout = max(0.0, remaining if timeout is None else min(timeout, remaining))
+    budget = REQUEST_TIMEOUT_SECONDS or None
+    if budget is not None and remaining is not None:
+        budget = max(budget, remaining)
+    try:
+        return await inflight_generations.do(key, generate, timeout=timeout, context=detached_context(budget))
+    except asyncio.TimeoutError:
+        if remaining is not None and timeout == max(0.0, remaining):
+            raise HTTPException(status_code=504, detail="Request deadline exceeded")
+        raise HTTPException(status_code=504, detail="Timed out waiting for an in-flight generation")
+
+async def produce_content(request: TextRequest, policy: Tuple[bool, bool] = (True, True)) -> Tuple[str, str]:
+    """Return generated content and its cache status (PACK, HIT, SIMILAR, MISS, BYPASS, COALESCED or FALLBACK)"""
+    read, write = policy
+    key = content_cache_key(request)
+    packed = lookup_pack(key, read)
+    if packed is not None:
+        return packed, "PACK"
+    if read and response_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return cached, "HIT"
+    similar = await lookup_similar(request, read)
+    if similar is not None:
+        return similar, "SIMILAR"
+    
+    api = await get_sahayak_api()
+    
+    async def generate():
+        content = await generate_content_for(api, request)
+        if write and response_cache:
+            await response_cache.set(key, content)
+        if write and similarity_cache:
+            await similarity_cache.set(similarity_scope(request), request.prompt, content)
+        return content
+    
+    try:
+        content, shared = await coalesced(key, generate)
+    except ModelUnavailable:
+        fallback = await cached_fallback(key, request)
+        if fallback is None:
+            raise
+        return fallback, "FALLBACK"
+    if shared:
+        return content, "COALESCED"
+    return content, "MISS" if read else "BYPASS"
+
+async def produce_lesson_plan(request: LessonPlanRequest, policy: Tuple[bool, bool] = (True, True)) -> Tuple[str, str]:
+    """Return a lesson plan and its cache status (PACK, HIT, MISS, BYPASS, COALESCED or FALLBACK)"""
+    read, write = policy
+    key = lesson_plan_cache_key(request)
+    packed = lookup_pack(key, read)
+    if packed is not None:
+        return packed, "PACK"
+    if read and response_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return cached, "HIT"
+    
+    api = await get_sahayak_api()
+    
+    async def generate():
+        lesson_plan = await generate_lesson_plan_for(api, request)
+        if write and response_cache:
+            await response_cache.set(key, lesson_plan)
+        return lesson_plan
+    
+    try:
+        lesson_plan, shared = await coalesced(key, generate)
+    except ModelUnavailable:
+        fallback = await cached_fallback(key)
+        if fallback is None:
+            raise
+        return fallback, "FALLBACK"
+    if shared:
+        return lesson_plan, "COALESCED"
+    return lesson_plan, "MISS" if read else "BYPASS"
+
+async def produce_lesson_section(
+    api: SahayakAPI, request: LessonPlanRequest, grade: Optional[int], policy: Tuple[bool, bool] = (True, True)
+) -> Tuple[dict, str]:
+    """Return one lesson plan section and its cache status (HIT, MISS, BYPASS, COALESCED or FALLBACK)"""
+    read, write = policy
+    key = lesson_section_cache_key(request, grade)
+    if read and response_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return json.loads(cached), "HIT"
+    
+    async def generate():
+        section = await api.create_lesson_plan_section(
+            topic=request.topic,
+            grade_levels=request.grade_levels,
+            grade=grade,
+            duration_minutes=request.duration_minutes,
+            resources=request.resources,
+            location=request.location
+        )
+        text = json.dumps(section)
+        if write and response_cache:
+            await response_cache.set(key, text)
+        return text
+    
+    try:
+        text, shared = await coalesced(key, generate)
+    except ModelUnavailable:
+        text = await cached_fallback(key)
+        if text is None:
+            raise
+        return json.loads(text), "FALLBACK"
+    if shared:
+        return json.loads(text), "COALESCED"
+    return json.loads(text), "MISS" if read else "BYPASS"
+
+async def lesson_section_result(api: SahayakAPI, request: LessonPlanRequest, grade: Optional[int], policy: Tuple[bool, bool]) -> dict:
+    """Produce one section, reporting failures in the result"""
+    started = time.perf_counter()
+    result = {"section": "shared" if grade is None else "grade", "grade": grade}
+    try:
+        content, cache_status = await produce_lesson_section(api, request, grade, policy)
+        result.update({"status": "ok", "content": content, "cache": cache_status})
+    except HTTPException as e:
+        result.update({"status": "error", "status_code": e.status_code, "error": e.detail})
+    except Exception as e:
+        logger.error(f"Lesson plan section {grade or 'shared'} failed: {e}")
+        result.update({"status": "error", "status_code": 500, "error": str(e)})
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+async def lesson_sections(api: SahayakAPI, request: LessonPlanRequest, policy: Tuple[bool, bool]):
+    """Generate the shared section and one section per grade concurrently, yielding results as they finish"""
+    grades = [None, *sorted(set(request.grade_levels))]
+    tasks = [asyncio.create_task(lesson_section_result(api, request, grade, policy)) for grade in grades]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def assemble_lesson_plan(results: List[dict]) -> dict:
+    """Merge finished sections into one plan, grades in ascending order"""
+    plan = {"shared": None, "grades": {}}
+    for result in sorted(results, key=lambda r: (r["grade"] is not None, r["grade"] or 0)):
+        if result["status"] != "ok":
+            continue
+        if result["grade"] is None:
+            plan["shared"] = result["content"]
+        else:
+            plan["grades"][str(result["grade"])] = result["content"]
+    return plan
+
+def sections_cache_status(results: List[dict]) -> str:
+    """HIT when every section came from cache, PARTIAL when some did, else MISS (or BYPASS)"""
+    statuses = {result.get("cache") for result in results}
+    if statuses == {"HIT"}:
+        return "HIT"
+    if "HIT" in statuses:
+        return "PARTIAL"
+    return "BYPASS" if statuses == {"BYPASS"} else "MISS"
+
+async def admit(endpoint_class: str) -> AdmissionTicket:
+    """Take an admission slot, or fail fast with 503 + Retry-After when overloaded"""
+    try:
+        with span("admission"):
+            return await within_deadline(admission.acquire(endpoint_class))
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded while waiting for admission")
+    except AdmissionRejected as e:
+        logger.warning(f"Shedding {endpoint_class} request: {e.reason}")
+        raise HTTPException(status_code=503, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+@asynccontextmanager
+async def admitted(endpoint_class: str):
+    """Hold an admission slot for the duration of the block"""
+    ticket = await admit(endpoint_class)
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _single_chunk(text: str):
+    yield text
+
+async def start_sse_stream(
+    chunks,
+    metadata: dict,
+    cache_status: str,
+    cache_key: Optional[str] = None,
+    ticket: Optional[AdmissionTicket] = None
+) -> StreamingResponse:
+    """Wait for the first chunk, then forward the rest of the stream as Server-Sent Events
+    
+    Errors raised before the first chunk (after retries) surface as a normal HTTP error;
+    later failures are sent to the client as an `error` event. The admission ticket,
+    if any, is held until the stream ends.
+    """
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="Empty response from API")
+    
+    async def events():
+        parts = [first_chunk] if cache_key else None
+        yield sse_event({"text": first_chunk})
         try:
-            sahayak_api = SahayakAPI(api_key)
-            logger.info("Sahayak API instance created successfully")
+            async for chunk in chunks:
+                if parts is not None:
+                    parts.append(chunk)
+                yield sse_event({"text": chunk})
         except Exception as e:
-            logger.error(f"Failed to create Sahayak API: {e}")
-            raise HTTPException(status_code=500, detail=f"API initialization failed: {str(e)}")
+            logger.error(f"Streaming failed after first chunk: {e}")
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            yield sse_event({"detail": detail}, event="error")
+            return
+        finally:
+            await chunks.aclose()
+            if ticket:
+                ticket.release()
+        
+        if parts is not None and response_cache:
+            await response_cache.set(cache_key, "".join(parts))
+        yield sse_event({"metadata": {**metadata, "timestamp": time.time()}}, event="done")
     
-    return sahayak_api
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache": cache_status},
+        # Also release if the client disconnects before the body starts
+        background=BackgroundTask(ticket.release) if ticket else None
+    )
+
+async def admitted_sse_stream(endpoint_class: str, open_chunks, metadata: dict, cache_status: str, cache_key: Optional[str] = None) -> StreamingResponse:
+    """Start a model stream under an admission slot that lasts until the stream ends"""
+    ticket = await admit(endpoint_class)
+    try:
+        return await start_sse_stream(open_chunks(), metadata, cache_status, cache_key, ticket)
+    except BaseException:
+        ticket.release()
+        raise
 
 @app.get("/")
 async def root():
@@ -411,24 +1224,82 @@ async def root():
         "problem_statement": "Empowering teachers in multi-grade classrooms"
     }
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "api_initialized": sahayak_api is not None}
+def _admission_inflight():
+    return {(name,): count for name, count in admission.inflight_by_class.items()}
+
+def _upstream_gauge(field: str):
+    def read():
+        api = current_sahayak_api()
+        return {(): api.scheduler.stats()[field]} if api else {}
+    return read
+
+REGISTRY.callback_gauge(
+    "sahayak_admission_inflight", "Admitted requests in progress by endpoint class", ("class",), _admission_inflight
+)
+REGISTRY.callback_gauge(
+    "sahayak_admission_queue_depth", "Requests waiting for admission", (), lambda: {(): admission.queue_depth}
+)
+REGISTRY.callback_gauge(
+    "sahayak_upstream_inflight", "Model calls in flight", (), _upstream_gauge("inflight")
+)
+REGISTRY.callback_gauge(
+    "sahayak_upstream_waiting", "Model calls waiting for a concurrency slot", (), _upstream_gauge("waiting")
+)
+REGISTRY.callback_gauge(
+    "sahayak_upstream_concurrency_limit", "Current adaptive upstream concurrency limit", (), _upstream_gauge("concurrency_limit")
+)
+
+def _circuit_state():
+    api = current_sahayak_api()
+    if not api:
+        return {}
+    state = api.scheduler.breaker.state
+    return {(name,): float(name == state) for name in ("closed", "half_open", "open")}
+
+REGISTRY.callback_gauge(
+    "sahayak_upstream_circuit_state", "Upstream circuit breaker state (1 for the current state)", ("state",), _circuit_state
+)
+REGISTRY.callback_gauge(
+    "sahayak_image_queue_depth", "Images waiting for a preprocessing worker", (),
+    lambda: {(): image_preprocessor.queue_depth} if image_preprocessor else {}
+)
+REGISTRY.callback_gauge(
+    "sahayak_jobs", "Background jobs in this process by state", ("state",),
+    lambda: {("queued",): job_manager.stats()["queued"], ("running",): job_manager.stats()["running"]} if job_manager else {}
+)
+REGISTRY.callback_gauge(
+    "sahayak_coalesce_inflight_keys", "Distinct generations currently shared between callers", (),
+    lambda: {(): inflight_generations.stats()["inflight_keys"]}
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache hit/miss/eviction counters and request coalescing counters"""
+    extra = {
+        "coalescing": inflight_generations.stats(),
+        "image_analysis": image_analysis_cache.stats() if image_analysis_cache else {"enabled": False},
+        "similarity": similarity_cache.stats() if similarity_cache else {"enabled": False},
+        "content_packs": content_packs.stats() if content_packs else {"enabled": False}
+    }
+    if response_cache is None:
+        return {"enabled": False, **extra}
+    return {"enabled": True, **response_cache.stats(), **extra}
 
 @app.post("/generate-content")
-async def generate_content(request: TextRequest):
+async def generate_content(request: TextRequest, http_request: Request, response: Response):
     """Generate educational content with enhanced error handling"""
     try:
-        api = await get_sahayak_api()
-        
         logger.info(f"Generating content for grades {request.grade_levels}, subject: {request.subject}")
+        apply_request_deadline(request.timeout_seconds)
         
-        content = await api.generate_educational_content_with_retry(
-            prompt=request.prompt,
-            grade_levels=request.grade_levels,
-            subject=request.subject,
-            location=request.location
-        )
+        async with admitted("interactive"):
+            content, cache_status = await produce_content(request, cache_policy(http_request))
+        response.headers["X-Cache"] = cache_status
         
         return {
             "content": content,
@@ -445,10 +1316,122 @@ async def generate_content(request: TextRequest):
         logger.error(f"Content generation error: {e}")
         raise HTTPException(status_code=500, detail=f"Content generation failed: {str(e)}")
 
+@app.post("/generate-content/stream")
+async def generate_content_stream(request: TextRequest, http_request: Request):
+    """Stream educational content as Server-Sent Events"""
+    apply_request_deadline(request.timeout_seconds)
+    read, write = cache_policy(http_request)
+    key = content_cache_key(request)
+    metadata = {
+        "grade_levels": request.grade_levels,
+        "subject": request.subject,
+        "location": request.location
+    }
+    packed = lookup_pack(key, read)
+    if packed is not None:
+        return await start_sse_stream(_single_chunk(packed), metadata, "PACK")
+    if read and response_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return await start_sse_stream(_single_chunk(cached), metadata, "HIT")
+    similar = await lookup_similar(request, read)
+    if similar is not None:
+        return await start_sse_stream(_single_chunk(similar), metadata, "SIMILAR")
+    
+    api = await get_sahayak_api()
+    logger.info(f"Streaming content for grades {request.grade_levels}, subject: {request.subject}")
+    open_chunks = functools.partial(
+        api.stream_educational_content,
+        prompt=request.prompt,
+        grade_levels=request.grade_levels,
+        subject=request.subject,
+        location=request.location,
+        max_tokens=request.max_tokens
+    )
+    try:
+        return await admitted_sse_stream("interactive", open_chunks, metadata, "MISS" if read else "BYPASS", key if write else None)
+    except ModelUnavailable:
+        fallback = await cached_fallback(key, request)
+        if fallback is None:
+            raise
+        return await start_sse_stream(_single_chunk(fallback), metadata, "FALLBACK")
+
+async def read_upload(file: UploadFile, max_size: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Read an upload with a single bounded read
+    
+    Starlette has already spooled the body, so one read yields a single bytes object
+    that the decoder wraps without further copies.
+    """
+    too_large = HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_size // (1024 * 1024)}MB")
+    if file.size is not None and file.size > max_size:
+        raise too_large
+    with span("upload"):
+        data = await file.read(max_size + 1)
+    if len(data) > max_size:
+        raise too_large
+    return data
+
+async def preprocess_upload(image_bytes: bytes) -> PreparedImage:
+    """Run an upload through the image preprocessing stage"""
+    try:
+        prepared = await image_preprocessor.process(image_bytes)
+    except PreprocessQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Image processing is busy, please retry shortly",
+            headers={"Retry-After": "2"}
+        )
+    except PreprocessUnavailable as e:
+        logger.error(f"Image preprocessing unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Image processing is temporarily unavailable, please retry shortly",
+            headers={"Retry-After": "2"}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Image preprocessing timed out")
+    except OSError as e:
+        # Decoding failed (PIL's UnidentifiedImageError is an OSError): the upload is not a usable image
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+    except Exception as e:
+        logger.error(f"Image preprocessing failed: {e}")
+        raise HTTPException(status_code=503, detail="Image processing failed, please retry shortly")
+    # The stages ran in a worker; report them as spans of this request
+    for stage, ms in prepared.timings.items():
+        if stage != "total_ms":
+            record_span(f"image_{stage[:-3]}", ms)
+    return prepared
+
+def image_cache_policy(http_request: Request) -> Tuple[bool, bool]:
+    if image_analysis_cache is None:
+        return False, False
+    return cache_policy(http_request, image_analysis_cache)
+
+async def analyze_prepared(api: SahayakAPI, prepared: PreparedImage, grade_levels: List[int], policy: Tuple[bool, bool]) -> Tuple[str, str, Optional[int]]:
+    """Analyze a preprocessed image; return (analysis, cache status, hash distance of a hit)"""
+    read, write = policy
+    # Repeated photos of the same page hit the perceptual-hash cache
+    scope = image_analysis_scope(None, grade_levels)
+    cached = await image_analysis_cache.get(scope, prepared.dhash, prepared.thumbnail) if read else None
+    if cached is not None:
+        analysis, distance = cached
+        return analysis, "HIT", distance
+    try:
+        analysis = await api.analyze_educational_image_with_retry(prepared)
+    except ModelUnavailable:
+        cached = await image_analysis_cache.get(scope, prepared.dhash, prepared.thumbnail) if image_analysis_cache and not read else None
+        if cached is None:
+            raise
+        return cached[0], "FALLBACK", cached[1]
+    if write:
+        await image_analysis_cache.set(scope, prepared.dhash, prepared.thumbnail, analysis)
+    return analysis, "MISS" if read else "BYPASS", None
+
 @app.post("/analyze-image")
-async def analyze_image(file: UploadFile = File(...), grade_levels: str = "4,5,6"):
+async def analyze_image(http_request: Request, response: Response, file: UploadFile = File(...), grade_levels: str = "4,5,6"):
     """Analyze educational image with enhanced validation"""
     try:
+        apply_request_deadline()
         api = await get_sahayak_api()
         
         # Validate file type
@@ -456,17 +1439,8 @@ async def analyze_image(file: UploadFile = File(...), grade_levels: str = "4,5,6
             raise HTTPException(status_code=400, detail="File must be an image")
         
         # Check file size (limit to 10MB)
-        max_size = 10 * 1024 * 1024  # 10MB
-        file_size = 0
-        image_bytes = b""
-        
-        async for chunk in file.stream():
-            file_size += len(chunk)
-            if file_size > max_size:
-                raise HTTPException(status_code=413, detail="File too large. Maximum size is 10MB")
-            image_bytes += chunk
-        
-        image_data = base64.b64encode(image_bytes).decode('utf-8')
+        image_bytes = await read_upload(file)
+        file_size = len(image_bytes)
         
         # Parse grade levels
         try:
@@ -476,7 +1450,16 @@ async def analyze_image(file: UploadFile = File(...), grade_levels: str = "4,5,6
         
         logger.info(f"Analyzing image for grades {grade_list}")
         
-        analysis = await api.analyze_educational_image_with_retry(image_data)
+        async with admitted("image"):
+            prepared = await preprocess_upload(image_bytes)
+            del image_bytes
+            
+            analysis, cache_status, distance = await analyze_prepared(
+                api, prepared, grade_list, image_cache_policy(http_request)
+            )
+            response.headers["X-Cache"] = cache_status
+            if distance is not None:
+                response.headers["X-Cache-Distance"] = str(distance)
         
         return {
             "analysis": analysis,
@@ -484,6 +1467,8 @@ async def analyze_image(file: UploadFile = File(...), grade_levels: str = "4,5,6
                 "grade_levels": grade_list,
                 "file_name": file.filename,
                 "file_size": file_size,
+                "image_size": [prepared.width, prepared.height],
+                "preprocessing": prepared.timings,
                 "timestamp": time.time()
             }
         }
@@ -494,20 +1479,157 @@ async def analyze_image(file: UploadFile = File(...), grade_levels: str = "4,5,6
         logger.error(f"Image analysis error: {e}")
         raise HTTPException(status_code=500, detail=f"Image analysis failed: {str(e)}")
 
+def upload_size(file: UploadFile) -> int:
+    """Size of a spooled upload, without reading it"""
+    if file.size is not None:
+        return file.size
+    position = file.file.tell()
+    size = file.file.seek(0, os.SEEK_END)
+    file.file.seek(position)
+    return size
+
+def close_pdfs(entries: List[Tuple[UploadFile, Optional[PdfPages]]]):
+    for _, pdf in entries:
+        if pdf is not None:
+            pdf.close()
+
+async def open_page_uploads(files: List[UploadFile]) -> Tuple[List[Tuple[UploadFile, Optional[PdfPages]]], int]:
+    """Validate a multi-page upload and open its PDFs; return (uploads, total page count)
+    
+    Nothing is read into memory here: PDFs are opened straight from the spooled
+    upload, and PDFium only reads the parts of a file it needs as its pages are
+    rendered.
+    """
+    entries, total, total_bytes = [], 0, 0
+    try:
+        for file in files:
+            size = upload_size(file)
+            total_bytes += size
+            if total_bytes > PAGES_MAX_TOTAL_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Upload too large. Maximum total size is {PAGES_MAX_TOTAL_BYTES // (1024 * 1024)}MB"
+                )
+            if is_pdf(file.content_type, file.filename):
+                if size > PAGES_MAX_PDF_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"{file.filename}: file too large. Maximum size is {PAGES_MAX_PDF_BYTES // (1024 * 1024)}MB"
+                    )
+                try:
+                    pdf = PdfPages(file.file)
+                except PdfUnavailable as e:
+                    raise HTTPException(status_code=415, detail=str(e))
+                entries.append((file, pdf))
+                try:
+                    total += await pdf.open()
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid PDF {file.filename}: {str(e)}")
+            elif file.content_type and file.content_type.startswith('image/'):
+                entries.append((file, None))
+                total += 1
+            else:
+                raise HTTPException(status_code=400, detail=f"{file.filename}: file must be an image or a PDF")
+            if total > PAGES_MAX_PAGES:
+                raise HTTPException(status_code=413, detail=f"Too many pages. Maximum is {PAGES_MAX_PAGES}")
+        if total == 0:
+            raise HTTPException(status_code=400, detail="No pages to analyze")
+    except BaseException:
+        close_pdfs(entries)
+        raise
+    return entries, total
+
+async def page_sources(entries: List[Tuple[UploadFile, Optional[PdfPages]]]):
+    """Yield the pages of an upload in order; page bytes are read or rendered only when a page starts"""
+    number = 0
+    for file, pdf in entries:
+        if pdf is None:
+            number += 1
+            yield PageSource(number, file.filename, functools.partial(read_upload, file))
+            continue
+        for index in range(pdf.page_count):
+            number += 1
+            yield PageSource(number, f"{file.filename}#{index + 1}", functools.partial(pdf.render, index))
+
+async def analyze_page(api: SahayakAPI, source: PageSource, grade_levels: List[int], policy: Tuple[bool, bool]) -> dict:
+    """Load, preprocess and analyze one page, reporting failures in the result"""
+    started = time.perf_counter()
+    result = {"page": source.number, "name": source.name}
+    try:
+        image_bytes = await source.load()
+        async with admitted("image"):
+            prepared = await preprocess_upload(image_bytes)
+            del image_bytes
+            analysis, cache_status, _ = await analyze_prepared(api, prepared, grade_levels, policy)
+        result.update({
+            "status": "ok",
+            "analysis": analysis,
+            "cache": cache_status,
+            "image_size": [prepared.width, prepared.height]
+        })
+    except HTTPException as e:
+        result.update({"status": "error", "status_code": e.status_code, "error": e.detail})
+    except Exception as e:
+        logger.error(f"Page {source.number} analysis failed: {e}")
+        result.update({"status": "error", "status_code": 500, "error": str(e)})
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+@app.post("/analyze-pages")
+async def analyze_pages(http_request: Request, files: List[UploadFile] = File(...), grade_levels: str = "4,5,6", summary: bool = True):
+    """Analyze a chapter from page photos and/or PDFs
+    
+    Pages are loaded lazily and analyzed a few at a time, so memory stays bounded
+    by the concurrency window rather than the chapter length. Results stream back
+    as NDJSON in completion order, followed by one merged multi-grade summary.
+    """
+    apply_request_deadline(default=PAGES_TIMEOUT_SECONDS)
+    api = await get_sahayak_api()
+    try:
+        grade_list = [int(g.strip()) for g in grade_levels.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid grade levels format")
+    
+    entries, total = await open_page_uploads(files)
+    policy = image_cache_policy(http_request)
+    concurrency = max(1, min(PAGES_CONCURRENCY, total))
+    logger.info(f"Analyzing {total} pages for grades {grade_list} with concurrency {concurrency}")
+    
+    async def results():
+        started = time.perf_counter()
+        analyses = []
+        try:
+            async for result in run_pages(
+                page_sources(entries),
+                lambda source: analyze_page(api, source, grade_list, policy),
+                concurrency
+            ):
+                if result["status"] == "ok":
+                    analyses.append((result["page"], result["analysis"]))
+                yield json.dumps(result) + "\n"
+        finally:
+            close_pdfs(entries)
+        
+        merged = {"pages": total, "succeeded": len(analyses), "failed": total - len(analyses)}
+        if summary and analyses:
+            try:
+                async with admitted("interactive"):
+                    merged["text"] = await api.summarize_pages(sorted(analyses), grade_list)
+            except HTTPException as e:
+                merged.update({"status_code": e.status_code, "error": e.detail})
+        merged["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        yield json.dumps({"summary": merged}) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.post("/create-lesson-plan")
-async def create_lesson_plan(request: LessonPlanRequest):
+async def create_lesson_plan(request: LessonPlanRequest, http_request: Request, response: Response):
     #Create comprehensive lesson plans for multi-grade classrooms
-    if not sahayak_api:
-        raise HTTPException(status_code=503, detail="Sahayak API not initialized")
-    
     try:
-        lesson_plan = sahayak_api.create_lesson_plan(
-            topic=request.topic,
-            grade_levels=request.grade_levels,
-            duration_minutes=request.duration_minutes,
-            resources=request.resources,
-            location=request.location
-        )
+        apply_request_deadline(request.timeout_seconds)
+        async with admitted("lesson_plan"):
+            lesson_plan, cache_status = await produce_lesson_plan(request, cache_policy(http_request))
+        response.headers["X-Cache"] = cache_status
         
         return {
             "lesson_plan": lesson_plan,
@@ -518,9 +1640,314 @@ async def create_lesson_plan(request: LessonPlanRequest):
                 "location": request.location
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/create-lesson-plan/sectioned")
+async def create_lesson_plan_sectioned(request: LessonPlanRequest, http_request: Request, response: Response):
+    """Create a lesson plan from a shared section plus one section per grade, generated concurrently
+    
+    Each section is cached on its own, so a later request with an overlapping grade
+    set only generates the grades (and grade bands) it has not seen before.
+    """
+    apply_request_deadline(request.timeout_seconds)
+    api = await get_sahayak_api()
+    async with admitted("lesson_plan"):
+        results = [result async for result in lesson_sections(api, request, cache_policy(http_request))]
+    failed = [result for result in results if result["status"] != "ok"]
+    if failed:
+        raise HTTPException(status_code=failed[0]["status_code"], detail=failed[0]["error"])
+    response.headers["X-Cache"] = sections_cache_status(results)
+    
+    return {
+        "lesson_plan": assemble_lesson_plan(results),
+        "sections": [
+            {key: result[key] for key in ("section", "grade", "cache", "elapsed_ms")}
+            for result in results
+        ],
+        "metadata": {
+            "topic": request.topic,
+            "grade_levels": request.grade_levels,
+            "duration": request.duration_minutes,
+            "location": request.location
+        }
+    }
+
+@app.post("/create-lesson-plan/sectioned/stream")
+async def create_lesson_plan_sectioned_stream(request: LessonPlanRequest, http_request: Request):
+    """Stream lesson plan sections as Server-Sent Events as they finish, then the assembled plan"""
+    apply_request_deadline(request.timeout_seconds)
+    api = await get_sahayak_api()
+    policy = cache_policy(http_request)
+    metadata = {
+        "topic": request.topic,
+        "grade_levels": request.grade_levels,
+        "duration": request.duration_minutes,
+        "location": request.location
+    }
+    ticket = await admit("lesson_plan")
+    
+    async def events():
+        results = []
+        try:
+            async for result in lesson_sections(api, request, policy):
+                results.append(result)
+                yield sse_event(result, event="section" if result["status"] == "ok" else "error")
+        finally:
+            ticket.release()
+        yield sse_event({
+            "lesson_plan": assemble_lesson_plan(results),
+            "cache": sections_cache_status(results),
+            "metadata": {**metadata, "timestamp": time.time()}
+        }, event="done")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also release if the client disconnects before the body starts
+        background=BackgroundTask(ticket.release)
+    )
+
+@app.post("/create-lesson-plan/stream")
+async def create_lesson_plan_stream(request: LessonPlanRequest, http_request: Request):
+    """Stream a lesson plan as Server-Sent Events"""
+    apply_request_deadline(request.timeout_seconds)
+    read, write = cache_policy(http_request)
+    key = lesson_plan_cache_key(request)
+    metadata = {
+        "topic": request.topic,
+        "grade_levels": request.grade_levels,
+        "duration": request.duration_minutes,
+        "location": request.location
+    }
+    packed = lookup_pack(key, read)
+    if packed is not None:
+        return await start_sse_stream(_single_chunk(packed), metadata, "PACK")
+    if read and response_cache:
+        cached = await response_cache.get(key)
+        if cached is not None:
+            return await start_sse_stream(_single_chunk(cached), metadata, "HIT")
+    
+    api = await get_sahayak_api()
+    open_chunks = functools.partial(
+        api.stream_lesson_plan,
+        topic=request.topic,
+        grade_levels=request.grade_levels,
+        duration_minutes=request.duration_minutes,
+        resources=request.resources,
+        location=request.location,
+        max_tokens=request.max_tokens
+    )
+    try:
+        return await admitted_sse_stream("lesson_plan", open_chunks, metadata, "MISS" if read else "BYPASS", key if write else None)
+    except ModelUnavailable:
+        fallback = await cached_fallback(key)
+        if fallback is None:
+            raise
+        return await start_sse_stream(_single_chunk(fallback), metadata, "FALLBACK")
+
+async def run_batch_item(index: int, item: BatchItem, semaphore: asyncio.Semaphore, policy: Tuple[bool, bool]) -> dict:
+    """Run one batch item through the normal admitted/cached/coalesced/retried path"""
+    async with semaphore:
+        started = time.perf_counter()
+        result = {"index": index, "id": item.id, "type": "content" if item.content else "lesson_plan"}
+        request = item.content or item.lesson_plan
+        try:
+            # Each item gets its own time budget, counted from when it starts running,
+            # and is admitted at batch priority, so interactive traffic goes first
+            with deadline_scope(request.timeout_seconds or REQUEST_TIMEOUT_SECONDS or None):
+                async with admitted("batch"):
+                    if item.content:
+                        text, cache_status = await produce_content(item.content, policy)
+                        result.update({"status": "ok", "content": text, "cache": cache_status})
+                    else:
+                        text, cache_status = await produce_lesson_plan(item.lesson_plan, policy)
+                        result.update({"status": "ok", "lesson_plan": text, "cache": cache_status})
+        except HTTPException as e:
+            result.update({"status": "error", "status_code": e.status_code, "error": e.detail})
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}")
+            result.update({"status": "error", "status_code": 500, "error": str(e)})
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+@app.post("/batch")
+async def batch_generate(request: BatchRequest, http_request: Request):
+    """Run many content / lesson plan requests concurrently, streaming NDJSON results as they finish"""
+    await get_sahayak_api()
+    concurrency = min(request.concurrency or BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    policy = cache_policy(http_request)
+    logger.info(f"Running batch of {len(request.items)} items with concurrency {concurrency}")
+    
+    async def results():
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(run_batch_item(index, item, semaphore, policy))
+            for index, item in enumerate(request.items)
+        ]
+        succeeded = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                succeeded += result["status"] == "ok"
+                yield json.dumps(result) + "\n"
+        finally:
+            # Stop outstanding work if the client goes away mid-batch
+            for task in tasks:
+                task.cancel()
+        
+        yield json.dumps({"summary": {
+            "total": len(tasks),
+            "succeeded": succeeded,
+            "failed": len(tasks) - succeeded,
+            "concurrency": concurrency,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+        }}) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+JOB_MAX_WAIT_SECONDS = float(os.getenv("SAHAYAK_JOBS_MAX_WAIT_SECONDS", "50"))
+JOB_POLL_INTERVAL_SECONDS = 2
+# Jobs have no waiting client, so their default budget is longer than a request's
+JOB_TIMEOUT_SECONDS = float(os.getenv("SAHAYAK_JOBS_TIMEOUT_SECONDS", "300"))
+
+async def run_job_call(endpoint_class: str, produce, timeout_seconds: Optional[float] = None):
+    """Run a job's generation under admission; when shed, defer the job instead of failing it"""
+    try:
+        with deadline_scope(timeout_seconds or JOB_TIMEOUT_SECONDS or None):
+            async with admitted(endpoint_class):
+                return await produce()
+    except HTTPException as e:
+        retry_after = (e.headers or {}).get("Retry-After")
+        if e.status_code == 503 and retry_after:
+            raise JobDeferred(float(retry_after), str(e.detail))
+        raise JobFailed(e.status_code, str(e.detail))
+
+async def content_job(payload: dict) -> dict:
+    request = TextRequest(**payload["request"])
+    content, cache_status = await run_job_call(
+        "interactive", lambda: produce_content(request, tuple(payload["policy"])), request.timeout_seconds
+    )
+    return {
+        "content": content,
+        "cache": cache_status,
+        "metadata": {
+            "grade_levels": request.grade_levels,
+            "subject": request.subject,
+            "location": request.location
+        }
+    }
+
+async def lesson_plan_job(payload: dict) -> dict:
+    request = LessonPlanRequest(**payload["request"])
+    await get_sahayak_api()
+    lesson_plan, cache_status = await run_job_call(
+        "lesson_plan", lambda: produce_lesson_plan(request, tuple(payload["policy"])), request.timeout_seconds
+    )
+    return {
+        "lesson_plan": lesson_plan,
+        "cache": cache_status,
+        "metadata": {
+            "topic": request.topic,
+            "grade_levels": request.grade_levels,
+            "duration": request.duration_minutes,
+            "location": request.location
+        }
+    }
+
+def register_job_handlers(manager: JobManager):
+    manager.register("content", content_job)
+    manager.register("lesson_plan", lesson_plan_job)
+
+def job_dedupe_key(kind: str, http_request: Request, cache_key: str, policy: Tuple[bool, bool]) -> Optional[str]:
+    """An Idempotency-Key header wins; otherwise identical requests share a job unless the client asked for fresh output"""
+    idempotency_key = http_request.headers.get("idempotency-key")
+    if idempotency_key:
+        return f"{kind}:idempotency:{idempotency_key}"
+    read, _ = policy
+    return f"{kind}:{cache_key}" if read else None
+
+async def submit_job(kind: str, payload: dict, dedupe_key: Optional[str], response: Response) -> dict:
+    if job_manager is None:
+        raise HTTPException(status_code=404, detail="Job mode is disabled")
+    try:
+        job, deduplicated = await job_manager.submit(kind, payload, dedupe_key)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Job queue is full: {e}",
+            headers={"Retry-After": "30"}
+        )
+    response.headers["Location"] = f"/jobs/{job['job_id']}"
+    if job["status"] not in FINISHED:
+        response.headers["Retry-After"] = str(JOB_POLL_INTERVAL_SECONDS)
+    return {**job, "deduplicated": deduplicated}
+
+@app.post("/jobs/content", status_code=202)
+async def submit_content_job(request: TextRequest, http_request: Request, response: Response):
+    """Queue educational content generation and return a job ID immediately"""
+    policy = cache_policy(http_request)
+    payload = {"request": request.model_dump(), "policy": list(policy)}
+    return await submit_job(
+        "content", payload, job_dedupe_key("content", http_request, content_cache_key(request), policy), response
+    )
+
+@app.post("/jobs/lesson-plan", status_code=202)
+async def submit_lesson_plan_job(request: LessonPlanRequest, http_request: Request, response: Response):
+    """Queue lesson plan generation and return a job ID immediately"""
+    policy = cache_policy(http_request)
+    payload = {"request": request.model_dump(), "policy": list(policy)}
+    return await submit_job(
+        "lesson_plan", payload, job_dedupe_key("lesson_plan", http_request, lesson_plan_cache_key(request), policy), response
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, response: Response, wait: float = 0):
+    """Job status and result; `wait` long-polls up to that many seconds for the job to finish"""
+    if job_manager is None:
+        raise HTTPException(status_code=404, detail="Job mode is disabled")
+    wait = min(max(wait, 0.0), JOB_MAX_WAIT_SECONDS)
+    job = await job_manager.wait(job_id, wait) if wait else await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] not in FINISHED:
+        response.headers["Retry-After"] = str(JOB_POLL_INTERVAL_SECONDS)
+    return job
+
+ADMIN_TOKEN = os.getenv("SAHAYAK_ADMIN_TOKEN", "")
+
+def require_admin(http_request: Request):
+    """Allow only requests carrying the admin token; admin endpoints are hidden when no token is set"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = http_request.headers.get("x-admin-token", "")
+    if not supplied:
+        authorization = http_request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            supplied = authorization[7:]
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profile", include_in_schema=False)
+async def admin_profile(http_request: Request, seconds: float = 10, interval_ms: float = 5, include_idle: bool = False):
+    """Sample all threads for `seconds` and return folded stacks for flamegraph.pl / speedscope"""
+    require_admin(http_request)
+    if seconds <= 0 or interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="seconds and interval_ms must be positive")
+    try:
+        folded = await asyncio.to_thread(profiler.profile, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(
+        folded,
+        media_type="text/plain",
+        headers={"Content-Disposition": 'attachment; filename="sahayak-profile.folded"'}
+    )
+
 # @app.post("/quick-math-problem")
 # async def quick_math_problem(grade: int = 5, topic: str = "addition"):
 #     try:
@@ -541,4 +1968,9 @@ async def create_lesson_plan(request: LessonPlanRequest):
 if __name__ == "__main__":
     import uvicorn
     print("Welcome to Sahayak Server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.getenv("SAHAYAK_WORKERS", "1"))
+    if workers > 1:
+        # Each worker imports the app and builds its own clients in its lifespan
+        uvicorn.run("sahayak_api:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,282 @@
+import os
+import json
+import math
+import random
+import asyncio
+import hashlib
+import logging
+import functools
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelBackend(ABC):
+    """Interface between SahayakAPI and a model provider
+
+    A backend exposes opaque text and vision model handles and runs calls on them.
+    generate() returns a response with a `.text` attribute (and optionally
+    `.usage_metadata`); stream() yields text chunks. Both must not block the loop.
+    """
+
+    name = "base"
+    text_model: Any = None
+    vision_model: Any = None
+
+    @abstractmethod
+    async def generate(self, model, contents, **kwargs):
+        """Run one model call and return its response"""
+
+    @abstractmethod
+    def stream(self, model, contents, **kwargs) -> AsyncIterator[str]:
+        """Yield the text chunks of one streaming model call"""
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+
+def _chunk_text(chunk) -> str:
+    """Text of a streamed response chunk, or an empty string for chunks without text parts"""
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini through google.generativeai, async SDK first with a thread-pool fallback"""
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        api_key: str,
+        text_model_name: str,
+        vision_model_name: str,
+        text_system_instruction: Optional[str] = None,
+        vision_system_instruction: Optional[str] = None,
+        executor_factory: Optional[Callable] = None,
+        use_async_sdk: bool = True,
+        max_threads: Optional[int] = None,
+    ):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.text_model = genai.GenerativeModel(
+            model_name=text_model_name,
+            system_instruction=text_system_instruction
+        )
+        self.vision_model = genai.GenerativeModel(
+            model_name=vision_model_name,
+            system_instruction=vision_system_instruction
+        )
+        self.executor_factory = executor_factory
+        self.max_threads = max_threads
+        self.use_async_sdk = use_async_sdk and hasattr(self.text_model, "generate_content_async")
+
+    async def generate(self, model, contents, **kwargs):
+        if self.use_async_sdk:
+            return await model.generate_content_async(contents, **kwargs)
+
+        # Fall back to the bounded thread pool for the synchronous SDK call
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor_factory(),
+            functools.partial(model.generate_content, contents, **kwargs)
+        )
+
+    async def stream(self, model, contents, **kwargs):
+        if self.use_async_sdk:
+            response = await model.generate_content_async(contents, stream=True, **kwargs)
+            async for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+            return
+
+        # Pull each chunk of the synchronous stream through the thread pool
+        loop = asyncio.get_running_loop()
+        executor = self.executor_factory()
+        response = await loop.run_in_executor(
+            executor,
+            functools.partial(model.generate_content, contents, stream=True, **kwargs)
+        )
+        iterator = iter(response)
+        while True:
+            chunk = await loop.run_in_executor(executor, next, iterator, None)
+            if chunk is None:
+                break
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "mode": "async_sdk" if self.use_async_sdk else "thread_pool",
+            "max_threads": self.max_threads,
+        }
+
+
+class FakeUpstreamError(Exception):
+    """Injected failure carrying an HTTP-style status code, like the SDK's API errors"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+
+
+@dataclass
+class FakeResponse:
+    text: str
+    usage_metadata: FakeUsage
+
+
+_WORDS = (
+    "students", "teacher", "activity", "grade", "blackboard", "example", "village", "water",
+    "counting", "story", "group", "practice", "question", "local", "materials", "lesson",
+    "observe", "discuss", "draw", "measure", "compare", "explain", "plants", "market",
+)
+
+
+class FakeBackend(ModelBackend):
+    """Local stand-in for Gemini with configurable latency, failures and stream timing
+
+    Latency is drawn per call from the chosen distribution (fixed, uniform, normal,
+    exponential or lognormal around `latency_seconds`). Streams wait that long for
+    the first chunk, then emit the rest every `chunk_interval` seconds. Output text
+    is deterministic per prompt so responses are cacheable like real ones.
+    """
+
+    name = "fake"
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "exponential", "lognormal")
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.5,
+        latency_spread: float = 0.5,
+        distribution: str = "lognormal",
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        response_words: int = 200,
+        chunk_words: int = 20,
+        chunk_interval: float = 0.02,
+        seed: Optional[int] = None,
+    ):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r}; expected one of {self.DISTRIBUTIONS}")
+        self.latency_seconds = latency_seconds
+        self.latency_spread = latency_spread
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.response_words = response_words
+        self.chunk_words = max(1, chunk_words)
+        self.chunk_interval = chunk_interval
+        self.random = random.Random(seed)
+        self.text_model = "fake-text"
+        self.vision_model = "fake-vision"
+        self.stats_counters = {"calls": 0, "streams": 0, "errors": 0, "throttled": 0}
+
+    @classmethod
+    def from_env(cls) -> "FakeBackend":
+        """Create a fake backend from SAHAYAK_FAKE_* settings"""
+        seed = os.getenv("SAHAYAK_FAKE_SEED")
+        return cls(
+            latency_seconds=float(os.getenv("SAHAYAK_FAKE_LATENCY_SECONDS", "0.5")),
+            latency_spread=float(os.getenv("SAHAYAK_FAKE_LATENCY_SPREAD", "0.5")),
+            distribution=os.getenv("SAHAYAK_FAKE_LATENCY_DISTRIBUTION", "lognormal"),
+            error_rate=float(os.getenv("SAHAYAK_FAKE_ERROR_RATE", "0")),
+            throttle_rate=float(os.getenv("SAHAYAK_FAKE_THROTTLE_RATE", "0")),
+            response_words=int(os.getenv("SAHAYAK_FAKE_RESPONSE_WORDS", "200")),
+            chunk_words=int(os.getenv("SAHAYAK_FAKE_CHUNK_WORDS", "20")),
+            chunk_interval=float(os.getenv("SAHAYAK_FAKE_CHUNK_INTERVAL_SECONDS", "0.02")),
+            seed=int(seed) if seed else None,
+        )
+
+    def sample_latency(self) -> float:
+        base, spread = self.latency_seconds, self.latency_spread
+        if self.distribution == "fixed":
+            value = base
+        elif self.distribution == "uniform":
+            value = self.random.uniform(base - spread, base + spread)
+        elif self.distribution == "normal":
+            value = self.random.gauss(base, spread)
+        elif self.distribution == "exponential":
+            value = self.random.expovariate(1.0 / base) if base > 0 else 0.0
+        else:
+            # Median `base` with a long right tail, like real model latency
+            value = self.random.lognormvariate(math.log(base), spread) if base > 0 else 0.0
+        return max(0.0, value)
+
+    def _maybe_fail(self):
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            self.stats_counters["throttled"] += 1
+            raise FakeUpstreamError(429, "Resource has been exhausted (fake). Please retry in 1s.")
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats_counters["errors"] += 1
+            raise FakeUpstreamError(503, "The model is overloaded (fake).")
+
+    def _text(self, contents, generation_config=None) -> str:
+        digest = hashlib.sha256(repr(contents)[:4096].encode()).digest()
+        words = [_WORDS[digest[i % len(digest)] % len(_WORDS)] for i in range(self.response_words)]
+        max_tokens = (generation_config or {}).get("max_output_tokens")
+        if max_tokens:
+            # Stop where the output would pass the limit, at about four characters per token
+            kept, chars = [], 0
+            for word in words:
+                chars += len(word) + 1
+                if kept and chars > max_tokens * 4:
+                    break
+                kept.append(word)
+            words = kept
+        text = " ".join(words)
+        if (generation_config or {}).get("response_mime_type") == "application/json":
+            return json.dumps({"text": text})
+        return text
+
+    def _usage(self, contents, text: str) -> FakeUsage:
+        prompt_tokens = max(1, len(repr(contents)) // 4)
+        output_tokens = max(1, len(text) // 4)
+        return FakeUsage(prompt_tokens, output_tokens, prompt_tokens + output_tokens)
+
+    async def generate(self, model, contents, **kwargs):
+        self.stats_counters["calls"] += 1
+        await asyncio.sleep(self.sample_latency())
+        self._maybe_fail()
+        text = self._text(contents, kwargs.get("generation_config"))
+        return FakeResponse(text, self._usage(contents, text))
+
+    async def stream(self, model, contents, **kwargs):
+        self.stats_counters["streams"] += 1
+        await asyncio.sleep(self.sample_latency())
+        self._maybe_fail()
+        words = self._text(contents, kwargs.get("generation_config")).split(" ")
+        for start in range(0, len(words), self.chunk_words):
+            if start:
+                await asyncio.sleep(self.chunk_interval)
+            yield " ".join(words[start:start + self.chunk_words]) + " "
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "distribution": self.distribution,
+            "latency_seconds": self.latency_seconds,
+            **self.stats_counters,
+        }
+
+
+BACKENDS = ("gemini", "fake")
@@ -0,0 +1,273 @@
+"""Offline load test for the Sahayak API
+
+Starts the API under uvicorn with the fake model backend, drives each endpoint
+with a closed loop of N concurrent clients and reports p50/p95/p99 latency,
+requests per second, error counts and the server's peak RSS. No network or
+Gemini quota is needed, so regressions can be checked on a laptop:
+
+    python sahayak_bench.py --concurrency 1,16,64 --duration 10
+    python sahayak_bench.py --endpoints generate-content,analyze-image --json results.json
+    python sahayak_bench.py --server-env SAHAYAK_FAKE_THROTTLE_RATE=0.05
+
+Pass --url to benchmark an already running server instead.
+"""
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+
+# Cache writes are bypassed so every request exercises the full path
+NO_STORE = {"Cache-Control": "no-store"}
+ENDPOINTS = (
+    "generate-content",
+    "generate-content/stream",
+    "create-lesson-plan",
+    "create-lesson-plan/stream",
+    "analyze-image",
+    "batch",
+)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def sample_image(size=(1600, 1200)) -> bytes:
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", size, (235, 230, 220))
+    draw = ImageDraw.Draw(image)
+    for row in range(0, size[1], 40):
+        draw.line([(0, row), (size[0], row)], fill=(40, 40, 90), width=2)
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+async def run_request(client: httpx.AsyncClient, endpoint: str, image: bytes):
+    """Send one request and return (status, ttfb_seconds) once the body is fully read"""
+    tag = uuid.uuid4().hex[:8]
+    if endpoint == "generate-content":
+        request = client.build_request("POST", "/generate-content", json={"prompt": f"Explain fractions {tag}"}, headers=NO_STORE)
+    elif endpoint == "generate-content/stream":
+        request = client.build_request("POST", "/generate-content/stream", json={"prompt": f"Explain fractions {tag}"}, headers=NO_STORE)
+    elif endpoint == "create-lesson-plan":
+        request = client.build_request("POST", "/create-lesson-plan", json={"topic": f"Water cycle {tag}", "grade_levels": [3, 4, 5]}, headers=NO_STORE)
+    elif endpoint == "create-lesson-plan/stream":
+        request = client.build_request("POST", "/create-lesson-plan/stream", json={"topic": f"Water cycle {tag}", "grade_levels": [3, 4, 5]}, headers=NO_STORE)
+    elif endpoint == "analyze-image":
+        request = client.build_request(
+            "POST", "/analyze-image", files={"file": ("page.jpg", image, "image/jpeg")}, headers=NO_STORE
+        )
+    elif endpoint == "batch":
+        items = [{"id": str(i), "content": {"prompt": f"Batch item {i} {tag}"}} for i in range(5)]
+        request = client.build_request("POST", "/batch", json={"items": items}, headers=NO_STORE)
+    else:
+        raise ValueError(f"Unknown endpoint {endpoint}")
+
+    started = time.perf_counter()
+    response = await client.send(request, stream=True)
+    ttfb = None
+    try:
+        async for _ in response.aiter_raw():
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+    finally:
+        await response.aclose()
+    return response.status_code, ttfb if ttfb is not None else time.perf_counter() - started
+
+
+async def run_level(url: str, endpoint: str, concurrency: int, duration: float, image: bytes, timeout: float) -> dict:
+    """Closed-loop load: `concurrency` clients each send back-to-back requests for `duration` seconds"""
+    latencies, ttfbs, statuses = [], [], {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    status, ttfb = await run_request(client, endpoint, image)
+                except httpx.HTTPError as e:
+                    status, ttfb = type(e).__name__, None
+                latencies.append(time.perf_counter() - started)
+                if ttfb is not None:
+                    ttfbs.append(ttfb)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ttfbs.sort()
+    ok = statuses.get("200", 0)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "ttfb_p50_ms": round(percentile(ttfbs, 50) * 1000, 1),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_kb(pid: int, field: str = "VmHWM") -> Optional[int]:
+    """Peak (VmHWM) or current (VmRSS) resident set size from /proc, where available"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def start_server(port: int, extra_env: Dict[str, str], workdir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "SAHAYAK_BACKEND": "fake",
+        # Measure the service, not the quota: no client-side rate limits by default
+        "SAHAYAK_UPSTREAM_RPM": "0",
+        "SAHAYAK_UPSTREAM_TPM": "0",
+        "SAHAYAK_CACHE_PATH": os.path.join(workdir, "responses.db"),
+        "SAHAYAK_IMAGE_CACHE_PATH": os.path.join(workdir, "images.db"),
+        "SAHAYAK_SIMILARITY_CACHE_PATH": os.path.join(workdir, "similar.db"),
+        "SAHAYAK_JOBS_PATH": os.path.join(workdir, "jobs.db"),
+    })
+    env.update(extra_env)
+    here = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "sahayak_api:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=here,
+        env=env,
+    )
+
+
+async def wait_until_ready(url: str, server: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if server is not None and server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout}s")
+
+
+def print_table(results: List[dict]):
+    header = f"{'endpoint':<28}{'conc':>6}{'reqs':>8}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttfb p50':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['endpoint']:<28}{r['concurrency']:>6}{r['requests']:>8}{r['errors']:>8}{r['rps']:>10}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['ttfb_p50_ms']:>10}"
+        )
+
+
+async def main(args) -> int:
+    endpoints = ENDPOINTS if args.endpoints == "all" else tuple(e.strip().strip("/") for e in args.endpoints.split(","))
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        print(f"Unknown endpoints: {', '.join(sorted(unknown))}; choose from {', '.join(ENDPOINTS)}", file=sys.stderr)
+        return 2
+    levels = [int(level) for level in args.concurrency.split(",")]
+    extra_env = dict(item.split("=", 1) for item in args.server_env)
+    image = sample_image()
+
+    server = None
+    workdir = tempfile.mkdtemp(prefix="sahayak-bench-")
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(port, extra_env, workdir)
+
+    results = []
+    peak_rss_kb = None
+    try:
+        await wait_until_ready(url, server)
+        for endpoint in endpoints:
+            for level in levels:
+                result = await run_level(url, endpoint, level, args.duration, image, args.timeout)
+                results.append(result)
+                print(f"  {endpoint} x{level}: {result['rps']} req/s, p99 {result['p99_ms']} ms, errors {result['errors']}", file=sys.stderr)
+        if server is not None:
+            peak_rss_kb = read_rss_kb(server.pid)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+            if peak_rss_kb is None:
+                # Without /proc, fall back to the peak of terminated children (kB on Linux, bytes on macOS)
+                usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+                peak_rss_kb = usage // 1024 if sys.platform == "darwin" else usage
+
+    print()
+    print_table(results)
+    if peak_rss_kb is not None:
+        print(f"\nPeak server RSS: {peak_rss_kb / 1024:.1f} MB")
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({
+                "url": url,
+                "duration_seconds": args.duration,
+                "server_env": extra_env,
+                "peak_rss_mb": round(peak_rss_kb / 1024, 1) if peak_rss_kb is not None else None,
+                "results": results,
+            }, out, indent=2)
+        print(f"Results written to {args.json}")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the Sahayak API using the fake model backend")
+    parser.add_argument("--endpoints", default="all", help=f"Comma-separated endpoints or 'all' ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per endpoint and concurrency level")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the server, e.g. SAHAYAK_FAKE_LATENCY_SECONDS=1.5 (repeatable)")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--json", help="Write results to this file for comparison between runs")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from sahayak_tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value):
+    """Normalize a request field so trivially different requests share a key"""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        if all(isinstance(v, (int, float)) for v in items):
+            return sorted(set(items))
+        return items
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    return value
+
+
+def make_cache_key(kind: str, model_name: str, template_version: str, fields: dict) -> str:
+    """Build a stable cache key from the normalized request fields"""
+    payload = json.dumps(
+        {
+            "kind": kind,
+            "model": model_name,
+            "template_version": template_version,
+            "fields": _normalize(fields),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_cache_control(header: Optional[str]) -> Tuple[bool, bool]:
+    """Translate a Cache-Control header into (read_from_cache, write_to_cache)"""
+    if not header:
+        return True, True
+    directives = {d.strip().lower() for d in header.split(",")}
+    if "no-store" in directives:
+        return False, False
+    if "no-cache" in directives or "max-age=0" in directives:
+        return False, True
+    return True, True
+
+
+class ResponseCache:
+    """Two-tier response cache: in-process LRU with TTL in front of a shared SQLite store"""
+
+    def __init__(
+        self,
+        path: Optional[str],
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600,
+        disk_max_entries: int = 50000,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._memory_bytes = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes_since_trim = 0
+
+        self.stats_counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+            "bypassed": 0,
+        }
+
+        if path:
+            self._open_db(path)
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """Create a cache from SAHAYAK_CACHE_* settings, or None when disabled"""
+        if os.getenv("SAHAYAK_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            return None
+        path = os.getenv("SAHAYAK_CACHE_PATH", os.path.join(".cache", "sahayak_responses.db"))
+        return cls(
+            path=path or None,
+            max_entries=int(os.getenv("SAHAYAK_CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(os.getenv("SAHAYAK_CACHE_MAX_MB", "64")) * 1024 * 1024,
+            ttl_seconds=float(os.getenv("SAHAYAK_CACHE_TTL_SECONDS", str(24 * 3600))),
+            disk_max_entries=int(os.getenv("SAHAYAK_CACHE_DISK_MAX_ENTRIES", "50000")),
+        )
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        # WAL lets several workers on the same host read while one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._db.commit()
+        logger.info(f"Response cache backed by {path}")
+
+    # In-memory tier
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            self._memory_remove(key)
+            self.stats_counters["expired"] += 1
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: str, expires_at: float):
+        if key in self._memory:
+            self._memory_remove(key)
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        self._memory[key] = (expires_at, value)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            oldest = next(iter(self._memory))
+            self._memory_remove(oldest)
+            self.stats_counters["memory_evictions"] += 1
+
+    def _memory_remove(self, key: str):
+        _, value = self._memory.pop(key)
+        self._memory_bytes -= len(value)
+
+    # SQLite tier (blocking, always called off the event loop)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self.stats_counters["expired"] += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return expires_at, value
+
+    def _disk_put(self, key: str, value: str, expires_at: float, now: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 100:
+                self._writes_since_trim = 0
+                self._disk_trim(now)
+            self._db.commit()
+
+    def _disk_trim(self, now: float):
+        evicted = self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,)).rowcount
+        evicted += self._db.execute(
+            """DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.disk_max_entries,),
+        ).rowcount
+        self.stats_counters["disk_evictions"] += max(evicted, 0)
+
+    # Public API
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look a key up in memory first, then on disk"""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None:
+            self.stats_counters["memory_hits"] += 1
+            return value
+
+        if self._db is not None:
+            with span("cache_disk"):
+                entry = await asyncio.to_thread(self._disk_get, key, now)
+            if entry is not None:
+                expires_at, value = entry
+                self._memory_put(key, value, expires_at)
+                self.stats_counters["disk_hits"] += 1
+                return value
+
+        self.stats_counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        """Store a value in both tiers"""
+        if not value:
+            return
+        now = time.time()
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        self._memory_put(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, value, expires_at, now)
+        self.stats_counters["writes"] += 1
+
+    def record_bypass(self):
+        self.stats_counters["bypassed"] += 1
+
+    def stats(self) -> dict:
+        """Report hit/miss/eviction counters and current sizes"""
+        lookups = (
+            self.stats_counters["memory_hits"]
+            + self.stats_counters["disk_hits"]
+            + self.stats_counters["misses"]
+        )
+        hits = self.stats_counters["memory_hits"] + self.stats_counters["disk_hits"]
+        return {
+            **self.stats_counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_path": self.path,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -0,0 +1,177 @@
+"""Startup and lifetime of the process's long-lived clients
+
+Each worker builds its clients once, in its own lifespan, after any fork:
+nothing heavy (the model SDK, gRPC channels, PIL) is imported or created at
+module import time. The lifespan only starts the build and returns, so the
+worker accepts connections right away; /livez answers from the first moment,
+/readyz turns 200 once clients are built and warm-up probes have run (or the
+startup budget is spent). Requests that arrive earlier wait for the build
+instead of creating clients of their own.
+
+Multi-worker deployment, one registry per worker process:
+
+    uvicorn sahayak_api:app --host 0.0.0.0 --port 8000 --workers 4
+    gunicorn sahayak_api:app -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:8000 --preload
+
+(or SAHAYAK_WORKERS=4 python sahayak_api.py). --preload is safe because
+importing the app creates no clients. Point liveness checks at /livez and
+readiness checks (load balancer, Kubernetes readinessProbe) at /readyz; the
+measured startup time is reported there and as sahayak_startup_seconds.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from sahayak_metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "sahayak_startup_seconds", "Worker startup time by phase (client:<name>, probe:<name>, ready)", ("phase",)
+)
+WARMUP_FAILURES = REGISTRY.counter(
+    "sahayak_warmup_failures_total", "Warm-up probes that failed or ran past the startup budget", ("probe",)
+)
+
+STARTING, READY, FAILED = "starting", "ready", "failed"
+
+
+class ClientUnavailable(Exception):
+    """A client failed to build, so requests that need it cannot be served"""
+
+
+class ClientRegistry:
+    """Builds named clients once in the background, warms them up and tracks readiness
+
+    Factories run in a worker thread so their imports never block the event loop.
+    Warm-up probes run concurrently after the build; a failed or slow probe is
+    reported but does not keep the worker out of rotation, since caches and
+    content packs can still answer. Only a failed build does.
+    """
+
+    def __init__(self, budget_seconds: float = 15.0):
+        self.budget_seconds = budget_seconds
+        self._factories: Dict[str, tuple] = {}
+        self._probes: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._built = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.state = STARTING
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.startup_seconds: Optional[float] = None
+        self.timings: Dict[str, float] = {}
+        self.probe_results: Dict[str, str] = {}
+
+    @classmethod
+    def from_env(cls) -> "ClientRegistry":
+        """Create a registry from SAHAYAK_STARTUP_* settings"""
+        return cls(budget_seconds=float(os.getenv("SAHAYAK_STARTUP_BUDGET_SECONDS", "15")))
+
+    def register(self, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], None]] = None):
+        """Add a client built by factory() in a thread and torn down by close(client)"""
+        self._factories[name] = (factory, close)
+
+    def add_probe(self, name: str, probe: Callable[[], Awaitable[Any]]):
+        """Add a warm-up probe to run once every client is built"""
+        self._probes[name] = probe
+
+    def start(self):
+        """Start building clients in the background and return immediately"""
+        self.started_at = time.perf_counter()
+        self._task = asyncio.create_task(self._start())
+
+    async def _start(self):
+        try:
+            for name, (factory, _) in self._factories.items():
+                began = time.perf_counter()
+                self._clients[name] = await asyncio.to_thread(factory)
+                self._record(f"client:{name}", began)
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            logger.error(f"Client startup failed: {e}")
+            return
+        finally:
+            self._built.set()
+        await self._warm_up()
+        self.state = READY
+        self.startup_seconds = self._record("ready", self.started_at)
+        if self.startup_seconds > self.budget_seconds:
+            logger.warning(f"Worker ready in {self.startup_seconds:.2f}s, over the {self.budget_seconds}s startup budget")
+        else:
+            logger.info(f"Worker ready in {self.startup_seconds:.2f}s (budget {self.budget_seconds}s)")
+
+    async def _warm_up(self):
+        remaining = self.budget_seconds - (time.perf_counter() - self.started_at)
+        tasks = {asyncio.create_task(self._probe(name, probe)): name for name, probe in self._probes.items()}
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=max(0.0, remaining))
+        # Readiness does not wait past the budget; late probes are abandoned
+        for task in pending:
+            task.cancel()
+            name = tasks[task]
+            self.probe_results[name] = "timeout"
+            WARMUP_FAILURES.labels(name).inc()
+            logger.warning(f"Warm-up probe {name} did not finish within the startup budget")
+
+    async def _probe(self, name: str, probe: Callable[[], Awaitable[Any]]):
+        began = time.perf_counter()
+        try:
+            await probe()
+        except Exception as e:
+            self.probe_results[name] = f"failed: {e}"
+            WARMUP_FAILURES.labels(name).inc()
+            logger.warning(f"Warm-up probe {name} failed: {e}")
+        else:
+            self.probe_results[name] = "ok"
+        self._record(f"probe:{name}", began)
+
+    def _record(self, phase: str, began: float) -> float:
+        elapsed = time.perf_counter() - began
+        self.timings[phase] = round(elapsed, 4)
+        STARTUP_SECONDS.labels(phase).set(elapsed)
+        return elapsed
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    async def get(self, name: str) -> Any:
+        """Return a client, waiting for the startup build if it is still running"""
+        await self._built.wait()
+        if self.state == FAILED:
+            raise ClientUnavailable(self.error)
+        return self._clients[name]
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Return a client if it has been built, without waiting"""
+        return self._clients.get(name)
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        for name, (_, close) in self._factories.items():
+            client = self._clients.pop(name, None)
+            if client is not None and close:
+                try:
+                    close(client)
+                except Exception as e:
+                    logger.warning(f"Closing client {name} failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "startup_seconds": round(self.startup_seconds, 4) if self.startup_seconds is not None else None,
+            "budget_seconds": self.budget_seconds,
+            "within_budget": self.startup_seconds <= self.budget_seconds if self.startup_seconds is not None else None,
+            "timings": self.timings,
+            "probes": self.probe_results,
+        }
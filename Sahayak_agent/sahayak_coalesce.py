@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Share one in-flight upstream call among concurrent callers with the same key
+
+    The shared call runs as its own task, so a caller that times out or is
+    cancelled only stops waiting; the others still receive the result (or the
+    error). The task is cancelled once nobody is waiting for it any more. It runs
+    in `context` (an empty one by default), never in the first caller's, so it
+    does not inherit that caller's deadline; each caller bounds only its own
+    wait with `timeout`.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.stats_counters = {
+            "leaders": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "abandoned": 0,
+        }
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+        context: Optional[contextvars.Context] = None,
+    ) -> Tuple[Any, bool]:
+        """Run fn once per key; return (result, shared) where shared means another caller started it"""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(fn(), context=context or contextvars.Context())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._finished(key, t))
+            self.stats_counters["leaders"] += 1
+        else:
+            self.stats_counters["coalesced"] += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout), shared
+        except asyncio.TimeoutError:
+            self.stats_counters["timeouts"] += 1
+            raise
+        except asyncio.CancelledError:
+            self.stats_counters["cancelled"] += 1
+            raise
+        finally:
+            self._release(key, task)
+
+    def _release(self, key: str, task: asyncio.Task):
+        remaining = self._waiters.get(key, 1) - 1
+        if remaining > 0:
+            self._waiters[key] = remaining
+            return
+        self._waiters.pop(key, None)
+        if not task.done():
+            # Nobody is waiting for the result any more
+            self.stats_counters["abandoned"] += 1
+            task.cancel()
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats_counters["errors"] += 1
+
+    def stats(self) -> dict:
+        calls = self.stats_counters["leaders"] + self.stats_counters["coalesced"]
+        return {
+            **self.stats_counters,
+            "inflight_keys": len(self._inflight),
+            "coalesced_ratio": round(self.stats_counters["coalesced"] / calls, 4) if calls else 0.0,
+        }
@@ -0,0 +1,142 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upper bound for any client-requested time budget
+MAX_REQUEST_TIMEOUT_SECONDS = float(os.getenv("SAHAYAK_MAX_REQUEST_TIMEOUT_SECONDS", "300"))
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out; never retried"""
+
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message)
+
+
+class Deadline:
+    """Mutable end time for one request, shared by every task working on it"""
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None
+        if seconds is not None:
+            self.tighten(seconds)
+
+    def tighten(self, seconds: float):
+        """Move the deadline to `seconds` from now unless it is already sooner"""
+        seconds = min(seconds, MAX_REQUEST_TIMEOUT_SECONDS)
+        expires_at = time.monotonic() + seconds
+        if self.expires_at is None or expires_at < self.expires_at:
+            self.expires_at = expires_at
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("sahayak_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left in the current request's budget, or None when unbounded"""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline else None
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None):
+    """Give the enclosed work (and tasks it creates) its own deadline, never later than the enclosing one"""
+    deadline = Deadline(seconds)
+    parent = _current_deadline.get()
+    if parent is not None and parent.bounded:
+        deadline.tighten(parent.remaining())
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def detached_context(seconds: Optional[float] = None) -> contextvars.Context:
+    """Copy of the current context with a fresh deadline of `seconds`, not bound by the caller's
+
+    For work shared between requests: it must not die with whichever request
+    happened to start it.
+    """
+    context = contextvars.copy_context()
+    context.run(_current_deadline.set, Deadline(seconds))
+    return context
+
+
+async def within_deadline(awaitable: Awaitable[T], deadline: Optional[Deadline] = None) -> T:
+    """Await `awaitable`, cancelling it and raising DeadlineExceeded when the budget runs out"""
+    deadline = deadline or _current_deadline.get()
+    remaining = deadline.remaining() if deadline else None
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded()
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        # Timers may fire a clock tick early; anything else is the awaitable's own timeout
+        if deadline.remaining() <= 0.01:
+            raise DeadlineExceeded()
+        raise
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """Parse a timeout header value in seconds; invalid or non-positive values are ignored"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that opens a deadline scope per request
+
+    An X-Request-Timeout header (seconds) bounds the request right away; handlers
+    can tighten the deadline further, or apply their default when none was given.
+    """
+
+    header = b"x-request-timeout"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                seconds = parse_timeout(value.decode("latin-1"))
+                break
+        with deadline_scope(seconds):
+            await self.app(scope, receive, send)
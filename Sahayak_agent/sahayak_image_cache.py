@@ -0,0 +1,273 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from sahayak_tracing import span
+from sahayak_images import DHASH_SIZE, thumbnail_similarity
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = DHASH_SIZE * DHASH_SIZE
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHash:
+    """Multi-index hashing over fixed-width hashes for Hamming-radius search
+
+    The hash is split into max_distance + 1 disjoint chunks. Two hashes within
+    max_distance bits of each other must agree exactly on at least one chunk
+    (pigeonhole), so a query only verifies entries sharing a chunk value with it
+    instead of scanning every stored hash.
+    """
+
+    def __init__(self, max_distance: int, bits: int = HASH_BITS):
+        self.max_distance = max_distance
+        chunks = max(1, min(max_distance + 1, bits))
+        widths = [bits // chunks + (1 if i < bits % chunks else 0) for i in range(chunks)]
+        self._chunks = []  # (shift, mask)
+        shift = 0
+        for width in widths:
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[int, set]] = [{} for _ in self._chunks]
+        self._values: Dict[int, int] = {}  # entry_id -> hash
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, value: int, entry_id: int):
+        self._values[entry_id] = value
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((value >> shift) & mask, set()).add(entry_id)
+
+    def remove(self, entry_id: int):
+        value = self._values.pop(entry_id, None)
+        if value is None:
+            return
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            key = (value >> shift) & mask
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[key]
+
+    def search(self, value: int) -> List[Tuple[int, int]]:
+        """Return (distance, entry_id) pairs within max_distance, nearest first"""
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            bucket = table.get((value >> shift) & mask)
+            if bucket:
+                candidates.update(bucket)
+        matches = []
+        for entry_id in candidates:
+            distance = hamming(value, self._values[entry_id])
+            if distance <= self.max_distance:
+                matches.append((distance, entry_id))
+        matches.sort()
+        return matches
+
+
+class ImageAnalysisCache:
+    """Perceptual-hash cache of vision analyses, persisted in SQLite
+
+    Entries are grouped by scope (prompt, grade levels, model) and matched by the
+    256-bit dHash of the preprocessed image within a Hamming-distance threshold, so
+    the same textbook page photographed under different light is a hit. Text pages
+    share a layout, so every hash candidate is confirmed against a 32x32 thumbnail
+    before it is served. The hashes live in a per-scope multi-index in memory;
+    thumbnails and analyses stay on disk.
+
+    Defaults were measured on synthetic text pages: distinct pages were at least
+    36 bits apart with thumbnail correlation at most 0.87, while brightness,
+    contrast, JPEG and rescaling changes of one page stayed within 19 bits and
+    above 0.98 correlation.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_distance: int = 16,
+        min_similarity: float = 0.95,
+        max_entries: int = 20000,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._indexes: Dict[str, MultiIndexHash] = {}
+        self._scopes: Dict[int, str] = {}  # entry_id -> scope
+        self._db_lock = threading.Lock()
+        self._db = None
+
+        self.stats_counters = {"hits": 0, "misses": 0, "rejected": 0, "writes": 0, "evictions": 0, "bypassed": 0}
+        self.hit_distances = [0] * (max_distance + 1)
+
+        self._open_db(path)
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional["ImageAnalysisCache"]:
+        """Create a cache from SAHAYAK_IMAGE_CACHE_* settings, or None when disabled"""
+        if os.getenv("SAHAYAK_IMAGE_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            path=os.getenv("SAHAYAK_IMAGE_CACHE_PATH", os.path.join(".cache", "sahayak_images.db")),
+            max_distance=int(os.getenv("SAHAYAK_IMAGE_CACHE_MAX_DISTANCE", "16")),
+            min_similarity=float(os.getenv("SAHAYAK_IMAGE_CACHE_MIN_SIMILARITY", "0.95")),
+            max_entries=int(os.getenv("SAHAYAK_IMAGE_CACHE_MAX_ENTRIES", "20000")),
+            ttl_seconds=float(os.getenv("SAHAYAK_IMAGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        )
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(image_analyses)")]
+        if columns and "thumbnail" not in columns:
+            # Entries from the old 64-bit hash cannot be matched safely
+            logger.info("Dropping image analysis cache entries with the old hash format")
+            self._db.execute("DROP TABLE image_analyses")
+        # Hashes are stored as hex text: SQLite integers are signed 64-bit
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS image_analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                thumbnail BLOB NOT NULL,
+                analysis TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS image_analyses_last_access ON image_analyses(last_access)")
+        self._db.commit()
+
+    def _load(self):
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("DELETE FROM image_analyses WHERE created_at <= ?", (now - self.ttl_seconds,))
+            self._db.commit()
+            rows = self._db.execute("SELECT id, scope, hash FROM image_analyses").fetchall()
+        for entry_id, scope, hex_hash in rows:
+            self._index(entry_id, scope, int(hex_hash, 16))
+        logger.info(f"Image analysis cache loaded {len(rows)} entries from {self.path}")
+
+    def _index(self, entry_id: int, scope: str, value: int):
+        index = self._indexes.get(scope)
+        if index is None:
+            index = self._indexes[scope] = MultiIndexHash(self.max_distance)
+        index.add(value, entry_id)
+        self._scopes[entry_id] = scope
+
+    def _unindex(self, entry_id: int):
+        scope = self._scopes.pop(entry_id, None)
+        if scope is None:
+            return
+        index = self._indexes[scope]
+        index.remove(entry_id)
+        if not len(index):
+            del self._indexes[scope]
+
+    def _fetch(self, entry_id: int) -> Optional[Tuple[str, bytes, float]]:
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT analysis, thumbnail, created_at FROM image_analyses WHERE id = ?", (entry_id,)
+            ).fetchone()
+
+    def _touch(self, entry_id: int, now: float):
+        with self._db_lock:
+            self._db.execute("UPDATE image_analyses SET last_access = ? WHERE id = ?", (now, entry_id))
+            self._db.commit()
+
+    def _store(self, scope: str, value: int, thumbnail: bytes, analysis: str, now: float) -> Tuple[int, List[int]]:
+        with self._db_lock:
+            entry_id = self._db.execute(
+                "INSERT INTO image_analyses (scope, hash, thumbnail, analysis, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, f"{value:0{HASH_BITS // 4}x}", thumbnail, analysis, now, now),
+            ).lastrowid
+            evicted = []
+            count = self._db.execute("SELECT COUNT(*) FROM image_analyses").fetchone()[0]
+            if count > self.max_entries:
+                # Evict the least recently used tenth in one go to amortize the cost
+                excess = count - self.max_entries + max(1, self.max_entries // 10)
+                evicted = [
+                    row[0] for row in self._db.execute(
+                        "SELECT id FROM image_analyses ORDER BY last_access ASC LIMIT ?", (excess,)
+                    )
+                ]
+                self._db.executemany("DELETE FROM image_analyses WHERE id = ?", [(i,) for i in evicted])
+            self._db.commit()
+            return entry_id, evicted
+
+    async def get(self, scope: str, value: int, thumbnail: bytes) -> Optional[Tuple[str, int]]:
+        """Return (analysis, distance) for the nearest stored image within the threshold whose thumbnail agrees"""
+        index = self._indexes.get(scope)
+        matches = index.search(value) if index else []
+        now = time.time()
+        for distance, entry_id in matches:
+            with span("image_cache"):
+                row = await asyncio.to_thread(self._fetch, entry_id)
+            if row is None:
+                # Removed by another worker sharing the database
+                self._unindex(entry_id)
+                continue
+            analysis, stored_thumbnail, created_at = row
+            if created_at <= now - self.ttl_seconds:
+                self._unindex(entry_id)
+                continue
+            if thumbnail_similarity(thumbnail, stored_thumbnail) < self.min_similarity:
+                # Similar layout, different picture
+                self.stats_counters["rejected"] += 1
+                continue
+            await asyncio.to_thread(self._touch, entry_id, now)
+            self.stats_counters["hits"] += 1
+            self.hit_distances[distance] += 1
+            return analysis, distance
+        self.stats_counters["misses"] += 1
+        return None
+
+    async def set(self, scope: str, value: int, thumbnail: bytes, analysis: str):
+        if not analysis:
+            return
+        entry_id, evicted = await asyncio.to_thread(self._store, scope, value, thumbnail, analysis, time.time())
+        self._index(entry_id, scope, value)
+        for old_id in evicted:
+            self._unindex(old_id)
+        self.stats_counters["writes"] += 1
+        self.stats_counters["evictions"] += len(evicted)
+
+    def record_bypass(self):
+        self.stats_counters["bypassed"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "hit_ratio": round(self.stats_counters["hits"] / lookups, 4) if lookups else 0.0,
+            "hit_distances": list(self.hit_distances),
+            "entries": len(self._scopes),
+            "scopes": len(self._indexes),
+            "max_distance": self.max_distance,
+            "min_similarity": self.min_similarity,
+            "path": self.path,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
@@ -0,0 +1,352 @@
+import os
+import io
+import time
+import heapq
+import importlib
+import asyncio
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Tuple, Union
+from sahayak_metrics import REGISTRY, STAGE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Images are downscaled to this size before analysis (to reduce API costs)
+IMAGE_MAX_SIZE = (1024, 1024)
+JPEG_QUALITY = 85
+# 16x16 gradients = 256-bit hash; at 8x8 distinct text pages land within a few bits of each other
+DHASH_SIZE = 16
+# Side of the grayscale thumbnail kept as a second signature to confirm hash matches
+THUMBNAIL_SIZE = 32
+
+IMAGE_STAGE_LATENCY = REGISTRY.histogram(
+    "sahayak_image_stage_duration_seconds",
+    "Image preprocessing time by stage (decode, resize, hash, encode, queue, total)",
+    ("stage",), STAGE_BUCKETS,
+)
+
+
+@dataclass
+class PreparedImage:
+    """A decoded, oriented, resized and re-encoded image ready for the vision model"""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+    dhash: int = 0
+    thumbnail: bytes = b""
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def as_blob(self) -> dict:
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def compute_dhash(image, hash_size: int = DHASH_SIZE) -> int:
+    """Difference hash: one bit per horizontal brightness gradient on a tiny grayscale copy
+
+    Robust to lighting, compression and small crops, so repeated photos of the same
+    page land within a few bits of each other.
+    """
+    from PIL import Image
+
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def compute_thumbnail(image, size: int = THUMBNAIL_SIZE) -> bytes:
+    """Tiny grayscale copy of the image, compared by correlation to confirm a hash match"""
+    from PIL import Image
+
+    return image.convert("L").resize((size, size), Image.Resampling.BOX).tobytes()
+
+
+def thumbnail_similarity(a: bytes, b: bytes) -> float:
+    """Pearson correlation of two thumbnails: 1.0 for the same picture, insensitive to brightness and contrast"""
+    if not a or len(a) != len(b):
+        return 0.0
+    n = len(a)
+    mean_a = sum(a) / n
+    mean_b = sum(b) / n
+    cov = var_a = var_b = 0.0
+    for x, y in zip(a, b):
+        dx = x - mean_a
+        dy = y - mean_b
+        cov += dx * dy
+        var_a += dx * dx
+        var_b += dy * dy
+    if not var_a or not var_b:
+        # Blank images: only identical blanks count as the same
+        return 1.0 if a == b else 0.0
+    return cov / (var_a * var_b) ** 0.5
+
+
+def import_pil() -> int:
+    """Import the PIL modules preprocessing needs; used to warm up a process"""
+    for module in ("PIL.Image", "PIL.ImageOps"):
+        importlib.import_module(module)
+    return os.getpid()
+
+
+def preprocess_image(
+    image_bytes: Union[bytes, memoryview],
+    max_size: Tuple[int, int] = IMAGE_MAX_SIZE,
+    quality: int = JPEG_QUALITY,
+) -> PreparedImage:
+    """Decode, apply EXIF orientation, downscale and re-encode an image as JPEG
+
+    Runs in a worker process, so it only uses its arguments and module-level state.
+    """
+    from PIL import Image, ImageOps
+
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.format == "JPEG":
+        # Draft mode makes the decoder produce a 1/2, 1/4 or 1/8 scale image directly
+        image.draft("RGB", max_size)
+    image = ImageOps.exif_transpose(image)
+    decoded = time.perf_counter()
+
+    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    resized = time.perf_counter()
+
+    dhash = compute_dhash(image)
+    thumbnail = compute_thumbnail(image)
+    hashed = time.perf_counter()
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality, optimize=True)
+    encoded = time.perf_counter()
+
+    return PreparedImage(
+        data=out.getvalue(),
+        mime_type="image/jpeg",
+        width=image.width,
+        height=image.height,
+        original_bytes=len(image_bytes),
+        dhash=dhash,
+        thumbnail=thumbnail,
+        timings={
+            "decode_ms": round((decoded - started) * 1000, 2),
+            "resize_ms": round((resized - decoded) * 1000, 2),
+            "hash_ms": round((hashed - resized) * 1000, 2),
+            "encode_ms": round((encoded - hashed) * 1000, 2),
+        },
+    )
+
+
+class PreprocessQueueFull(Exception):
+    """Raised when the preprocessing queue is at capacity"""
+
+
+class PreprocessUnavailable(Exception):
+    """The preprocessing stage failed on our side (a worker died or the pool shut down)"""
+
+
+class ImagePreprocessor:
+    """Process-pool image preprocessing stage with a bounded, size-aware queue
+
+    Small images are handled on a thread, where the cost of shipping bytes to
+    another process would outweigh the work. Larger images wait in a queue that
+    dispatches the smallest pending image first, so one huge photo does not hold
+    up quick ones, and is run on a pool of worker processes.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int = 64,
+        inline_threshold_bytes: int = 256 * 1024,
+        timeout_seconds: float = 30.0,
+        mp_context: str = "spawn",
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.inline_threshold_bytes = inline_threshold_bytes
+        self.timeout_seconds = timeout_seconds
+        self.mp_context = mp_context
+
+        self._pool = None
+        self._pending = []  # heap of (size, seq, future, image_bytes)
+        self._seq = itertools.count()
+        self.running = 0
+
+        self.stats_counters = {
+            "processed": 0,
+            "inline": 0,
+            "pooled": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "pool_restarts": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ImagePreprocessor":
+        """Create a preprocessor from SAHAYAK_IMAGE_* settings"""
+        return cls(
+            workers=int(os.getenv("SAHAYAK_IMAGE_WORKERS", str(os.cpu_count() or 1))),
+            max_queue=int(os.getenv("SAHAYAK_IMAGE_QUEUE_SIZE", "64")),
+            inline_threshold_bytes=int(os.getenv("SAHAYAK_IMAGE_INLINE_BYTES", str(256 * 1024))),
+            timeout_seconds=float(os.getenv("SAHAYAK_IMAGE_TIMEOUT_SECONDS", "30")),
+            mp_context=os.getenv("SAHAYAK_IMAGE_MP_CONTEXT", "spawn"),
+        )
+
+    def start(self):
+        if self.workers > 0 and self._pool is None:
+            # spawn by default: forking a process that already holds gRPC threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.mp_context),
+            )
+            logger.info(
+                f"Image preprocessing pool started with {self.workers} processes "
+                f"(queue {self.max_queue}, inline below {self.inline_threshold_bytes} bytes)"
+            )
+
+    async def warm_up(self):
+        """Import PIL here and start every worker process, so the first upload pays for neither"""
+        await asyncio.to_thread(import_pil)
+        if self._pool is not None:
+            loop = asyncio.get_running_loop()
+            # Concurrent submissions make the pool spawn all of its workers now
+            pids = await asyncio.gather(*(loop.run_in_executor(self._pool, import_pil) for _ in range(self.workers)))
+            logger.info(f"Image preprocessing warmed up in {len(set(pids))} worker processes")
+
+    def _restart_pool(self):
+        """Replace a pool whose worker process died; the old one refuses all new work"""
+        self.stats_counters["pool_restarts"] += 1
+        logger.error("Image preprocessing worker process died; restarting the pool")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self.start()
+
+    def shutdown(self):
+        for _, _, future, _ in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    async def process(self, image_bytes: Union[bytes, memoryview]) -> PreparedImage:
+        """Preprocess one image, raising PreprocessQueueFull when saturated"""
+        size = len(image_bytes)
+        enqueued = time.perf_counter()
+        try:
+            if self._pool is None or size < self.inline_threshold_bytes:
+                self.stats_counters["inline"] += 1
+                prepared = await asyncio.wait_for(
+                    asyncio.to_thread(preprocess_image, image_bytes), self.timeout_seconds
+                )
+            else:
+                prepared = await asyncio.wait_for(self._submit(image_bytes, size), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.stats_counters["timeouts"] += 1
+            raise
+        except PreprocessQueueFull:
+            raise
+        except BrokenProcessPool as e:
+            self.stats_counters["errors"] += 1
+            raise PreprocessUnavailable(f"Image preprocessing worker failed: {e}") from e
+        except Exception:
+            self.stats_counters["errors"] += 1
+            raise
+
+        total_ms = (time.perf_counter() - enqueued) * 1000
+        work_ms = sum(prepared.timings.values())
+        prepared.timings["queue_ms"] = round(max(total_ms - work_ms, 0.0), 2)
+        prepared.timings["total_ms"] = round(total_ms, 2)
+        self.stats_counters["processed"] += 1
+        for stage, ms in prepared.timings.items():
+            IMAGE_STAGE_LATENCY.labels(stage[:-3]).observe(ms / 1000)
+        logger.info(
+            f"Preprocessed image {size} bytes -> {len(prepared.data)} bytes "
+            f"({prepared.width}x{prepared.height}) timings={prepared.timings}"
+        )
+        return prepared
+
+    async def _submit(self, image_bytes: Union[bytes, memoryview], size: int) -> PreparedImage:
+        if len(self._pending) >= self.max_queue:
+            self.stats_counters["rejected"] += 1
+            raise PreprocessQueueFull("Image preprocessing queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._pending, (size, next(self._seq), future, bytes(image_bytes)))
+        self.stats_counters["pooled"] += 1
+        self._dispatch()
+        try:
+            return await future
+        finally:
+            if future.cancelled():
+                # Timed out or abandoned while queued: free its place in the queue
+                remaining = [entry for entry in self._pending if entry[2] is not future]
+                if len(remaining) != len(self._pending):
+                    heapq.heapify(remaining)
+                    self._pending = remaining
+
+    def _dispatch(self):
+        """Hand the smallest pending images to the pool while workers are free"""
+        loop = asyncio.get_running_loop()
+        while self._pending and self.running < self.workers:
+            _, _, future, image_bytes = heapq.heappop(self._pending)
+            if future.done():
+                continue
+            try:
+                submitted = self._pool.submit(preprocess_image, image_bytes)
+            except BrokenProcessPool as e:
+                future.set_exception(e)
+                self._restart_pool()
+                continue
+            self.running += 1
+            pool_future = asyncio.wrap_future(submitted, loop=loop)
+            pool_future.add_done_callback(lambda f, target=future, pool=self._pool: self._completed(f, target, pool))
+
+    def _completed(self, pool_future: asyncio.Future, target: asyncio.Future, pool: ProcessPoolExecutor):
+        self.running -= 1
+        if (
+            not pool_future.cancelled() and isinstance(pool_future.exception(), BrokenProcessPool)
+            and pool is self._pool
+        ):
+            # Every call in flight on the dead pool fails; only the first restarts it
+            self._restart_pool()
+        if not target.done():
+            if pool_future.cancelled():
+                target.cancel()
+            elif pool_future.exception() is not None:
+                target.set_exception(pool_future.exception())
+            else:
+                target.set_result(pool_future.result())
+        if self._pool is not None:
+            self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+        }
@@ -0,0 +1,450 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# A job interrupted by this many restarts is failed instead of being run again
+MAX_RECOVERIES = 3
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are waiting to run"""
+
+
+class JobDeferred(Exception):
+    """Raised by a handler to put its job back in the queue and try again after `delay` seconds"""
+
+    def __init__(self, delay: float, reason: str = ""):
+        super().__init__(reason or f"Deferred for {delay}s")
+        self.delay = delay
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail its job with an HTTP-style status code"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class JobManager:
+    """Background job runner backed by a SQLite job store
+
+    Jobs are written to disk before their ID is returned, so they survive a
+    restart. The store can be shared by several worker processes: every queued or
+    running job records the process that owns it and a lease that the owner
+    renews. Jobs whose lease has expired (their process died) are adopted by
+    another process: running ones go back to the queue, queued ones are run there.
+    A job shed by admission is deferred at most `max_deferrals` times.
+    Submitting a job whose dedupe key matches a queued, running or finished (and
+    not yet evicted) job returns that job instead of starting new work. Finished
+    jobs are kept for `retention_seconds`, and the oldest are evicted beyond
+    `max_jobs`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        workers: int = 4,
+        retention_seconds: float = 24 * 3600,
+        max_jobs: int = 10000,
+        max_pending: int = 1000,
+        cleanup_interval: float = 60.0,
+        lease_seconds: float = 30.0,
+        max_deferrals: int = 20,
+    ):
+        self.path = path
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self.max_pending = max_pending
+        self.cleanup_interval = cleanup_interval
+        self.lease_seconds = lease_seconds
+        self.max_deferrals = max_deferrals
+        # Identifies this process's claims in a store shared with other workers
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+        self._handlers: Dict[str, Callable[[dict], Awaitable[dict]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.stats_counters = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "deferred": 0,
+            "recovered": 0,
+            "adopted": 0,
+            "evicted": 0,
+        }
+        self._open_db(path)
+
+    @classmethod
+    def from_env(cls) -> Optional["JobManager"]:
+        """Create a job manager from SAHAYAK_JOBS_* settings, or None when disabled"""
+        if os.getenv("SAHAYAK_JOBS_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            path=os.getenv("SAHAYAK_JOBS_PATH", os.path.join(".cache", "sahayak_jobs.db")),
+            workers=int(os.getenv("SAHAYAK_JOBS_WORKERS", "4")),
+            retention_seconds=float(os.getenv("SAHAYAK_JOBS_RETENTION_SECONDS", str(24 * 3600))),
+            max_jobs=int(os.getenv("SAHAYAK_JOBS_MAX_JOBS", "10000")),
+            max_pending=int(os.getenv("SAHAYAK_JOBS_MAX_PENDING", "1000")),
+            lease_seconds=float(os.getenv("SAHAYAK_JOBS_LEASE_SECONDS", "30")),
+            max_deferrals=int(os.getenv("SAHAYAK_JOBS_MAX_DEFERRALS", "20")),
+        )
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                dedupe_key TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                status_code INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL,
+                owner TEXT,
+                lease_expires_at REAL,
+                deferrals INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (
+            ("owner", "TEXT"), ("lease_expires_at", "REAL"), ("deferrals", "INTEGER NOT NULL DEFAULT 0")
+        ):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe_key ON jobs(dedupe_key)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs(finished_at)")
+        self._db.commit()
+        logger.info(f"Job store backed by {path}")
+
+    def register(self, kind: str, handler: Callable[[dict], Awaitable[dict]]):
+        """Register the coroutine that runs jobs of `kind`; it returns a JSON-serializable result"""
+        self._handlers[kind] = handler
+
+    # Store operations (run on a thread)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._db_lock:
+            cursor = self._db.execute(sql, params)
+            self._db.commit()
+            return cursor
+
+    def _fetch_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchone()
+
+    def _recover(self) -> list:
+        """Adopt queued and running jobs nobody holds a live lease on; return their IDs, oldest first
+
+        Running ones were interrupted and go back to the queue; queued ones were
+        accepted by a process that stopped or died before running them.
+        """
+        now = time.time()
+        orphaned = "(lease_expires_at IS NULL OR lease_expires_at <= ?)"
+        with self._db_lock:
+            # One write transaction, so two processes recovering at once cannot both take a job
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                failed = self._db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, status_code = 500, updated_at = ?, finished_at = ?, "
+                    f"owner = NULL, lease_expires_at = NULL WHERE status = ? AND {orphaned} AND attempts >= ?",
+                    (FAILED, "Interrupted by too many restarts", now, now, RUNNING, now, MAX_RECOVERIES),
+                ).rowcount
+                rows = self._db.execute(
+                    f"SELECT id, status FROM jobs WHERE status IN (?, ?) AND {orphaned} ORDER BY created_at",
+                    (QUEUED, RUNNING, now),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                    [(QUEUED, self.owner, now + self.lease_seconds, now, row["id"]) for row in rows],
+                )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        recovered = sum(row["status"] == RUNNING for row in rows)
+        if recovered or failed:
+            logger.warning(f"Job store: requeued {recovered} interrupted jobs, failed {failed}")
+        self.stats_counters["recovered"] += recovered
+        self.stats_counters["adopted"] += len(rows) - recovered
+        return [row["id"] for row in rows]
+
+    def _renew_leases(self) -> int:
+        return self._execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status IN (?, ?)",
+            (time.time() + self.lease_seconds, self.owner, QUEUED, RUNNING),
+        ).rowcount
+
+    def _submit(self, kind: str, payload: str, dedupe_key: Optional[str]) -> Tuple[dict, bool]:
+        now = time.time()
+        with self._db_lock:
+            if dedupe_key:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND status != ? ORDER BY created_at DESC LIMIT 1",
+                    (dedupe_key, FAILED),
+                ).fetchone()
+                if row is not None:
+                    return self._to_dict(row), True
+            pending = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} jobs are already waiting")
+            job_id = uuid.uuid4().hex
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, payload, status, owner, lease_expires_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, dedupe_key, payload, QUEUED, self.owner, now + self.lease_seconds, now, now),
+            )
+            self._db.commit()
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row), False
+
+    def _claim(self, job_id: str) -> Optional[sqlite3.Row]:
+        """Mark one of our queued jobs as running; another process may have adopted it in the meantime"""
+        now = time.time()
+        with self._db_lock:
+            claimed = self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (RUNNING, now + self.lease_seconds, now, job_id, QUEUED, self.owner),
+            ).rowcount
+            self._db.commit()
+            if not claimed:
+                return None
+            return self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str], status_code: int):
+        now = time.time()
+        # A job we lost the lease on belongs to whoever took it over
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, status_code = ?, updated_at = ?, finished_at = ?, "
+            "owner = NULL, lease_expires_at = NULL WHERE id = ? AND owner = ? AND status = ?",
+            (status, result, error, status_code, now, now, job_id, self.owner, RUNNING),
+        )
+
+    def _cleanup(self) -> int:
+        now = time.time()
+        with self._db_lock:
+            evicted = self._db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?", (now - self.retention_seconds,)
+            ).rowcount
+            total = self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            if total > self.max_jobs:
+                # Only finished jobs are evicted; pending work is never dropped
+                evicted += self._db.execute(
+                    "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL "
+                    "ORDER BY finished_at ASC LIMIT ?)",
+                    (total - self.max_jobs,),
+                ).rowcount
+            self._db.commit()
+        return evicted
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["status"] == SUCCEEDED:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        elif row["status"] == FAILED:
+            job["error"] = {"status_code": row["status_code"], "detail": row["error"]}
+        return job
+
+    # Lifecycle
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        for job_id in await asyncio.to_thread(self._recover):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop()))
+        self._tasks.append(asyncio.create_task(self._lease_loop()))
+        logger.info(f"Job manager started with {self.workers} workers ({self._queue.qsize()} queued jobs)")
+
+    async def stop(self):
+        interrupted = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Interrupted jobs go back to the queue; they and our queued jobs are left
+        # unowned for the next start or another worker to adopt
+        for job_id in interrupted:
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE jobs SET status = ?, attempts = attempts - 1 WHERE id = ? AND owner = ? AND status = ?",
+                (QUEUED, job_id, self.owner, RUNNING)
+            )
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET owner = NULL, lease_expires_at = NULL WHERE owner = ? AND status = ?",
+            (self.owner, QUEUED)
+        )
+        self._running.clear()
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    # Public API
+
+    async def submit(self, kind: str, payload: dict, dedupe_key: Optional[str] = None) -> Tuple[dict, bool]:
+        """Persist a job and queue it; returns (job, deduplicated)"""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        job, deduplicated = await asyncio.to_thread(self._submit, kind, json.dumps(payload), dedupe_key)
+        if deduplicated:
+            self.stats_counters["deduplicated"] += 1
+        else:
+            self.stats_counters["submitted"] += 1
+            self._queue.put_nowait(job["job_id"])
+        return job, deduplicated
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        row = await asyncio.to_thread(self._fetch_one, "SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._to_dict(row) if row is not None else None
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Long-poll: return the job once it finishes or `timeout` seconds pass"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                if job is None or job["status"] in FINISHED:
+                    self._events.pop(job_id, None)
+                return job
+            event = self._events.setdefault(job_id, asyncio.Event())
+            try:
+                # Re-check the store now and then: another process may be running the job
+                await asyncio.wait_for(event.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    # Workers
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            row = await asyncio.to_thread(self._claim, job_id)
+            if row is None:
+                continue
+            task = asyncio.create_task(self._run(row))
+            self._running[job_id] = task
+            try:
+                await task
+            finally:
+                self._running.pop(job_id, None)
+            if asyncio.current_task().cancelling():
+                # stop() cancelled us while the job swallowed the cancellation; don't take another job
+                raise asyncio.CancelledError
+
+    async def _run(self, row: sqlite3.Row):
+        job_id, kind = row["id"], row["kind"]
+        handler = self._handlers.get(kind)
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise JobFailed(500, f"No handler registered for job kind {kind!r}")
+            result = await handler(json.loads(row["payload"]))
+        except JobDeferred as e:
+            if row["deferrals"] >= self.max_deferrals:
+                await self._complete(job_id, FAILED, None, f"Deferred {row['deferrals']} times: {e}", 503)
+                return
+            self.stats_counters["deferred"] += 1
+            # A deferral is not an attempt: keep it from counting towards MAX_RECOVERIES
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE jobs SET status = ?, deferrals = deferrals + 1, attempts = attempts - 1, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (QUEUED, time.time(), job_id, self.owner, RUNNING)
+            )
+            asyncio.get_running_loop().call_later(e.delay, self._queue.put_nowait, job_id)
+            return
+        except JobFailed as e:
+            await self._complete(job_id, FAILED, None, e.detail, e.status_code)
+            return
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {e}")
+            await self._complete(job_id, FAILED, None, str(e), 500)
+            return
+        logger.info(f"Job {job_id} ({kind}) finished in {time.perf_counter() - started:.2f}s")
+        await self._complete(job_id, SUCCEEDED, json.dumps(result), None, 200)
+
+    async def _complete(self, job_id: str, status: str, result: Optional[str], error: Optional[str], status_code: int):
+        await asyncio.to_thread(self._finish, job_id, status, result, error, status_code)
+        self.stats_counters[status] += 1
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _cleanup_loop(self):
+        while True:
+            try:
+                evicted = await asyncio.to_thread(self._cleanup)
+                self.stats_counters["evicted"] += evicted
+            except Exception as e:
+                logger.warning(f"Job cleanup failed: {e}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    async def _lease_loop(self):
+        """Renew our leases, and adopt jobs of workers that stopped renewing theirs"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._renew_leases)
+                for job_id in await asyncio.to_thread(self._recover):
+                    self._queue.put_nowait(job_id)
+            except Exception as e:
+                logger.warning(f"Job lease renewal failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "owner": self.owner,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": len(self._running),
+            "path": self.path,
+        }
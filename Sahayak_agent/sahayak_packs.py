@@ -0,0 +1,400 @@
+"""Precomputed offline content packs
+
+A pack is one read-only file of generated lesson plans and content, looked up by
+the same cache keys the API uses. It is memory-mapped, so opening it only reads
+the header, and every worker process serving the same pack shares its pages
+through the OS page cache. Layout (little endian):
+
+    header   magic, version, entry count, index offset, meta offset, meta length
+    data     UTF-8 texts, zlib-compressed where that is smaller
+    index    fixed-size records sorted by key: key (16 bytes), offset, length, flags
+    meta     JSON build information
+
+Build a pack from a manifest of topics x grade levels x locations:
+
+    python sahayak_packs.py build manifest.json --output packs/syllabus.pack
+    python sahayak_packs.py inspect packs/syllabus.pack
+
+Manifest (JSON):
+
+    {
+      "locations": ["rural India", "rural Rajasthan"],
+      "lesson_plans": [
+        {"topics": ["Water cycle", "Fractions"], "grade_levels": [[3, 4, 5], [6, 7, 8]], "duration_minutes": 45}
+      ],
+      "content": [
+        {"prompts": ["Explain photosynthesis"], "grade_levels": [[4, 5, 6]], "subjects": ["science"]}
+      ]
+    }
+
+Any other request field given in a group (resources, max_tokens, ...) is passed
+through unchanged. Entries already present in the output pack are reused unless
+--fresh is given, so a grown manifest only generates what is new.
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import struct
+import asyncio
+import logging
+import argparse
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SHYKPAK1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+RECORD = struct.Struct("<16sQII")
+KEY_BYTES = 16
+FLAG_COMPRESSED = 1
+PACK_SUFFIX = ".pack"
+
+
+class PackFormatError(Exception):
+    """The file is not a content pack this version can read"""
+
+
+def pack_key(cache_key: str) -> bytes:
+    """Index key for an API cache key (a SHA-256 hex digest)"""
+    return bytes.fromhex(cache_key)[:KEY_BYTES]
+
+
+class ContentPack:
+    """One memory-mapped content pack"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._map) < HEADER.size:
+                raise PackFormatError(f"{path} is too small to be a content pack")
+            magic, version, self.count, self._index_offset, self._meta_offset, self._meta_length = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise PackFormatError(f"{path} is not a version {VERSION} content pack")
+            if self._index_offset + self.count * RECORD.size > len(self._map):
+                raise PackFormatError(f"{path} is truncated")
+        except BaseException:
+            self._map.close()
+            raise
+        if hasattr(self._map, "madvise") and hasattr(mmap, "MADV_RANDOM"):
+            # Lookups touch a few scattered pages; read-ahead would only waste memory
+            self._map.madvise(mmap.MADV_RANDOM)
+
+    @property
+    def meta(self) -> dict:
+        raw = self._map[self._meta_offset:self._meta_offset + self._meta_length]
+        return json.loads(raw) if raw else {}
+
+    def _record(self, position: int) -> Tuple[bytes, int, int, int]:
+        return RECORD.unpack_from(self._map, self._index_offset + position * RECORD.size)
+
+    def _text(self, offset: int, length: int, flags: int) -> str:
+        data = self._map[offset:offset + length]
+        if flags & FLAG_COMPRESSED:
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """Binary search the index for a cache key"""
+        target = pack_key(cache_key)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._index_offset + mid * RECORD.size
+            key = self._map[start:start + KEY_BYTES]
+            if key < target:
+                lo = mid + 1
+            elif key > target:
+                hi = mid
+            else:
+                _, offset, length, flags = self._record(mid)
+                return self._text(offset, length, flags)
+        return None
+
+    def items(self) -> Iterator[Tuple[bytes, str]]:
+        for position in range(self.count):
+            key, offset, length, flags = self._record(position)
+            yield key, self._text(offset, length, flags)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class PackWriter:
+    """Writes a pack to a temporary file and moves it into place on finish()
+
+    Servers that still map the old file keep reading it until they reopen.
+    """
+
+    def __init__(self, path: str, compress_level: int = 9):
+        self.path = path
+        self.compress_level = compress_level
+        self._tmp_path = f"{path}.tmp.{os.getpid()}"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(b"\0" * HEADER.size)
+        self._index: Dict[bytes, Tuple[int, int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._index
+
+    def add(self, key: bytes, text: str):
+        data = text.encode("utf-8")
+        flags = 0
+        compressed = zlib.compress(data, self.compress_level)
+        if len(compressed) < len(data):
+            data, flags = compressed, FLAG_COMPRESSED
+        offset = self._file.tell()
+        self._file.write(data)
+        self._index[key] = (offset, len(data), flags)
+
+    def finish(self, meta: Optional[dict] = None):
+        index_offset = self._file.tell()
+        for key in sorted(self._index):
+            offset, length, flags = self._index[key]
+            self._file.write(RECORD.pack(key, offset, length, flags))
+        meta_offset = self._file.tell()
+        raw_meta = json.dumps(meta or {}, sort_keys=True).encode("utf-8")
+        self._file.write(raw_meta)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, len(self._index), index_offset, meta_offset, len(raw_meta)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class ContentPacks:
+    """The packs a server answers from, checked in the configured order"""
+
+    def __init__(self, paths: List[str]):
+        self.packs: List[ContentPack] = []
+        for path in paths:
+            try:
+                self.packs.append(ContentPack(path))
+            except (OSError, ValueError, PackFormatError) as e:
+                logger.error(f"Skipping content pack {path}: {e}")
+        self.stats_counters = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["ContentPacks"]:
+        """Open the packs listed in SAHAYAK_CONTENT_PACKS (files or directories), or None"""
+        setting = os.getenv("SAHAYAK_CONTENT_PACKS", "")
+        paths = []
+        for entry in filter(None, (part.strip() for part in setting.split(","))):
+            if os.path.isdir(entry):
+                paths.extend(sorted(
+                    os.path.join(entry, name) for name in os.listdir(entry) if name.endswith(PACK_SUFFIX)
+                ))
+            else:
+                paths.append(entry)
+        if not paths:
+            return None
+        started = time.perf_counter()
+        packs = cls(paths)
+        logger.info(
+            f"Loaded {len(packs.packs)} content packs ({packs.entries} entries) "
+            f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return packs
+
+    @property
+    def entries(self) -> int:
+        return sum(pack.count for pack in self.packs)
+
+    def get(self, cache_key: str) -> Optional[str]:
+        for pack in self.packs:
+            text = pack.get(cache_key)
+            if text is not None:
+                self.stats_counters["hits"] += 1
+                return text
+        self.stats_counters["misses"] += 1
+        return None
+
+    def stats(self) -> dict:
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "hit_ratio": round(self.stats_counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": self.entries,
+            "packs": [{"path": pack.path, "entries": pack.count} for pack in self.packs],
+        }
+
+    def close(self):
+        for pack in self.packs:
+            pack.close()
+        self.packs = []
+
+
+def expand_manifest(manifest: dict) -> Iterator[Tuple[str, dict]]:
+    """Yield (kind, request fields) for every topic/prompt x grade set x location in the manifest"""
+    default_locations = manifest.get("locations") or [None]
+    for group in manifest.get("lesson_plans", []):
+        extra = {k: v for k, v in group.items() if k not in ("topics", "grade_levels", "locations")}
+        for topic, grades, location in itertools.product(
+            group["topics"], group["grade_levels"], group.get("locations") or default_locations
+        ):
+            fields = {**extra, "topic": topic, "grade_levels": grades}
+            if location is not None:
+                fields["location"] = location
+            yield "lesson_plan", fields
+    for group in manifest.get("content", []):
+        extra = {k: v for k, v in group.items() if k not in ("prompts", "grade_levels", "locations", "subjects")}
+        for prompt, grades, location, subject in itertools.product(
+            group["prompts"],
+            group.get("grade_levels") or [None],
+            group.get("locations") or default_locations,
+            group.get("subjects") or [None],
+        ):
+            fields = {**extra, "prompt": prompt}
+            for name, value in (("grade_levels", grades), ("location", location), ("subject", subject)):
+                if value is not None:
+                    fields[name] = value
+            yield "content", fields
+
+
+async def build_pack(manifest_path: str, output: str, concurrency: int = 4, fresh: bool = False) -> dict:
+    """Generate every manifest entry through the normal model path and write a pack"""
+    # The API module is only needed to build, not to serve packs
+    import sahayak_api
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    requests = []
+    for kind, fields in expand_manifest(manifest):
+        if kind == "lesson_plan":
+            request = sahayak_api.LessonPlanRequest(**fields)
+            key = sahayak_api.lesson_plan_cache_key(request)
+        else:
+            request = sahayak_api.TextRequest(**fields)
+            key = sahayak_api.content_cache_key(request)
+        requests.append((kind, request, key))
+
+    previous = None
+    if not fresh and os.path.exists(output):
+        try:
+            previous = ContentPack(output)
+        except PackFormatError as e:
+            logger.warning(f"Not reusing {output}: {e}")
+
+    api = sahayak_api.SahayakAPI()
+    writer = PackWriter(output)
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"generated": 0, "reused": 0, "failed": 0, "duplicates": 0}
+
+    async def produce(kind, request):
+        async with semaphore:
+            if kind == "lesson_plan":
+                return await sahayak_api.generate_lesson_plan_for(api, request)
+            return await sahayak_api.generate_content_for(api, request)
+
+    started = time.perf_counter()
+    try:
+        tasks, queued = [], set()
+        for kind, request, key in requests:
+            index_key = pack_key(key)
+            if index_key in writer or index_key in queued:
+                counts["duplicates"] += 1
+                continue
+            text = previous.get(key) if previous else None
+            if text is not None:
+                writer.add(index_key, text)
+                counts["reused"] += 1
+                continue
+            queued.add(index_key)
+            tasks.append((index_key, request, asyncio.create_task(produce(kind, request))))
+
+        for done, (index_key, request, task) in enumerate(tasks, 1):
+            try:
+                writer.add(index_key, await task)
+                counts["generated"] += 1
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                logger.error(f"Failed to generate {request.model_dump(exclude_none=True)}: {detail}")
+                counts["failed"] += 1
+            if done % 10 == 0 or done == len(tasks):
+                print(f"  {done}/{len(tasks)} generated", file=sys.stderr)
+
+        if previous:
+            previous.close()
+            previous = None
+        writer.finish({
+            "built_at": time.time(),
+            "manifest": os.path.basename(manifest_path),
+            "text_model": sahayak_api.TEXT_MODEL_NAME,
+            "prompt_template_version": sahayak_api.PROMPT_TEMPLATE_VERSION,
+            "backend": api.backend.name,
+            "entries": len(writer),
+            **counts,
+        })
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if previous:
+            previous.close()
+        api.backend.close()
+    return {**counts, "entries": len(writer), "elapsed_seconds": round(time.perf_counter() - started, 2)}
+
+
+def inspect_pack(path: str) -> dict:
+    started = time.perf_counter()
+    pack = ContentPack(path)
+    opened_ms = (time.perf_counter() - started) * 1000
+    try:
+        return {
+            "path": path,
+            "bytes": os.path.getsize(path),
+            "entries": pack.count,
+            "open_ms": round(opened_ms, 3),
+            "meta": pack.meta,
+        }
+    finally:
+        pack.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect offline content packs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Generate the entries of a manifest into a pack")
+    build.add_argument("manifest", help="JSON manifest of topics, grade levels and locations")
+    build.add_argument("--output", "-o", required=True, help=f"Pack file to write (conventionally *{PACK_SUFFIX})")
+    build.add_argument("--concurrency", type=int, default=4, help="Generations in flight at once")
+    build.add_argument("--fresh", action="store_true", help="Regenerate entries already present in the output pack")
+    inspect = commands.add_parser("inspect", help="Show a pack's size, entry count and build information")
+    inspect.add_argument("pack")
+    return parser.parse_args(argv)
+
+
+def main(args) -> int:
+    if args.command == "inspect":
+        print(json.dumps(inspect_pack(args.pack), indent=2))
+        return 0
+    result = asyncio.run(build_pack(args.manifest, args.output, args.concurrency, args.fresh))
+    print(json.dumps(result, indent=2))
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(parse_args()))
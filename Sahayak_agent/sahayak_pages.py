@@ -0,0 +1,129 @@
+import io
+import os
+import asyncio
+import logging
+import threading
+import importlib.util
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME_TYPES = ("application/pdf", "application/x-pdf")
+# Longest side of a rendered PDF page; preprocessing downscales further
+PDF_RENDER_MAX_SIDE = int(os.getenv("SAHAYAK_PAGES_RENDER_MAX_SIDE", "1600"))
+PDF_RENDER_QUALITY = 90
+
+# PDFium is not thread-safe: every call into it goes through this lock
+_pdfium_lock = threading.Lock()
+
+
+class PdfUnavailable(Exception):
+    """PDF input needs the optional pypdfium2 package"""
+
+
+def pdf_support() -> bool:
+    return importlib.util.find_spec("pypdfium2") is not None
+
+
+def is_pdf(content_type: Optional[str], filename: Optional[str] = None) -> bool:
+    if content_type in PDF_MIME_TYPES:
+        return True
+    return bool(filename) and filename.lower().endswith(".pdf")
+
+
+class PdfPages:
+    """Renders the pages of one PDF on demand, so only pages in flight are held in memory
+
+    Given a file object (such as a spooled upload) instead of bytes, PDFium reads
+    just the parts of the file it needs, when it needs them; the file must stay
+    open until close().
+    """
+
+    def __init__(self, data: Union[bytes, BinaryIO], max_side: int = PDF_RENDER_MAX_SIDE):
+        try:
+            import pypdfium2
+        except ImportError:
+            raise PdfUnavailable("PDF support requires the pypdfium2 package")
+        self._pdfium = pypdfium2
+        self._data = data
+        self.max_side = max_side
+        self._document = None
+        self.page_count = 0
+
+    async def open(self) -> int:
+        """Parse the document and return its page count"""
+        self.page_count = await asyncio.to_thread(self._open)
+        return self.page_count
+
+    def _open(self) -> int:
+        with _pdfium_lock:
+            self._document = self._pdfium.PdfDocument(self._data)
+            return len(self._document)
+
+    async def render(self, index: int) -> bytes:
+        """Render one page (0-based) to JPEG bytes"""
+        return await asyncio.to_thread(self._render, index)
+
+    def _render(self, index: int) -> bytes:
+        with _pdfium_lock:
+            page = self._document[index]
+            try:
+                width, height = page.get_size()
+                # Page sizes are in points (1/72 inch); never render above 2x
+                scale = min(2.0, self.max_side / max(width, height, 1))
+                bitmap = page.render(scale=scale)
+                image = bitmap.to_pil()
+            finally:
+                page.close()
+        out = io.BytesIO()
+        image.convert("RGB").save(out, format="JPEG", quality=PDF_RENDER_QUALITY)
+        return out.getvalue()
+
+    def close(self):
+        with _pdfium_lock:
+            if self._document is not None:
+                self._document.close()
+                self._document = None
+        self._data = None
+
+
+@dataclass
+class PageSource:
+    """One page of a multi-page upload; its bytes are only loaded when the page starts"""
+    number: int
+    name: str
+    load: Callable[[], Awaitable[bytes]]
+
+
+async def run_pages(
+    sources: AsyncIterator[PageSource],
+    handle: Callable[[PageSource], Awaitable[Any]],
+    concurrency: int,
+) -> AsyncIterator[Any]:
+    """Run handle() over pages with at most `concurrency` in flight, yielding results as they finish
+
+    The next page is only pulled from `sources` when a slot frees up, which keeps
+    memory bounded by the window rather than by the size of the upload. handle()
+    should report per-page failures in its result rather than raise.
+    """
+    pending = set()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    source = await sources.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.create_task(handle(source)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Stop outstanding pages if the client goes away
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import threading
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 60.0
+
+
+class ProfilerBusy(Exception):
+    """Only one profiling session runs at a time"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler over every thread in the process
+
+    Samples sys._current_frames() at a fixed interval and aggregates the stacks
+    into the folded format ("frame;frame;frame count") read by flamegraph.pl,
+    speedscope and similar tools. It only costs anything while a session runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+
+    def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> str:
+        """Sample for `seconds` and return folded stacks; blocks the calling thread"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profiling session is already running")
+        self.running = True
+        try:
+            return self._sample(min(seconds, MAX_PROFILE_SECONDS), max(interval, 0.001), include_idle)
+        finally:
+            self.running = False
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> str:
+        own_thread = threading.get_ident()
+        names = {}
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        logger.info(f"Sampling profiler running for {seconds}s every {interval * 1000:.1f}ms")
+        while time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                names.setdefault(thread.ident, thread.name)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_label(frame))
+                    frame = frame.f_back
+                if not include_idle and frames and _is_idle(frames[0]):
+                    continue
+                frames.append(names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(frames))] += 1
+            samples += 1
+            time.sleep(interval)
+        logger.info(f"Sampling profiler collected {samples} samples, {len(stacks)} unique stacks")
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# Leaf frames that mean a thread is parked rather than doing work
+_IDLE_LEAVES = ("selectors.py:select", "threading.py:wait", "queue.py:get", "thread.py:_worker")
+
+
+def _is_idle(leaf: str) -> bool:
+    return leaf.startswith(_IDLE_LEAVES)
+
+
+profiler = SamplingProfiler()
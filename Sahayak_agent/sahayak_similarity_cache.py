@@ -0,0 +1,362 @@
+import os
+import re
+import time
+import array
+import random
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from sahayak_tracing import span
+
+logger = logging.getLogger(__name__)
+
+_PRIME = (1 << 61) - 1
+_TOKEN = re.compile(r"\w+")
+# Bump when prompt_tokens() changes: stored tokens from another version would mismatch
+TOKENS_VERSION = 2
+# Words that change how a request is phrased but not what is asked for; grade
+# levels, subject and location are part of the cache scope instead. Question
+# words, task verbs and what is asked for (lesson, quiz, story...) are kept.
+STOP_WORDS = frozenset("""
+    a an the and or of to for in on at by with about from into is are be this that it its
+    me my we our us you your i please can could would will should some
+    class grade std standard level kids kid children child students student pupils learners
+""".split())
+# Inflections of the same task, so "explain" and "explanation" still match
+TASK_FORMS = {
+    "explained": "explain", "explaining": "explain", "explanation": "explain",
+    "described": "describe", "describing": "describe", "description": "describe",
+    "teaching": "teach", "creating": "create", "writing": "write", "making": "make", "preparing": "prepare",
+}
+# Words that change the answer's length or depth: prompts only match others with the same set
+STYLE_WORDS = frozenset("""
+    simple simply easy basic brief briefly short quick quickly summary summarize summarise
+    detailed detail depth deep long elaborate thorough advanced
+""".split())
+
+
+def prompt_tokens(text: str) -> List[str]:
+    """Lowercase words without stop words, with task inflections merged and a crude plural strip"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        token = TASK_FORMS.get(token, token)
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def style_scope(scope: str, tokens: List[str]) -> str:
+    """Narrow a scope by the prompt's length and difficulty words, so a short answer never serves a detailed request"""
+    style = sorted(STYLE_WORDS.intersection(tokens))
+    return f"{scope}|{'+'.join(style)}" if style else scope
+
+
+def shingles(tokens: List[str]) -> Set[str]:
+    """Words plus adjacent word pairs, so word order counts a little"""
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes; the fixed seed keeps stored signatures valid"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, features: Set[str]) -> List[int]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            for feature in features
+        ]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._params]
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH candidate threshold sits just below the similarity threshold
+
+    Candidates are verified with exact Jaccard afterwards, so erring towards recall
+    only costs a few extra comparisons.
+    """
+    best = (num_perm, 1)
+    best_gap = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        knee = (1.0 / bands) ** (1.0 / rows)
+        gap = threshold - knee
+        if gap >= 0 and (best_gap is None or gap < best_gap):
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class MinHashLSH:
+    """Banded LSH index over MinHash signatures"""
+
+    def __init__(self, bands: int, rows: int):
+        self.bands = bands
+        self.rows = rows
+        self._tables: List[Dict[tuple, set]] = [{} for _ in range(bands)]
+        self._keys: Dict[int, List[tuple]] = {}  # entry_id -> band keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _band_keys(self, signature: List[int]) -> List[tuple]:
+        return [tuple(signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def add(self, signature: List[int], entry_id: int):
+        keys = self._band_keys(signature)
+        self._keys[entry_id] = keys
+        for table, key in zip(self._tables, keys):
+            table.setdefault(key, set()).add(entry_id)
+
+    def remove(self, entry_id: int):
+        keys = self._keys.pop(entry_id, None)
+        if keys is None:
+            return
+        for table, key in zip(self._tables, keys):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[key]
+
+    def candidates(self, signature: List[int]) -> Set[int]:
+        found = set()
+        for table, key in zip(self._tables, self._band_keys(signature)):
+            bucket = table.get(key)
+            if bucket:
+                found.update(bucket)
+        return found
+
+
+class PromptSimilarityCache:
+    """Near-duplicate prompt cache: MinHash LSH over normalized word shingles, persisted in SQLite
+
+    Entries are grouped by scope (grade levels, subject, location, model, output
+    limit, plus any length or difficulty words in the prompt) and matched on the
+    prompt alone, so "explain photosynthesis to class 5" and "please explain
+    photosynthesis for grade 5 kids" share an answer, but a short and a detailed
+    request, or a lesson and an explanation, do not.
+    LSH finds candidates; a hit needs an exact shingle Jaccard similarity of at
+    least `threshold`. Signatures and tokens live in memory per scope; answers stay on disk.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = 0.7,
+        num_perm: int = 64,
+        max_entries: int = 20000,
+        ttl_seconds: float = 24 * 3600,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+
+        self._indexes: Dict[str, MinHashLSH] = {}
+        self._entries: Dict[int, Tuple[str, Set[str]]] = {}  # entry_id -> (scope, shingles)
+        self._db_lock = threading.Lock()
+        self._db = None
+
+        self.stats_counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "bypassed": 0, "unindexable": 0}
+        self.similarity_total = 0.0
+
+        self._open_db(path)
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional["PromptSimilarityCache"]:
+        """Create a cache from SAHAYAK_SIMILARITY_CACHE_* settings, or None when disabled"""
+        if os.getenv("SAHAYAK_SIMILARITY_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            path=os.getenv("SAHAYAK_SIMILARITY_CACHE_PATH", os.path.join(".cache", "sahayak_similar.db")),
+            threshold=float(os.getenv("SAHAYAK_SIMILARITY_CACHE_THRESHOLD", "0.7")),
+            num_perm=int(os.getenv("SAHAYAK_SIMILARITY_CACHE_PERMUTATIONS", "64")),
+            max_entries=int(os.getenv("SAHAYAK_SIMILARITY_CACHE_MAX_ENTRIES", "20000")),
+            ttl_seconds=float(os.getenv("SAHAYAK_SIMILARITY_CACHE_TTL_SECONDS", str(24 * 3600))),
+        )
+
+    def _open_db(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS similar_prompts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                tokens TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS similar_prompts_last_access ON similar_prompts(last_access)")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != TOKENS_VERSION:
+            logger.info("Dropping similar prompts tokenized by an older version")
+            self._db.execute("DELETE FROM similar_prompts")
+            self._db.execute(f"PRAGMA user_version = {TOKENS_VERSION}")
+        self._db.commit()
+
+    def _load(self):
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("DELETE FROM similar_prompts WHERE created_at <= ?", (now - self.ttl_seconds,))
+            self._db.commit()
+            rows = self._db.execute("SELECT id, scope, tokens, signature FROM similar_prompts").fetchall()
+        loaded = 0
+        for entry_id, scope, tokens, blob in rows:
+            signature = array.array("Q", blob).tolist()
+            if len(signature) != self.hasher.num_perm:
+                # Written with a different permutation count; it can never match
+                continue
+            self._index(entry_id, scope, shingles(tokens.split()), signature)
+            loaded += 1
+        logger.info(f"Similarity cache loaded {loaded} entries from {self.path}")
+
+    def _index(self, entry_id: int, scope: str, features: Set[str], signature: List[int]):
+        index = self._indexes.get(scope)
+        if index is None:
+            index = self._indexes[scope] = MinHashLSH(self.bands, self.rows)
+        index.add(signature, entry_id)
+        self._entries[entry_id] = (scope, features)
+
+    def _unindex(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        index = self._indexes[entry[0]]
+        index.remove(entry_id)
+        if not len(index):
+            del self._indexes[entry[0]]
+
+    def _fetch(self, entry_id: int, now: float) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT answer, created_at FROM similar_prompts WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE similar_prompts SET last_access = ? WHERE id = ?", (now, entry_id))
+                self._db.commit()
+            return row
+
+    def _store(self, scope: str, tokens: str, signature: List[int], answer: str, now: float) -> Tuple[int, List[int]]:
+        with self._db_lock:
+            entry_id = self._db.execute(
+                "INSERT INTO similar_prompts (scope, tokens, signature, answer, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, tokens, array.array("Q", signature).tobytes(), answer, now, now),
+            ).lastrowid
+            evicted = []
+            count = self._db.execute("SELECT COUNT(*) FROM similar_prompts").fetchone()[0]
+            if count > self.max_entries:
+                # Evict the least recently used tenth in one go to amortize the cost
+                excess = count - self.max_entries + max(1, self.max_entries // 10)
+                evicted = [
+                    row[0] for row in self._db.execute(
+                        "SELECT id FROM similar_prompts ORDER BY last_access ASC LIMIT ?", (excess,)
+                    )
+                ]
+                self._db.executemany("DELETE FROM similar_prompts WHERE id = ?", [(i,) for i in evicted])
+            self._db.commit()
+            return entry_id, evicted
+
+    def _match(self, scope: str, features: Set[str]) -> List[Tuple[float, int]]:
+        index = self._indexes.get(scope)
+        if index is None:
+            return []
+        matches = []
+        for entry_id in index.candidates(self.hasher.signature(features)):
+            similarity = jaccard(features, self._entries[entry_id][1])
+            if similarity >= self.threshold:
+                matches.append((similarity, entry_id))
+        matches.sort(reverse=True)
+        return matches
+
+    async def get(self, scope: str, prompt: str) -> Optional[Tuple[str, float]]:
+        """Return (answer, similarity) for the most similar stored prompt above the threshold"""
+        tokens = prompt_tokens(prompt)
+        features = shingles(tokens)
+        if not features:
+            self.stats_counters["unindexable"] += 1
+            return None
+        scope = style_scope(scope, tokens)
+        now = time.time()
+        for similarity, entry_id in self._match(scope, features):
+            with span("similarity_cache"):
+                row = await asyncio.to_thread(self._fetch, entry_id, now)
+            if row is None:
+                # Removed by another worker sharing the database
+                self._unindex(entry_id)
+                continue
+            answer, created_at = row
+            if created_at <= now - self.ttl_seconds:
+                self._unindex(entry_id)
+                continue
+            self.stats_counters["hits"] += 1
+            self.similarity_total += similarity
+            return answer, similarity
+        self.stats_counters["misses"] += 1
+        return None
+
+    async def set(self, scope: str, prompt: str, answer: str):
+        tokens = prompt_tokens(prompt)
+        if not answer or not tokens:
+            return
+        features = shingles(tokens)
+        scope = style_scope(scope, tokens)
+        if any(similarity == 1.0 for similarity, _ in self._match(scope, features)):
+            # An equivalent prompt is already stored
+            return
+        signature = self.hasher.signature(features)
+        entry_id, evicted = await asyncio.to_thread(self._store, scope, " ".join(tokens), signature, answer, time.time())
+        self._index(entry_id, scope, features, signature)
+        for old_id in evicted:
+            self._unindex(old_id)
+        self.stats_counters["writes"] += 1
+        self.stats_counters["evictions"] += len(evicted)
+
+    def record_bypass(self):
+        self.stats_counters["bypassed"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        hits = self.stats_counters["hits"]
+        return {
+            **self.stats_counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "mean_hit_similarity": round(self.similarity_total / hits, 4) if hits else None,
+            "entries": len(self._entries),
+            "scopes": len(self._indexes),
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows": self.rows,
+            "path": self.path,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
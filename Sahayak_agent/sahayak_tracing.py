@@ -0,0 +1,128 @@
+import os
+import re
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+class Trace:
+    """Per-request span totals; spans with the same name (retries, batch items) are summed"""
+
+    __slots__ = ("request_id", "started", "spans")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}  # name -> [total_ms, count]
+
+    def add(self, name: str, duration_ms: float):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [duration_ms, 1]
+        else:
+            span[0] += duration_ms
+            span[1] += 1
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        """Format the spans (plus the total so far) as a Server-Timing header value"""
+        entries = [
+            f'{name};dur={total:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (total, count) in self.spans.items()
+        ]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={total:.1f}ms" for name, (total, _) in self.spans.items())
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("sahayak_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name: str):
+    """Time a block into the current request's trace; a no-op outside a request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, (time.perf_counter() - started) * 1000)
+
+
+def record_span(name: str, duration_ms: float):
+    """Add a span measured elsewhere (e.g. in a worker process) to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, duration_ms)
+
+
+class TracingMiddleware:
+    """ASGI middleware that gives every request a trace, an X-Request-ID and a Server-Timing header
+
+    An incoming X-Request-ID is reused when it looks sane so IDs can be followed
+    across proxies. Server-Timing reflects the spans finished before the headers
+    go out; for streams the full breakdown is in the slow-request log line.
+    """
+
+    def __init__(self, app, slow_request_seconds: Optional[float] = None):
+        self.app = app
+        if slow_request_seconds is None:
+            slow_request_seconds = float(os.getenv("SAHAYAK_TRACE_SLOW_SECONDS", "10"))
+        self.slow_request_ms = slow_request_seconds * 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+                break
+        trace = Trace(request_id or uuid.uuid4().hex)
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", trace.request_id.encode("latin-1")))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            elapsed = trace.elapsed_ms()
+            if elapsed >= self.slow_request_ms:
+                logger.warning(
+                    f"Slow request {trace.request_id} {scope['method']} {scope['path']} "
+                    f"took {elapsed:.1f}ms: {trace.summary()}"
+                )
@@ -0,0 +1,599 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional
+from sahayak_metrics import REGISTRY, ATTEMPT_BUCKETS
+from sahayak_tracing import span
+from sahayak_deadline import DeadlineExceeded, remaining_time, within_deadline
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, throttling and transient server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429}
+RETRYABLE_EXCEPTION_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "Aborted", "Unknown", "EmptyResponseError",
+}
+# Successful call latencies kept per operation for the hedge percentile
+LATENCY_WINDOW = 500
+# Most hedges that unused credit can add up to at once
+HEDGE_BURST = 5
+_RETRY_IN_PATTERN = re.compile(r"retry (?:in|after) ([0-9.]+)\s*(ms|s)?", re.IGNORECASE)
+
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "sahayak_upstream_request_duration_seconds",
+    "Model call latency (whole stream for streaming calls) by operation and outcome",
+    ("operation", "outcome"),
+)
+UPSTREAM_ATTEMPTS = REGISTRY.histogram(
+    "sahayak_upstream_attempts", "Attempts used per logical model call", ("operation",), ATTEMPT_BUCKETS
+)
+UPSTREAM_BACKOFF = REGISTRY.histogram(
+    "sahayak_upstream_backoff_seconds", "Time slept between retries", ("operation",)
+)
+INPUT_TOKENS = REGISTRY.histogram(
+    "sahayak_upstream_input_tokens", "Estimated prompt tokens per model call", ("operation",),
+    (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384),
+)
+HEDGED_CALLS = REGISTRY.counter(
+    "sahayak_upstream_hedges_total", "Hedged model calls by operation and which call finished first", ("operation", "winner")
+)
+CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "sahayak_upstream_circuit_rejections_total", "Model calls refused without trying because the circuit was open"
+)
+TRUNCATED_INPUTS = REGISTRY.counter(
+    "sahayak_truncated_inputs_total", "User inputs cut down to the input token budget"
+)
+
+
+class EmptyResponseError(Exception):
+    """The model returned no text; usually transient"""
+
+
+class UpstreamCallFailed(Exception):
+    """A model call failed for good, either not retryable or out of attempts"""
+
+    def __init__(self, label: str, attempts: int, cause: Exception):
+        super().__init__(f"{label} failed after {attempts} attempts: {cause}")
+        self.label = label
+        self.attempts = attempts
+        self.cause = cause
+        self.throttled = is_throttle(cause)
+        self.retry_after = retry_after_hint(cause)
+
+
+class CircuitOpen(Exception):
+    """The upstream is considered unhealthy; calls fail fast until the circuit half-opens"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Model service circuit is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    code = getattr(exc, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_throttle(exc: Exception) -> bool:
+    return _status_code(exc) in THROTTLE_STATUS_CODES or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Only retry errors that can succeed on a second try"""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError, EmptyResponseError)):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(exc).__name__ in RETRYABLE_EXCEPTION_NAMES
+
+
+def retry_after_hint(exc: Exception) -> Optional[float]:
+    """Seconds the upstream asked us to wait, from RetryInfo details, headers or the message"""
+    for detail in getattr(exc, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and hasattr(delay, "seconds"):
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = _RETRY_IN_PATTERN.search(str(exc))
+    if match:
+        seconds = float(match.group(1))
+        return seconds / 1000 if match.group(2) == "ms" else seconds
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for budgeting"""
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, at a word boundary where possible"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = cut.rfind(" ")
+    if boundary > max_chars * 0.8:
+        cut = cut[:boundary]
+    TRUNCATED_INPUTS.inc()
+    logger.warning(f"Truncated input from ~{estimate_tokens(text)} to ~{max_tokens} tokens")
+    return cut
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute; waiters are served FIFO"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                wait = (amount - self.tokens) / self.rate
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+                self._refill()
+            self.tokens -= amount
+
+    def settle(self, delta: float):
+        """Charge (or refund) the difference between estimated and actual usage"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit: grow by ~1 per window of successes, halve on throttling
+
+    Slow responses (above latency_target) shrink the limit gently, since queueing
+    upstream shows up as latency before it shows up as 429s.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target: float,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 1.0,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.inflight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # Whoever resolves the future has already counted us as in flight
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False):
+        self.inflight -= 1
+        if throttled:
+            self._decrease(self.decrease_factor)
+        elif latency is not None:
+            if latency > self.latency_target:
+                self._decrease(0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def _decrease(self, factor: float):
+        # One decrease per cooldown, so a burst of 429s from one overload halves once
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown_seconds:
+            self.limit = max(self.minimum, self.limit * factor)
+            self._last_decrease = now
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker around the upstream
+
+    After `failure_threshold` transient failures in a row (server errors, timeouts,
+    empty responses) the circuit opens and calls fail fast for `reset_seconds`.
+    Then one probe call is let through (half-open): success closes the circuit,
+    failure opens it again. Throttling is left to the concurrency limiter, and
+    non-retryable errors say nothing about upstream health.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.stats_counters = {"opened": 0, "rejected": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being refused"""
+        if self.state == self.OPEN:
+            return self.retry_after() > 0
+        return self.state == self.HALF_OPEN and self._probing
+
+    def acquire(self):
+        """Let a call through, or raise CircuitOpen"""
+        if not self.enabled or self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN and self.retry_after() <= 0:
+            self.state = self.HALF_OPEN
+            logger.info("Upstream circuit half-open, sending a probe call")
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        self.stats_counters["rejected"] += 1
+        CIRCUIT_REJECTIONS.inc()
+        raise CircuitOpen(max(1.0, self.retry_after()))
+
+    def record(self, exc: Optional[Exception] = None):
+        """Record how a call that acquire() let through ended; None means success"""
+        if not self.enabled:
+            return
+        self._probing = False
+        if exc is None:
+            if self.state != self.CLOSED:
+                logger.info("Upstream circuit closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+        elif is_retryable(exc) and not is_throttle(exc):
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def release(self):
+        """A call ended without a health signal (cancelled, throttled or a bad request)"""
+        self._probing = False
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.stats_counters["opened"] += 1
+            logger.warning(
+                f"Upstream circuit open after {self.consecutive_failures} consecutive failures; "
+                f"failing fast for {self.reset_seconds}s"
+            )
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": round(self.retry_after(), 1) if self.state == self.OPEN else None,
+        }
+
+
+class UpstreamScheduler:
+    """Shared gate for all model calls: rate limits, adaptive concurrency, retries, hedging and a circuit breaker"""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 1000,
+        tokens_per_minute: float = 1_000_000,
+        initial_concurrency: int = 16,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        latency_target: float = 30.0,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_max_rate: float = 0.05,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_concurrency, min_concurrency, max_concurrency, latency_target
+        )
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # A retry is only worth starting with at least this much of the deadline left
+        self.min_attempt_seconds = 1.0
+        # Hedging: a second copy of a call still running at the label's latency percentile
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_rate = hedge_max_rate
+        self.hedge_min_samples = hedge_min_samples
+        self._hedge_credit = 0.0
+        self._latencies = {}
+        self.breaker = breaker or CircuitBreaker()
+        self.stats_counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "throttled": 0,
+            "retries": 0,
+            "non_retryable": 0,
+            "deadline_exceeded": 0,
+            "circuit_open": 0,
+            "hedges": 0,
+            "hedges_won": 0,
+            "backoff_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "UpstreamScheduler":
+        """Create a scheduler from SAHAYAK_UPSTREAM_* settings"""
+        return cls(
+            requests_per_minute=float(os.getenv("SAHAYAK_UPSTREAM_RPM", "1000")),
+            tokens_per_minute=float(os.getenv("SAHAYAK_UPSTREAM_TPM", "1000000")),
+            initial_concurrency=int(os.getenv("SAHAYAK_UPSTREAM_CONCURRENCY", "16")),
+            min_concurrency=int(os.getenv("SAHAYAK_UPSTREAM_MIN_CONCURRENCY", "1")),
+            max_concurrency=int(os.getenv("SAHAYAK_UPSTREAM_MAX_CONCURRENCY", "64")),
+            latency_target=float(os.getenv("SAHAYAK_UPSTREAM_LATENCY_TARGET_SECONDS", "30")),
+            base_delay=float(os.getenv("SAHAYAK_UPSTREAM_BACKOFF_BASE_SECONDS", "1")),
+            max_delay=float(os.getenv("SAHAYAK_UPSTREAM_BACKOFF_MAX_SECONDS", "30")),
+            hedge_enabled=os.getenv("SAHAYAK_UPSTREAM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes"),
+            hedge_percentile=float(os.getenv("SAHAYAK_UPSTREAM_HEDGE_PERCENTILE", "95")),
+            hedge_max_rate=float(os.getenv("SAHAYAK_UPSTREAM_HEDGE_MAX_RATE", "0.05")),
+            hedge_min_samples=int(os.getenv("SAHAYAK_UPSTREAM_HEDGE_MIN_SAMPLES", "20")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("SAHAYAK_UPSTREAM_BREAKER_FAILURES", "5")),
+                reset_seconds=float(os.getenv("SAHAYAK_UPSTREAM_BREAKER_RESET_SECONDS", "30")),
+            ),
+        )
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0, label: str = "Model call"):
+        """Hold one upstream slot for the duration of a call (or a whole stream)"""
+        try:
+            self.breaker.acquire()
+        except CircuitOpen:
+            self.stats_counters["circuit_open"] += 1
+            raise
+        try:
+            with span("upstream_wait"):
+                if self.request_bucket:
+                    await self.request_bucket.acquire(1)
+                if self.token_bucket and estimated_tokens:
+                    await self.token_bucket.acquire(estimated_tokens)
+                await self.limiter.acquire()
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.stats_counters["calls"] += 1
+        started = time.monotonic()
+        try:
+            with span("model"):
+                yield
+        except Exception as e:
+            throttled = is_throttle(e)
+            self.stats_counters["failures"] += 1
+            self.stats_counters["throttled"] += throttled
+            self.limiter.release(throttled=throttled)
+            self.breaker.record(e)
+            UPSTREAM_LATENCY.labels(label, "throttled" if throttled else "error").observe(time.monotonic() - started)
+            raise
+        except BaseException:
+            # Cancelled or closed by the caller: says nothing about upstream health
+            self.limiter.release()
+            self.breaker.release()
+            UPSTREAM_LATENCY.labels(label, "cancelled").observe(time.monotonic() - started)
+            raise
+        else:
+            latency = time.monotonic() - started
+            self.stats_counters["successes"] += 1
+            self.limiter.release(latency=latency)
+            self.breaker.record()
+            self._latencies.setdefault(label, deque(maxlen=LATENCY_WINDOW)).append(latency)
+            UPSTREAM_LATENCY.labels(label, "success").observe(latency)
+
+    def retry_delay(self, attempt: int, exc: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than the upstream's retry-after hint"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        hint = retry_after_hint(exc)
+        if hint is not None:
+            # Spread clients that got the same hint so they do not return in lockstep
+            delay = max(delay, hint + random.uniform(0, max(hint * 0.2, self.base_delay)))
+        return delay
+
+    def settle_tokens(self, estimated_tokens: int, response: Any):
+        """Correct the token bucket with the usage the model actually reported"""
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None) if usage is not None else None
+        if self.token_bucket and isinstance(actual, int) and actual > 0:
+            self.token_bucket.settle(actual - estimated_tokens)
+
+    async def backoff(self, attempt: int, exc: Exception, label: str):
+        """Sleep before the next attempt, shortened (or refused) to fit the request deadline"""
+        delay = self.retry_delay(attempt, exc)
+        remaining = remaining_time()
+        if remaining is not None:
+            budget = remaining - self.min_attempt_seconds
+            if budget <= 0:
+                self.stats_counters["deadline_exceeded"] += 1
+                raise DeadlineExceeded(f"No time left to retry after {type(exc).__name__}")
+            delay = min(delay, budget)
+        self.stats_counters["retries"] += 1
+        self.stats_counters["backoff_seconds"] += delay
+        UPSTREAM_BACKOFF.labels(label).observe(delay)
+        logger.info(f"{label}: retrying in {delay:.2f}s after {type(exc).__name__}")
+        with span("backoff"):
+            await asyncio.sleep(delay)
+
+    def hedge_delay(self, label: str) -> Optional[float]:
+        """How long to wait before hedging a call with this label, or None to not hedge"""
+        if not self.hedge_enabled:
+            return None
+        samples = self._latencies.get(label)
+        if not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    def _take_hedge(self) -> bool:
+        # The breaker would refuse the copy (or the call is the half-open probe)
+        if self.breaker.is_open:
+            return False
+        # Never hedge into a saturated limiter: the second call would only queue behind the first
+        if self.limiter.waiting or self.limiter.inflight >= int(self.limiter.limit):
+            return False
+        if self._hedge_credit < 1:
+            return False
+        self._hedge_credit -= 1
+        return True
+
+    async def _hedged(self, call: Callable[[], Awaitable[Any]], label: str) -> Any:
+        """Run call(), starting a second copy if the first is still running at the hedge delay
+
+        Every call earns `hedge_max_rate` of a hedge, so at most that fraction of
+        calls is ever duplicated. The first success wins and the other is cancelled.
+        """
+        delay = self.hedge_delay(label)
+        if delay is None:
+            return await call()
+        self._hedge_credit = min(HEDGE_BURST, self._hedge_credit + self.hedge_max_rate)
+        primary = asyncio.ensure_future(call())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._take_hedge():
+                self.stats_counters["hedges"] += 1
+                logger.info(f"{label}: hedging a call still running after {delay:.2f}s")
+                tasks.append(asyncio.ensure_future(call()))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            winner = "primary" if task is primary else "hedge"
+                            self.stats_counters["hedges_won"] += winner == "hedge"
+                            HEDGED_CALLS.labels(label, winner).inc()
+                        return task.result()
+            # Both copies failed: report the original call's error
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def record_attempts(self, label: str, attempts: int):
+        UPSTREAM_ATTEMPTS.labels(label).observe(attempts)
+
+    async def run(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        estimated_tokens: int = 0,
+        max_retries: int = 3,
+        label: str = "Model call",
+    ) -> Any:
+        """Call fn under the scheduler, retrying retryable failures with backoff"""
+        async def call():
+            async with self.slot(estimated_tokens, label):
+                return await fn()
+        
+        for attempt in range(max_retries):
+            try:
+                # Waiting for a slot and the call itself both count against the deadline
+                result = await within_deadline(self._hedged(call, label))
+                self.settle_tokens(estimated_tokens, result)
+                self.record_attempts(label, attempt + 1)
+                if attempt:
+                    logger.info(f"{label} succeeded on attempt {attempt + 1}")
+                return result
+            except CircuitOpen as e:
+                # Fail fast instead of spending the remaining attempts on an unhealthy upstream
+                self.record_attempts(label, attempt + 1)
+                raise UpstreamCallFailed(label, attempt + 1, e) from e
+            except DeadlineExceeded as e:
+                self.stats_counters["deadline_exceeded"] += 1
+                self.record_attempts(label, attempt + 1)
+                logger.warning(f"{label} attempt {attempt + 1} ran out of time")
+                raise UpstreamCallFailed(label, attempt + 1, e) from e
+            except Exception as e:
+                logger.warning(f"{label} attempt {attempt + 1} failed: {e}")
+                if not is_retryable(e):
+                    self.stats_counters["non_retryable"] += 1
+                    self.record_attempts(label, attempt + 1)
+                    raise UpstreamCallFailed(label, attempt + 1, e) from e
+                if attempt == max_retries - 1:
+                    self.record_attempts(label, attempt + 1)
+                    logger.error(f"All {max_retries} attempts failed for {label.lower()}")
+                    raise UpstreamCallFailed(label, attempt + 1, e) from e
+                try:
+                    await self.backoff(attempt, e, label)
+                except DeadlineExceeded as deadline_error:
+                    self.record_attempts(label, attempt + 1)
+                    raise UpstreamCallFailed(label, attempt + 1, deadline_error) from e
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "backoff_seconds": round(self.stats_counters["backoff_seconds"], 3),
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "hedge_delays": {label: round(self.hedge_delay(label), 3) for label in self._latencies if self.hedge_delay(label) is not None},
+            "circuit": self.breaker.stats(),
+            "inflight": self.limiter.inflight,
+            "waiting": self.limiter.waiting,
+            "rate_limit_wait_seconds": round(
+                (self.request_bucket.waited_seconds if self.request_bucket else 0.0)
+                + (self.token_bucket.waited_seconds if self.token_bucket else 0.0), 3
+            ),
+        }
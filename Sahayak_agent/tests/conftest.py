@@ -0,0 +1,52 @@
+import os
+import sys
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Read when sahayak_api is imported, so it has to be set before any test imports it
+os.environ.setdefault("SAHAYAK_BACKEND", "fake")
+
+
+@pytest.fixture
+def sahayak(tmp_path, monkeypatch):
+    """The API on the fake backend with every store under tmp_path
+
+    Use as `async with sahayak() as client:`; the lifespan runs around the client,
+    and `sahayak_api` globals (backend, caches, scheduler) are live inside it. The
+    client is handed out once the worker is ready, so warm-up calls are done.
+    """
+    settings = {
+        "SAHAYAK_FAKE_LATENCY_DISTRIBUTION": "fixed",
+        "SAHAYAK_FAKE_LATENCY_SECONDS": "0.05",
+        "SAHAYAK_FAKE_CHUNK_INTERVAL_SECONDS": "0.001",
+        "SAHAYAK_FAKE_ERROR_RATE": "0",
+        "SAHAYAK_FAKE_THROTTLE_RATE": "0",
+        "SAHAYAK_UPSTREAM_BACKOFF_BASE_SECONDS": "0.01",
+        "SAHAYAK_UPSTREAM_BACKOFF_MAX_SECONDS": "0.05",
+        "SAHAYAK_IMAGE_WORKERS": "0",
+        "SAHAYAK_CACHE_PATH": str(tmp_path / "responses.db"),
+        "SAHAYAK_IMAGE_CACHE_PATH": str(tmp_path / "images.db"),
+        "SAHAYAK_SIMILARITY_CACHE_PATH": str(tmp_path / "similar.db"),
+        "SAHAYAK_JOBS_PATH": str(tmp_path / "jobs.db"),
+        "SAHAYAK_CONTENT_PACKS": "",
+    }
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+    import httpx
+    import sahayak_api
+
+    @asynccontextmanager
+    async def serve():
+        async with sahayak_api.lifespan(sahayak_api.app):
+            transport = httpx.ASGITransport(app=sahayak_api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://sahayak", timeout=30) as client:
+                for _ in range(500):
+                    if (await client.get("/readyz")).status_code == 200:
+                        break
+                    await asyncio.sleep(0.01)
+                yield client
+
+    return serve
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from sahayak_admission import AdmissionController, AdmissionRejected, EndpointClass
+
+
+def controller(max_concurrency: int = 1, max_queue: int = 2, queue_timeout: float = 5) -> AdmissionController:
+    return AdmissionController(max_concurrency, max_queue, {
+        "interactive": EndpointClass("interactive", 0, 8, queue_timeout),
+        "lesson_plan": EndpointClass("lesson_plan", 1, 8, queue_timeout),
+        "batch": EndpointClass("batch", 2, 8, queue_timeout),
+    })
+
+
+def test_full_queue_sheds_lowest_priority_waiter():
+    admission = controller()
+
+    async def scenario():
+        running = await admission.acquire("interactive")
+        first_batch = asyncio.create_task(admission.acquire("batch"))
+        last_batch = asyncio.create_task(admission.acquire("batch"))
+        await asyncio.sleep(0)
+
+        # The queue is full: an interactive request displaces the newest batch waiter
+        interactive = asyncio.create_task(admission.acquire("interactive"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as shed:
+            await last_batch
+        assert "higher-priority" in shed.value.reason
+
+        # A batch newcomer outranks nobody left in the queue, so it is rejected outright
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("batch")
+        assert "queue is full" in rejected.value.reason
+        assert rejected.value.retry_after >= 1
+
+        # Freed slots go to the interactive waiter first, though the batch one queued earlier
+        running.release()
+        (await interactive).release()
+        (await first_batch).release()
+
+    asyncio.run(scenario())
+    stats = admission.stats()
+    assert stats["shed_for_priority"] == 1
+    assert stats["rejected_queue_full"] == 1
+    assert stats["inflight"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_waiters_are_served_in_priority_order():
+    admission = controller(max_queue=8)
+    order = []
+
+    async def waiter(name: str):
+        ticket = await admission.acquire(name)
+        order.append(name)
+        await asyncio.sleep(0)
+        ticket.release()
+
+    async def scenario():
+        running = await admission.acquire("interactive")
+        tasks = [asyncio.create_task(waiter(name)) for name in ("batch", "lesson_plan", "batch", "interactive")]
+        await asyncio.sleep(0)
+        running.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["interactive", "lesson_plan", "batch", "batch"]
+
+
+def test_waiter_is_rejected_after_its_queue_deadline():
+    admission = controller(queue_timeout=0.05)
+
+    async def scenario():
+        running = await admission.acquire("interactive")
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await admission.acquire("lesson_plan")
+        running.release()
+        return excinfo.value
+
+    rejected = asyncio.run(scenario())
+    assert "deadline" in rejected.reason
+    assert admission.stats()["rejected_deadline"] == 1
+    assert admission.queue_depth == 0
@@ -0,0 +1,110 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sahayak_backends import FakeBackend, FakeUpstreamError, GeminiBackend
+
+
+class BlockingModel:
+    """A synchronous SDK model whose calls block the calling thread"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        time.sleep(self.seconds)
+        if stream:
+            return iter([type("Chunk", (), {"text": word})() for word in ("rain ", "falls")])
+        return f"answer to {contents}"
+
+
+def test_sync_sdk_calls_do_not_block_the_event_loop():
+    pytest.importorskip("google.generativeai")
+    executor = ThreadPoolExecutor(max_workers=4)
+    backend = GeminiBackend("test-key", "text-model", "vision-model", executor_factory=lambda: executor, use_async_sdk=False)
+    model = BlockingModel(0.2)
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beating = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(backend.generate(model, f"question {i}") for i in range(4)))
+        chunks = [chunk async for chunk in backend.stream(model, "rain")]
+        elapsed = time.perf_counter() - started
+        beating.cancel()
+        return answers, chunks, elapsed, ticks
+
+    try:
+        answers, chunks, elapsed, ticks = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert answers == [f"answer to question {i}" for i in range(4)]
+    assert chunks == ["rain ", "falls"]
+    # The four calls ran side by side in the pool, and the loop kept running meanwhile
+    assert elapsed < 0.6
+    assert ticks >= 20
+    assert backend.stats()["mode"] == "thread_pool"
+
+
+def test_fake_backend_is_deterministic_per_prompt():
+    backend = FakeBackend(latency_seconds=0, distribution="fixed", response_words=50, chunk_interval=0)
+
+    async def scenario():
+        first = await backend.generate(backend.text_model, "water cycle")
+        again = await backend.generate(backend.text_model, "water cycle")
+        other = await backend.generate(backend.text_model, "fractions")
+        short = await backend.generate(backend.text_model, "water cycle", generation_config={"max_output_tokens": 10})
+        streamed = [chunk async for chunk in backend.stream(backend.text_model, "water cycle")]
+        return first, again, other, short, streamed
+
+    first, again, other, short, streamed = asyncio.run(scenario())
+    assert first.text == again.text != other.text
+    assert len(first.text.split()) == 50
+    assert len(short.text) <= 10 * 4 + 20
+    assert "".join(streamed).split() == first.text.split()
+    assert first.usage_metadata.total_token_count > 0
+    assert backend.stats_counters["calls"] == 4
+    assert backend.stats_counters["streams"] == 1
+
+
+def test_fake_backend_injects_errors_and_throttling():
+    backend = FakeBackend(latency_seconds=0, distribution="fixed", error_rate=0.3, throttle_rate=0.2, seed=7)
+
+    async def scenario():
+        codes = []
+        for _ in range(400):
+            try:
+                await backend.generate(backend.text_model, "soil")
+                codes.append(200)
+            except FakeUpstreamError as e:
+                codes.append(e.code)
+        return codes
+
+    codes = asyncio.run(scenario())
+    assert set(codes) == {200, 429, 503}
+    assert 0.1 < codes.count(429) / len(codes) < 0.3
+    assert 0.2 < codes.count(503) / len(codes) < 0.4
+    assert backend.stats_counters["throttled"] == codes.count(429)
+    assert backend.stats_counters["errors"] == codes.count(503)
+
+
+@pytest.mark.parametrize("distribution", FakeBackend.DISTRIBUTIONS)
+def test_fake_latency_is_never_negative(distribution):
+    backend = FakeBackend(latency_seconds=0.2, latency_spread=0.5, distribution=distribution, seed=1)
+    samples = [backend.sample_latency() for _ in range(500)]
+    assert min(samples) >= 0
+    assert 0.05 < sorted(samples)[250] < 0.5
+
+
+def test_unknown_latency_distribution_is_rejected():
+    with pytest.raises(ValueError):
+        FakeBackend(distribution="bimodal")
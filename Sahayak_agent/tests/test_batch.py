@@ -0,0 +1,43 @@
+import json
+import asyncio
+
+import sahayak_api
+from sahayak_backends import FakeUpstreamError
+
+
+def test_batch_reports_failed_items_alongside_successes(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            generate = api.backend.generate
+
+            async def rejects_volcanoes(model, contents, **kwargs):
+                if "volcano" in str(contents):
+                    raise FakeUpstreamError(400, "Request blocked (fake).")
+                return await generate(model, contents, **kwargs)
+
+            api.backend.generate = rejects_volcanoes
+            response = await client.post("/batch", json={"items": [
+                {"id": "rain", "content": {"prompt": "how does rain form"}},
+                {"id": "volcano", "content": {"prompt": "how does a volcano erupt"}},
+                {"id": "plan", "lesson_plan": {"topic": "magnets", "grade_levels": [4]}},
+            ]})
+            return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    summary = lines.pop()["summary"]
+    results = {line["id"]: line for line in lines}
+
+    assert summary["total"] == 3
+    assert summary["succeeded"] == 2
+    assert summary["failed"] == 1
+    assert results["rain"]["status"] == "ok" and results["rain"]["content"]
+    assert results["plan"]["status"] == "ok" and results["plan"]["lesson_plan"]
+    failed = results["volcano"]
+    assert failed["status"] == "error"
+    assert failed["index"] == 1
+    assert failed["status_code"] >= 400
+    assert failed["error"]
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import sahayak_api
+from sahayak_cache import ResponseCache, parse_cache_control
+
+
+def test_entries_are_shared_through_the_disk_tier(tmp_path):
+    path = str(tmp_path / "responses.db")
+
+    async def scenario():
+        writer = ResponseCache(path)
+        await writer.set("lesson", "Water cycle plan")
+        # Another worker process starts with an empty memory tier
+        reader = ResponseCache(path)
+        first, second = await reader.get("lesson"), await reader.get("lesson")
+        missing = await reader.get("other")
+        stats = reader.stats()
+        writer.close()
+        reader.close()
+        return first, second, missing, stats
+
+    first, second, missing, stats = asyncio.run(scenario())
+    assert first == second == "Water cycle plan"
+    assert missing is None
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_expired_and_evicted_entries_are_misses():
+    async def scenario():
+        cache = ResponseCache(None, max_entries=2)
+        await cache.set("stale", "old plan", ttl_seconds=0)
+        for key in ("a", "b", "c"):
+            await cache.set(key, f"plan {key}")
+        return [await cache.get(key) for key in ("stale", "a", "b", "c")], cache.stats()
+
+    values, stats = asyncio.run(scenario())
+    assert values == [None, None, "plan b", "plan c"]
+    assert stats["memory_evictions"] >= 1
+    assert stats["memory_entries"] == 2
+
+
+@pytest.mark.parametrize("header, policy", [
+    (None, (True, True)),
+    ("max-age=3600", (True, True)),
+    ("no-cache", (False, True)),
+    ("max-age=0", (False, True)),
+    ("No-Store", (False, False)),
+])
+def test_cache_control_policy(header, policy):
+    assert parse_cache_control(header) == policy
+
+
+def test_repeated_request_is_served_from_cache(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            before = api.backend.stats_counters["calls"]
+            request = {"prompt": "explain the phases of the moon", "grade_levels": [5]}
+            responses = [await client.post("/generate-content", json=request) for _ in range(2)]
+            responses.append(await client.post("/generate-content", json=request, headers={"Cache-Control": "no-cache"}))
+            return responses, api.backend.stats_counters["calls"] - before
+
+    (miss, hit, refreshed), calls = asyncio.run(scenario())
+    assert miss.headers["X-Cache"] == "MISS"
+    assert hit.headers["X-Cache"] == "HIT"
+    assert hit.json()["content"] == miss.json()["content"]
+    assert refreshed.headers["X-Cache"] == "BYPASS"
+    assert calls == 2
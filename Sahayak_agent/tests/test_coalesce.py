@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import sahayak_api
+from sahayak_deadline import deadline_scope, within_deadline
+
+
+def test_short_deadline_does_not_fail_shared_call_for_longer_waiters():
+    async def scenario():
+        runs = []
+
+        async def generate():
+            runs.append(1)
+            # Model calls honour whatever deadline the shared task runs under
+            await within_deadline(asyncio.sleep(0.5))
+            return "lesson"
+
+        async def caller(seconds: float):
+            with deadline_scope(seconds):
+                return await sahayak_api.coalesced("mixed-timeouts", generate)
+
+        short = asyncio.create_task(caller(0.1))
+        await asyncio.sleep(0)
+        long = asyncio.create_task(caller(30))
+        with pytest.raises(HTTPException) as excinfo:
+            await short
+        return excinfo.value.status_code, await long, runs
+
+    status_code, (result, shared), runs = asyncio.run(scenario())
+    assert status_code == 504
+    assert result == "lesson"
+    assert shared
+    assert len(runs) == 1
+
+
+def test_identical_concurrent_requests_make_one_upstream_call(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            before = api.backend.stats_counters["calls"]
+            request = {"prompt": "why do leaves change colour", "grade_levels": [3, 4]}
+            responses = await asyncio.gather(*(client.post("/generate-content", json=request) for _ in range(5)))
+            return responses, api.backend.stats_counters["calls"] - before
+
+    responses, calls = asyncio.run(scenario())
+    assert calls == 1
+    assert all(response.status_code == 200 for response in responses)
+    assert sorted(response.headers["X-Cache"] for response in responses) == ["COALESCED"] * 4 + ["MISS"]
+    assert len({response.json()["content"] for response in responses}) == 1
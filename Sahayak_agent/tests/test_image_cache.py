@@ -0,0 +1,65 @@
+import io
+import random
+import asyncio
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+
+from sahayak_image_cache import ImageAnalysisCache
+from sahayak_images import preprocess_image
+
+WORDS = (
+    "water cycle plants village market counting story measure compare fraction river soil seed "
+    "rain sun cloud teacher student number add subtract multiply divide area shape triangle"
+).split()
+
+
+def text_page(seed: int) -> Image.Image:
+    """A synthetic textbook page: same layout for every seed, different words"""
+    rng = random.Random(seed)
+    page = Image.new("RGB", (850, 1100), "white")
+    draw = ImageDraw.Draw(page)
+    title, body = ImageFont.load_default(size=40), ImageFont.load_default(size=22)
+    draw.text((60, 50), f"Chapter {seed}: " + " ".join(rng.choice(WORDS) for _ in range(3)), fill="black", font=title)
+    for y in range(140, 1040, 34):
+        draw.text((60, y), " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 9))), fill="black", font=body)
+    return page
+
+
+def prepare(page: Image.Image):
+    out = io.BytesIO()
+    page.save(out, format="JPEG", quality=85)
+    return preprocess_image(out.getvalue())
+
+
+def test_distinct_text_pages_miss(tmp_path):
+    cache = ImageAnalysisCache(str(tmp_path / "images.db"))
+    pages = [prepare(text_page(seed)) for seed in range(6)]
+
+    async def run():
+        await cache.set("scope", pages[0].dhash, pages[0].thumbnail, "analysis of page 0")
+        return [await cache.get("scope", page.dhash, page.thumbnail) for page in pages[1:]]
+
+    try:
+        assert asyncio.run(run()) == [None] * 5
+    finally:
+        cache.close()
+
+
+def test_same_page_under_different_light_hits(tmp_path):
+    cache = ImageAnalysisCache(str(tmp_path / "images.db"))
+    page = text_page(0)
+    original = prepare(page)
+    darker = prepare(ImageEnhance.Brightness(page).enhance(0.85))
+
+    async def run():
+        await cache.set("scope", original.dhash, original.thumbnail, "analysis of page 0")
+        return await cache.get("scope", darker.dhash, darker.thumbnail)
+
+    try:
+        hit = asyncio.run(run())
+        assert hit is not None and hit[0] == "analysis of page 0"
+    finally:
+        cache.close()
@@ -0,0 +1,84 @@
+import io
+import os
+import signal
+import asyncio
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+from sahayak_images import ImagePreprocessor, PreprocessUnavailable
+
+
+def jpeg(seed: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (640, 480), (seed * 40 % 256, 120, 200)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def test_pool_recovers_after_worker_dies():
+    preprocessor = ImagePreprocessor(workers=1, inline_threshold_bytes=0, timeout_seconds=30)
+    preprocessor.start()
+
+    async def scenario():
+        await preprocessor.warm_up()
+        for pid in list(preprocessor._pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        outcomes = []
+        for seed in range(3):
+            try:
+                outcomes.append((await preprocessor.process(jpeg(seed))).width)
+            except PreprocessUnavailable:
+                outcomes.append("unavailable")
+        return outcomes
+
+    try:
+        outcomes = asyncio.run(asyncio.wait_for(scenario(), 60))
+    finally:
+        preprocessor.shutdown()
+    # At most the image caught by the dead worker fails; the pool is rebuilt for the rest
+    assert outcomes[-2:] == [640, 640]
+    assert preprocessor.stats()["running"] == 0
+    assert preprocessor.stats()["queue_depth"] == 0
+
+
+def test_timed_out_images_leave_the_queue():
+    preprocessor = ImagePreprocessor(workers=1, max_queue=4, inline_threshold_bytes=0, timeout_seconds=0.001)
+    preprocessor.start()
+
+    async def scenario():
+        results = await asyncio.gather(*(preprocessor.process(jpeg(seed)) for seed in range(4)), return_exceptions=True)
+        return results, preprocessor.queue_depth
+
+    try:
+        results, depth = asyncio.run(scenario())
+    finally:
+        preprocessor.shutdown()
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+    assert depth == 0
+
+
+def test_upload_errors_map_to_client_or_server_fault(monkeypatch):
+    os.environ.setdefault("SAHAYAK_BACKEND", "fake")
+    from fastapi import HTTPException
+
+    import sahayak_api
+
+    async def status_for(image_bytes: bytes) -> int:
+        try:
+            await sahayak_api.preprocess_upload(image_bytes)
+        except HTTPException as e:
+            return e.status_code
+        return 200
+
+    preprocessor = ImagePreprocessor(workers=0)
+    monkeypatch.setattr(sahayak_api, "image_preprocessor", preprocessor)
+    assert asyncio.run(status_for(b"not an image")) == 400
+    assert asyncio.run(status_for(jpeg(1))) == 200
+
+    async def dead_pool(image_bytes):
+        raise PreprocessUnavailable("worker died")
+
+    monkeypatch.setattr(preprocessor, "process", dead_pool)
+    assert asyncio.run(status_for(jpeg(1))) == 503
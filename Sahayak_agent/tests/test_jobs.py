@@ -0,0 +1,151 @@
+import time
+import asyncio
+
+from sahayak_jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobDeferred, JobManager
+
+
+async def wait_for_status(manager: JobManager, job_id: str, status: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await manager.get(job_id)
+        if job["status"] == status or time.monotonic() > deadline:
+            return job
+        await asyncio.sleep(0.02)
+
+
+def test_second_manager_leaves_live_jobs_alone(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        calls = []
+        release = asyncio.Event()
+
+        async def handler(payload):
+            calls.append(payload)
+            await release.wait()
+            return {"ok": True}
+
+        first = JobManager(path, workers=1, lease_seconds=0.3)
+        first.register("lesson", handler)
+        await first.start()
+        job, _ = await first.submit("lesson", {"topic": "fractions"})
+        assert (await wait_for_status(first, job["job_id"], RUNNING))["status"] == RUNNING
+
+        # A second worker process starting up (and its lease loop running) while the job is in flight
+        second = JobManager(path, workers=1, lease_seconds=0.3)
+        second.register("lesson", handler)
+        await second.start()
+        await asyncio.sleep(1.0)
+        assert second.stats()["recovered"] == 0
+        assert (await second.get(job["job_id"]))["attempts"] == 1
+
+        release.set()
+        done = await wait_for_status(first, job["job_id"], SUCCEEDED)
+        for manager in (first, second):
+            await manager.stop()
+            manager.close()
+        return done, calls
+
+    done, calls = asyncio.run(scenario())
+    assert done["status"] == SUCCEEDED
+    assert len(calls) == 1
+
+
+def test_expired_lease_is_recovered(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        async def handler(payload):
+            return {"ok": True}
+
+        # A job claimed by a process that died without renewing its lease
+        dead = JobManager(path, workers=1, lease_seconds=0.1)
+        dead.register("lesson", handler)
+        job, _ = dead._submit("lesson", '{"topic": "soil"}', None)
+        assert dead._claim(job["job_id"]) is not None
+        dead.close()
+        await asyncio.sleep(0.2)
+
+        survivor = JobManager(path, workers=1, lease_seconds=0.1)
+        survivor.register("lesson", handler)
+        await survivor.start()
+        done = await wait_for_status(survivor, job["job_id"], SUCCEEDED)
+        recovered = survivor.stats()["recovered"]
+        await survivor.stop()
+        survivor.close()
+        return done, recovered
+
+    done, recovered = asyncio.run(scenario())
+    assert recovered == 1
+    assert done["status"] == SUCCEEDED
+    assert done["attempts"] == 2
+
+
+def test_stop_only_requeues_own_jobs(tmp_path):
+    manager = JobManager(str(tmp_path / "jobs.db"), workers=1)
+    now = time.time()
+    manager._execute(
+        "INSERT INTO jobs (id, kind, payload, status, attempts, owner, lease_expires_at, created_at, updated_at) "
+        "VALUES ('other', 'lesson', '{}', ?, 1, 'someone-else', ?, ?, ?)",
+        (RUNNING, now + 60, now, now),
+    )
+
+    async def scenario():
+        await manager.start()
+        await manager.stop()
+
+    asyncio.run(scenario())
+    assert manager._fetch_one("SELECT status FROM jobs WHERE id = 'other'")["status"] == RUNNING
+    assert manager._fetch_one("SELECT COUNT(*) AS n FROM jobs WHERE status = ?", (QUEUED,))["n"] == 0
+    manager.close()
+
+
+def test_queued_job_of_dead_process_is_adopted(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        async def handler(payload):
+            return {"ok": True}
+
+        survivor = JobManager(path, workers=1, lease_seconds=0.3)
+        survivor.register("lesson", handler)
+        await survivor.start()
+
+        # Accepted by a process that died before any of its workers ran it
+        dead = JobManager(path, workers=1, lease_seconds=0.3)
+        job, _ = dead._submit("lesson", '{"topic": "soil"}', None)
+        dead.close()
+
+        done = await wait_for_status(survivor, job["job_id"], SUCCEEDED)
+        adopted = survivor.stats()["adopted"]
+        await survivor.stop()
+        survivor.close()
+        return done, adopted
+
+    done, adopted = asyncio.run(scenario())
+    assert done["status"] == SUCCEEDED
+    assert adopted == 1
+
+
+def test_deferrals_are_capped(tmp_path):
+    manager = JobManager(str(tmp_path / "jobs.db"), workers=1, max_deferrals=2)
+    calls = []
+
+    async def handler(payload):
+        calls.append(1)
+        raise JobDeferred(0.01, "Server busy")
+
+    async def scenario():
+        manager.register("lesson", handler)
+        await manager.start()
+        job, _ = await manager.submit("lesson", {})
+        done = await wait_for_status(manager, job["job_id"], FAILED)
+        await manager.stop()
+        return done
+
+    done = asyncio.run(scenario())
+    manager.close()
+    assert done["status"] == FAILED
+    assert done["error"]["status_code"] == 503
+    assert done["attempts"] == 1
+    assert len(calls) == 3
@@ -0,0 +1,68 @@
+import json
+import asyncio
+import hashlib
+
+import sahayak_api
+from sahayak_packs import ContentPack, PackWriter, build_pack, pack_key
+
+
+def test_pack_round_trips_texts(tmp_path):
+    path = str(tmp_path / "round.pack")
+    texts = {
+        hashlib.sha256(b"short").hexdigest(): "Fractions",
+        hashlib.sha256(b"long").hexdigest(): "Count the mangoes in the basket. " * 200,
+    }
+    writer = PackWriter(path)
+    for key, text in texts.items():
+        writer.add(pack_key(key), text)
+    writer.finish({"source": "test"})
+
+    pack = ContentPack(path)
+    try:
+        assert pack.count == 2
+        assert pack.meta["source"] == "test"
+        assert {key: pack.get(key) for key in texts} == texts
+        assert pack.get(hashlib.sha256(b"missing").hexdigest()) is None
+    finally:
+        pack.close()
+
+
+def test_built_pack_answers_requests_without_the_model(sahayak, tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({
+        "locations": ["rural India"],
+        "lesson_plans": [{"topics": ["Water cycle", "Fractions"], "grade_levels": [[3, 4]], "duration_minutes": 45}],
+        "content": [{"prompts": ["Explain photosynthesis"], "grade_levels": [[4, 5]]}],
+    }))
+    output = str(tmp_path / "syllabus.pack")
+
+    built = asyncio.run(build_pack(str(manifest), output, concurrency=2))
+    assert built["generated"] == 3
+    assert built["failed"] == 0
+    # Rebuilding the same manifest reuses every entry instead of generating it again
+    rebuilt = asyncio.run(build_pack(str(manifest), output))
+    assert rebuilt["reused"] == 3
+    assert rebuilt["generated"] == 0
+
+    monkeypatch.setenv("SAHAYAK_CONTENT_PACKS", str(tmp_path))
+
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            before = api.backend.stats_counters["calls"]
+            plan = await client.post("/create-lesson-plan", json={
+                "topic": "Fractions", "grade_levels": [3, 4], "duration_minutes": 45, "location": "rural India"
+            })
+            content = await client.post("/generate-content", json={
+                "prompt": "Explain photosynthesis", "grade_levels": [4, 5], "location": "rural India"
+            })
+            other = await client.post("/generate-content", json={"prompt": "Explain gravity", "grade_levels": [4, 5]})
+            return plan, content, other, api.backend.stats_counters["calls"] - before, sahayak_api.content_packs.stats()
+
+    plan, content, other, calls, stats = asyncio.run(scenario())
+    assert plan.status_code == 200 and plan.headers["X-Cache"] == "PACK"
+    assert content.status_code == 200 and content.headers["X-Cache"] == "PACK"
+    assert other.headers["X-Cache"] == "MISS"
+    # Only the request missing from the pack reached the model
+    assert calls == 1
+    assert stats["entries"] == 3
@@ -0,0 +1,56 @@
+import io
+import os
+import asyncio
+import tempfile
+
+import pytest
+
+os.environ.setdefault("SAHAYAK_BACKEND", "fake")
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+import sahayak_api
+from sahayak_pages import pdf_support
+
+
+def spooled_upload(data: bytes, filename: str, content_type: str) -> UploadFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=1024)
+    spool.write(data)
+    spool.seek(0)
+    return UploadFile(file=spool, size=len(data), filename=filename, headers=Headers({"content-type": content_type}))
+
+
+def pdf_bytes(pages: int) -> bytes:
+    from PIL import Image
+
+    out = io.BytesIO()
+    images = [Image.new("RGB", (200, 280), (255, 255 - i * 20, 255)) for i in range(pages)]
+    images[0].save(out, format="PDF", save_all=True, append_images=images[1:])
+    return out.getvalue()
+
+
+def test_total_upload_size_is_capped(monkeypatch):
+    monkeypatch.setattr(sahayak_api, "PAGES_MAX_TOTAL_BYTES", 1500)
+    files = [spooled_upload(b"x" * 1000, f"page{i}.jpg", "image/jpeg") for i in range(2)]
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(sahayak_api.open_page_uploads(files))
+    assert excinfo.value.status_code == 413
+
+
+@pytest.mark.skipif(not pdf_support(), reason="needs pypdfium2")
+def test_pdf_opened_from_spooled_upload():
+    upload = spooled_upload(pdf_bytes(3), "chapter.pdf", "application/pdf")
+
+    async def scenario():
+        entries, total = await sahayak_api.open_page_uploads([upload])
+        try:
+            _, pdf = entries[0]
+            # The document reads from the upload itself rather than a copy in memory
+            assert pdf._data is upload.file
+            return total, await pdf.render(2)
+        finally:
+            sahayak_api.close_pdfs(entries)
+
+    total, page = asyncio.run(scenario())
+    assert total == 3
+    assert page[:2] == b"\xff\xd8"
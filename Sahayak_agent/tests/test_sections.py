@@ -0,0 +1,39 @@
+import asyncio
+
+import sahayak_api
+
+
+def test_sections_are_reused_across_overlapping_grade_sets(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            calls = api.backend.stats_counters
+
+            async def plan(grade_levels):
+                before = calls["calls"]
+                response = await client.post("/create-lesson-plan/sectioned", json={
+                    "topic": "Water cycle", "grade_levels": grade_levels, "duration_minutes": 45
+                })
+                assert response.status_code == 200
+                return response, calls["calls"] - before
+
+            return [await plan(grades) for grades in ([3, 4], [4, 5], [5, 7])]
+
+    (first, first_calls), (second, second_calls), (third, third_calls) = asyncio.run(scenario())
+
+    def cache_by_section(response):
+        return {section["grade"] or "shared": section["cache"] for section in response.json()["sections"]}
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert first_calls == 3
+
+    # Same grade band, so the shared section and grade 4 come from cache; only grade 5 is generated
+    assert second.headers["X-Cache"] == "PARTIAL"
+    assert cache_by_section(second) == {"shared": "HIT", 4: "HIT", 5: "MISS"}
+    assert second_calls == 1
+    assert second.json()["lesson_plan"]["grades"]["4"] == first.json()["lesson_plan"]["grades"]["4"]
+    assert second.json()["lesson_plan"]["shared"] == first.json()["lesson_plan"]["shared"]
+
+    # Grade 7 adds the middle school band, so the shared section is new too
+    assert cache_by_section(third) == {"shared": "MISS", 5: "HIT", 7: "MISS"}
+    assert third_calls == 2
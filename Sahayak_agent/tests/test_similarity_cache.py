@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from sahayak_similarity_cache import PromptSimilarityCache
+
+
+def lookup(tmp_path, stored: str, asked: str):
+    cache = PromptSimilarityCache(str(tmp_path / "similar.db"))
+
+    async def scenario():
+        await cache.set("grade-5", stored, "answer")
+        return await cache.get("grade-5", asked)
+
+    try:
+        return asyncio.run(scenario())
+    finally:
+        cache.close()
+
+
+def test_short_and_detailed_requests_do_not_match(tmp_path):
+    assert lookup(tmp_path, "short explanation of fractions", "detailed explanation of fractions") is None
+
+
+def test_rephrased_request_matches(tmp_path):
+    hit = lookup(tmp_path, "explain photosynthesis to the students", "please explain photosynthesis for kids")
+    assert hit is not None and hit[0] == "answer"
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("create a lesson on photosynthesis", "explain photosynthesis"),
+    ("what is photosynthesis", "why is photosynthesis important"),
+    ("how do plants make food", "why do plants make food"),
+])
+def test_different_task_or_question_does_not_match(tmp_path, stored, asked):
+    assert lookup(tmp_path, stored, asked) is None
@@ -0,0 +1,62 @@
+import json
+import asyncio
+
+import sahayak_api
+from sahayak_backends import FakeUpstreamError
+
+
+def sse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def fail_first_streams(backend, failures: int):
+    """Make the backend's next `failures` streams fail before their first chunk"""
+    stream = backend.stream
+    calls = []
+
+    def flaky(model, contents, **kwargs):
+        calls.append(1)
+        if len(calls) <= failures:
+            async def overloaded():
+                raise FakeUpstreamError(503, "The model is overloaded (fake).")
+                yield
+            return overloaded()
+        return stream(model, contents, **kwargs)
+
+    backend.stream = flaky
+    return calls
+
+
+def test_stream_retried_before_first_byte(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            calls = fail_first_streams(api.backend, failures=1)
+            response = await client.post("/generate-content/stream", json={"prompt": "water cycle"})
+            return response, calls
+
+    response, calls = asyncio.run(scenario())
+    assert response.status_code == 200
+    events = sse_events(response.text)
+    assert [name for name, _ in events if name != "message"] == ["done"]
+    assert "".join(data["text"] for name, data in events if name == "message").strip()
+    assert len(calls) == 2
+
+
+def test_stream_failing_every_attempt_is_an_http_error(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            calls = fail_first_streams(api.backend, failures=10)
+            response = await client.post("/generate-content/stream", json={"prompt": "soil types"})
+            return response, calls
+
+    response, calls = asyncio.run(scenario())
+    # Nothing was sent yet, so the client gets a status code rather than a broken stream
+    assert response.status_code >= 500
+    assert response.headers["content-type"].startswith("application/json")
+    assert len(calls) == 3
@@ -0,0 +1,39 @@
+import asyncio
+
+from sahayak_tracing import Trace, current_trace, record_span, span
+
+
+def test_server_timing_sums_repeated_spans():
+    trace = Trace("req-1")
+    trace.add("model", 120.0)
+    trace.add("model", 80.0)
+    trace.add("cache_disk", 1.5)
+    entries = trace.server_timing().split(", ")
+    assert entries[0] == 'model;dur=200.0;desc="x2"'
+    assert entries[1] == "cache_disk;dur=1.5"
+    assert entries[2].startswith("total;dur=")
+
+
+def test_spans_outside_a_request_are_ignored():
+    with span("model"):
+        pass
+    record_span("preprocess", 5.0)
+    assert current_trace() is None
+
+
+def test_responses_carry_request_id_and_server_timing(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            given = await client.post(
+                "/generate-content", json={"prompt": "how do bees make honey"}, headers={"X-Request-ID": "lesson-42"}
+            )
+            unsafe = await client.get("/readyz", headers={"X-Request-ID": "bad id\\n"})
+            return given, unsafe
+
+    given, unsafe = asyncio.run(scenario())
+    assert given.headers["X-Request-ID"] == "lesson-42"
+    timing = {entry.split(";")[0] for entry in given.headers["Server-Timing"].split(", ")}
+    assert {"model", "total"} <= timing
+    # IDs that are not safe to log are replaced with a fresh one
+    assert unsafe.headers["X-Request-ID"] not in ("", "bad id\\n")
+    assert len(unsafe.headers["X-Request-ID"]) == 32
@@ -0,0 +1,56 @@
+import io
+import asyncio
+import tempfile
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+from fastapi import HTTPException, UploadFile
+
+import sahayak_api
+
+
+def spooled_upload(data: bytes, size=None) -> UploadFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=1024)
+    spool.write(data)
+    spool.seek(0)
+    return UploadFile(file=spool, size=size, filename="leaf.jpg")
+
+
+def photo(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (90, 160, 60)).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def test_upload_is_read_once_within_the_size_limit():
+    data = photo(320, 240)
+    assert asyncio.run(sahayak_api.read_upload(spooled_upload(data, len(data)))) == data
+
+    for declared in (2048, None):
+        # Without a declared size the bounded read still catches it
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(sahayak_api.read_upload(spooled_upload(b"x" * 2048, declared), max_size=1024))
+        assert excinfo.value.status_code == 413
+
+
+def test_large_photo_is_decoded_and_downscaled_before_analysis(sahayak):
+    async def scenario():
+        async with sahayak() as client:
+            api = await sahayak_api.get_sahayak_api()
+            before = api.backend.stats_counters["calls"]
+            analysed = await client.post(
+                "/analyze-image", files={"file": ("leaf.jpg", photo(3000, 2000), "image/jpeg")}, params={"grade_levels": "4,5"}
+            )
+            broken = await client.post("/analyze-image", files={"file": ("leaf.jpg", b"not a photo", "image/jpeg")})
+            return analysed, broken, api.backend.stats_counters["calls"] - before
+
+    analysed, broken, calls = asyncio.run(scenario())
+    assert analysed.status_code == 200
+    width, height = analysed.json()["metadata"]["image_size"]
+    assert max(width, height) < 3000
+    assert width / height == pytest.approx(1.5, rel=0.02)
+    # An undecodable upload is the client's fault and never reaches the model
+    assert broken.status_code == 400
+    assert calls == 1
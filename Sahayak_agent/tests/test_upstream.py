@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from sahayak_backends import FakeUpstreamError
+from sahayak_upstream import CircuitBreaker, CircuitOpen, UpstreamCallFailed, UpstreamScheduler
+
+
+def failing_call(*failures: Exception):
+    """A model call that raises each of `failures` in turn, then succeeds"""
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return "lesson"
+
+    return call, calls
+
+
+def test_transient_failures_are_retried_with_backoff():
+    scheduler = UpstreamScheduler(base_delay=0.01, max_delay=0.05)
+    call, calls = failing_call(FakeUpstreamError(503, "overloaded"), asyncio.TimeoutError())
+
+    assert asyncio.run(scheduler.run(call, max_retries=3)) == "lesson"
+    assert len(calls) == 3
+    assert scheduler.stats_counters["retries"] == 2
+    assert scheduler.stats_counters["successes"] == 1
+    assert scheduler.stats_counters["failures"] == 2
+
+
+def test_non_retryable_failure_is_not_retried():
+    scheduler = UpstreamScheduler(base_delay=0.01, max_delay=0.05)
+    call, calls = failing_call(FakeUpstreamError(400, "bad request"))
+
+    with pytest.raises(UpstreamCallFailed) as excinfo:
+        asyncio.run(scheduler.run(call, max_retries=3))
+    assert excinfo.value.attempts == 1
+    assert len(calls) == 1
+    assert scheduler.stats_counters["non_retryable"] == 1
+    assert scheduler.stats_counters["retries"] == 0
+
+
+def test_retries_stop_after_max_attempts():
+    scheduler = UpstreamScheduler(base_delay=0.01, max_delay=0.05)
+    call, calls = failing_call(*[FakeUpstreamError(503, "overloaded")] * 5)
+
+    with pytest.raises(UpstreamCallFailed) as excinfo:
+        asyncio.run(scheduler.run(call, max_retries=3))
+    assert excinfo.value.attempts == 3
+    assert len(calls) == 3
+
+
+def test_backoff_is_capped_but_honours_retry_after_hint():
+    scheduler = UpstreamScheduler(base_delay=0.01, max_delay=0.05)
+    overloaded = FakeUpstreamError(503, "overloaded")
+    assert all(0 <= scheduler.retry_delay(attempt, overloaded) <= 0.05 for attempt in range(20))
+
+    throttled = FakeUpstreamError(429, "Quota exceeded, please retry in 0.5s")
+    assert all(scheduler.retry_delay(0, throttled) >= 0.5 for _ in range(20))
+
+
+def test_no_hedge_while_half_open_probe_runs():
+    scheduler = UpstreamScheduler(hedge_enabled=True, breaker=CircuitBreaker(failure_threshold=1, reset_seconds=0))
+    scheduler._hedge_credit = 1
+    scheduler.breaker.record(asyncio.TimeoutError())
+    # The first call after the reset period is the probe; a hedge would be refused
+    scheduler.breaker.acquire()
+    assert scheduler.breaker.is_open
+    assert not scheduler._take_hedge()
+
+    scheduler.breaker.record()
+    assert not scheduler.breaker.is_open
+    assert scheduler._take_hedge()
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    scheduler = UpstreamScheduler(base_delay=0.01, max_delay=0.05, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=0.2))
+    call, calls = failing_call(*[FakeUpstreamError(503, "overloaded")] * 2)
+
+    async def scenario():
+        with pytest.raises(UpstreamCallFailed):
+            await scheduler.run(call, max_retries=2)
+        assert scheduler.breaker.state == CircuitBreaker.OPEN
+
+        # Open: calls fail fast without reaching the upstream or using their retries
+        with pytest.raises(UpstreamCallFailed) as excinfo:
+            await scheduler.run(call, max_retries=3)
+        assert isinstance(excinfo.value.cause, CircuitOpen)
+        assert excinfo.value.attempts == 1
+        assert len(calls) == 2
+
+        # After the reset period one probe goes through, and its success closes the circuit
+        await asyncio.sleep(0.25)
+        assert await scheduler.run(call, max_retries=1) == "lesson"
+        assert scheduler.breaker.state == CircuitBreaker.CLOSED
+        assert await scheduler.run(call, max_retries=1) == "lesson"
+
+    asyncio.run(scenario())
+    assert len(calls) == 4
+    assert scheduler.breaker.stats()["opened"] == 1
+    assert scheduler.breaker.stats()["rejected"] == 1
+    assert scheduler.stats_counters["circuit_open"] == 1
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    for _ in range(2):
+        breaker.acquire()
+        breaker.record(FakeUpstreamError(503, "overloaded"))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    asyncio.run(asyncio.sleep(0.1))
+    breaker.acquire()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.acquire()
+    breaker.record(FakeUpstreamError(503, "overloaded"))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["opened"] == 2
+    with pytest.raises(CircuitOpen):
+        breaker.acquire()
+
+
+def test_throttling_and_bad_requests_do_not_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    for exc in [FakeUpstreamError(429, "quota"), FakeUpstreamError(400, "bad request")] * 3:
+        breaker.acquire()
+        breaker.record(exc)
+    assert breaker.state == CircuitBreaker.CLOSED